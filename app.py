@@ -1,15 +1,42 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+import os
+import time
+import atexit
 import logging
+from datetime import datetime, timedelta
 from database.database_manager import DatabaseManager
 from services.notification_service import NotificationService
 from controllers.admin_controller import AdminController
 from controllers.user_controller import UserController
 from controllers.analytics_controller import AnalyticsController
+from services.user_alert_preference_service import UserAlertPreferenceService
+from services.alert_dedup import FingerprintIndex
+from services.notification_stream import NotificationStreamHub
+from utils.scheduler import ReminderScheduler
+from utils.outbox_worker import OutboxWorker
+from utils.lifecycle_sweeper import LifecycleSweeper
+from utils.metrics_relay import MetricsFollower
+from services.lifecycle_service import LifecycleService
+from utils.instrumentation import metrics, profiler
 
 def create_app():
     """Create and configure Flask application"""
     app = Flask(__name__)
     app.config['JSON_SORT_KEYS'] = False
+    # Fan-out-on-write inbox: precompute one user_inbox row per recipient
+    app.config['INBOX_FANOUT_ENABLED'] = os.environ.get('INBOX_FANOUT_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    # Repeats of an alert (same fingerprint) seen within this window coalesce into it; 0 disables
+    app.config['ALERT_DEDUP_WINDOW_SECONDS'] = float(os.environ.get('ALERT_DEDUP_WINDOW_SECONDS', '300'))
+    # Disable when delivery runs in separate processes (python -m utils.delivery_workers)
+    app.config['OUTBOX_WORKER_ENABLED'] = os.environ.get('OUTBOX_WORKER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    # Expire alerts, archive them ARCHIVE_AFTER_DAYS after expiry and reclaim the space
+    app.config['LIFECYCLE_ENABLED'] = os.environ.get('LIFECYCLE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    app.config['ARCHIVE_AFTER_DAYS'] = float(os.environ.get('ARCHIVE_AFTER_DAYS', '30'))
+    # Separate file for archived rows; empty keeps the archive tables in the main database
+    app.config['ARCHIVE_DB_PATH'] = os.environ.get('ARCHIVE_DB_PATH') or None
+    # Per-user throttling is opt-in: set a burst to hold non-critical alerts for digests
+    app.config['USER_THROTTLE_BURST'] = int(os.environ['USER_THROTTLE_BURST']) if os.environ.get('USER_THROTTLE_BURST') else None
+    app.config['USER_THROTTLE_PER_MINUTE'] = float(os.environ.get('USER_THROTTLE_PER_MINUTE', '10'))
     
     # Configure logging
     logging.basicConfig(
@@ -18,46 +45,183 @@ def create_app():
     )
     
     # Initialize services
-    db_manager = DatabaseManager()
-    notification_service = NotificationService(db_manager)
+    db_manager = DatabaseManager(archive_path=app.config['ARCHIVE_DB_PATH'])
+    FingerprintIndex.for_db(db_manager).set_window(app.config['ALERT_DEDUP_WINDOW_SECONDS'])
+    notification_service = NotificationService(db_manager, throttle_burst=app.config['USER_THROTTLE_BURST'],
+                                               throttle_per_minute=app.config['USER_THROTTLE_PER_MINUTE'])
+    atexit.register(notification_service.shutdown)
     
     # Initialize controllers
-    admin_controller = AdminController(db_manager, notification_service)
-    user_controller = UserController(db_manager)
+    inbox_fanout = app.config['INBOX_FANOUT_ENABLED']
+    admin_controller = AdminController(db_manager, notification_service, inbox_fanout)
+    user_controller = UserController(db_manager, inbox_fanout)
     analytics_controller = AnalyticsController(db_manager)
     
+    # Reminders are queued in the outbox and delivered by its workers
+    reminder_scheduler = ReminderScheduler(db_manager, admin_controller.outbox_service,
+                                           UserAlertPreferenceService(db_manager))
+    reminder_scheduler.start()
+    atexit.register(reminder_scheduler.stop)
+    
+    if app.config['OUTBOX_WORKER_ENABLED']:
+        notification_service.restore_digests()  # this process delivers to every user
+        outbox_worker = OutboxWorker(db_manager, notification_service, admin_controller.outbox_service)
+        outbox_worker.start()
+        atexit.register(outbox_worker.stop)
+    atexit.register(profiler.stop)
+    
+    lifecycle_sweeper = LifecycleSweeper(
+        db_manager, LifecycleService(db_manager, timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])))
+    if app.config['LIFECYCLE_ENABLED']:
+        lifecycle_sweeper.start()
+        atexit.register(lifecycle_sweeper.stop)
+    
+    stream_hub = NotificationStreamHub.for_db(db_manager)
+    if not app.config['OUTBOX_WORKER_ENABLED']:
+        # In-app deliveries happen in worker processes; follow them through SQLite
+        stream_hub.start_tailing(db_manager)
+        # So do the delivery metrics: merge worker snapshots and replay their time series
+        metrics_follower = MetricsFollower(db_manager)
+        metrics.register_snapshot_source(metrics_follower.worker_snapshots)
+        metrics_follower.start()
+        atexit.register(metrics_follower.stop)
+    atexit.register(stream_hub.close)
+    
+    def collect_gauges():
+        pool = db_manager.get_pool_stats()
+        yield 'db_pool_connections_in_use', "Pooled SQLite connections checked out", {}, pool['in_use']
+        yield 'db_pool_connections_open', "Open pooled SQLite connections", {}, pool['open_connections']
+        delivery_log = notification_service.get_delivery_log_stats()
+        yield 'delivery_log_queue_depth', "Delivery records waiting for the group-commit writer", {}, \
+            delivery_log.get('queue_depth')
+        for severity, queue in admin_controller.outbox_service.get_queue_stats().items():
+            yield 'outbox_pending_recipients', "Recipients waiting in the outbox", {'severity': severity}, \
+                queue['pending']
+            yield 'outbox_oldest_wait_seconds', "Age of the oldest due outbox recipient", \
+                {'severity': severity}, queue['oldest_wait_seconds']
+        yield 'throttle_pending_digests', "Digests waiting for their window to close", {}, \
+            notification_service.get_throttle_stats()['pending_digests']
+        yield 'notification_streams_open', "Open Server-Sent Events streams", {}, stream_hub.get_stats()['streams']
+        storage = lifecycle_sweeper.lifecycle.get_storage_stats()
+        yield 'database_size_bytes', "Size of the main SQLite database file", {}, storage['database_bytes']
+        yield 'database_free_bytes', "Free pages not yet returned to the filesystem", {}, storage['free_bytes']
+    metrics.register_collector(collect_gauges)
+    
+    # Per-route latency, labelled by the route pattern rather than the raw path
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+    
+    @app.after_request
+    def record_request_latency(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            metrics.observe('http_request_seconds', time.perf_counter() - started,
+                            route=route, method=request.method, status=response.status_code)
+        return response
+    
+    @app.route('/api/metrics', methods=['GET'])
+    def get_metrics():
+        return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    
+    @app.route('/api/admin/profiler', methods=['GET'])
+    def get_profiler():
+        if request.args.get('format') == 'folded':
+            return Response(profiler.folded(), mimetype='text/plain')
+        result = admin_controller.get_profiler(request.args.get('top', 20, type=int))
+        return jsonify(result), result['status_code']
+    
+    @app.route('/api/admin/profiler', methods=['POST'])
+    def set_profiler():
+        result = admin_controller.set_profiler(request.get_json(silent=True))
+        return jsonify(result), result['status_code']
+    
     # Admin Routes
     @app.route('/api/admin/alerts', methods=['POST'])
     def create_alert():
-        return jsonify(admin_controller.create_alert(request.get_json()))
+        result = admin_controller.create_alert(request.get_json())
+        return jsonify(result), result['status_code']
+    
+    @app.route('/api/admin/alerts/bulk', methods=['POST'])
+    def create_alerts_bulk():
+        result = admin_controller.create_alerts_bulk(request.get_data(), request.content_type or '')
+        return jsonify(result), result['status_code']
+    
+    @app.route('/api/admin/fanout-jobs/<job_id>', methods=['GET'])
+    def get_fanout_job(job_id):
+        result = admin_controller.get_fanout_job(job_id)
+        return jsonify(result), result['status_code']
     
     @app.route('/api/admin/alerts/<alert_id>', methods=['PUT'])
     def update_alert(alert_id):
-        return jsonify(admin_controller.update_alert(alert_id, request.get_json()))
+        result = admin_controller.update_alert(alert_id, request.get_json())
+        return jsonify(result), result.get('status_code', 200)
     
     @app.route('/api/admin/alerts', methods=['GET'])
     def get_admin_alerts():
-        admin_id = request.args.get('admin_id', required=True)
+        admin_id = request.args.get('admin_id')
         filters = {
             'severity': request.args.get('severity'),
             'status': request.args.get('status'),
             'visibility_type': request.args.get('visibility_type')
         }
         filters = {k: v for k, v in filters.items() if v}
-        return jsonify(admin_controller.get_alerts(admin_id, filters))
+        result = admin_controller.get_alerts(admin_id, filters)
+        return jsonify(result), result['status_code']
+    
+    @app.route('/api/admin/inbox/backfill', methods=['POST'])
+    def backfill_inbox():
+        result = admin_controller.backfill_inbox()
+        return jsonify(result), result['status_code']
     
     # User Routes
     @app.route('/api/users/<user_id>/alerts', methods=['GET'])
     def get_user_alerts(user_id):
-        return jsonify(user_controller.get_user_alerts(user_id))
+        result = user_controller.get_user_alerts(
+            user_id,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor'),
+            state=request.args.get('state'),
+            severity=request.args.get('severity')
+        )
+        return jsonify(result), result.get('status_code', 200)
+    
+    @app.route('/api/users/<user_id>/alerts/stream', methods=['GET'])
+    def stream_user_alerts(user_id):
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        result = user_controller.open_alert_stream(user_id, last_event_id)
+        if isinstance(result, dict):
+            return jsonify(result), result['status_code']
+        return Response(stream_with_context(result), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
     
     @app.route('/api/users/<user_id>/alerts/<alert_id>/read', methods=['POST'])
     def mark_alert_read(user_id, alert_id):
-        return jsonify(user_controller.mark_alert_read(user_id, alert_id))
+        result = user_controller.mark_alert_read(user_id, alert_id)
+        return jsonify(result), result.get('status_code', 200)
     
     @app.route('/api/users/<user_id>/alerts/<alert_id>/snooze', methods=['POST'])
     def snooze_alert(user_id, alert_id):
-        return jsonify(user_controller.snooze_alert(user_id, alert_id))
+        result = user_controller.snooze_alert(user_id, alert_id)
+        return jsonify(result), result.get('status_code', 200)
+    
+    @app.route('/api/users/<user_id>/alerts/read', methods=['POST'])
+    def mark_alerts_read(user_id):
+        alert_ids = (request.get_json(silent=True) or {}).get('alert_ids')
+        result = user_controller.mark_alerts_read(user_id, alert_ids)
+        return jsonify(result), result.get('status_code', 200)
+    
+    @app.route('/api/users/<user_id>/alerts/snooze', methods=['POST'])
+    def snooze_alerts(user_id):
+        alert_ids = (request.get_json(silent=True) or {}).get('alert_ids')
+        result = user_controller.snooze_alerts(user_id, alert_ids)
+        return jsonify(result), result.get('status_code', 200)
+    
+    @app.route('/api/users/<user_id>/alerts/read-all', methods=['POST'])
+    def mark_all_alerts_read(user_id):
+        result = user_controller.mark_all_read(user_id, severity=request.args.get('severity'))
+        return jsonify(result), result.get('status_code', 200)
     
     # Analytics Routes
     @app.route('/api/analytics/system', methods=['GET'])
@@ -66,7 +230,17 @@ def create_app():
     
     @app.route('/api/analytics/alerts/<alert_id>', methods=['GET'])
     def get_alert_analytics(alert_id):
-        return jsonify(analytics_controller.get_alert_analytics(alert_id))
+        result = analytics_controller.get_alert_analytics(alert_id)
+        return jsonify(result), result.get('status_code', 200)
+    
+    @app.route('/api/analytics/timeseries', methods=['GET'])
+    def get_timeseries():
+        result = analytics_controller.get_timeseries(request.args)
+        return jsonify(result), result.get('status_code', 200)
+    
+    @app.route('/api/admin/analytics/rebuild', methods=['POST'])
+    def rebuild_analytics():
+        return jsonify(analytics_controller.rebuild_rollups())
     
     # Health check
     @app.route('/api/health', methods=['GET'])
@@ -77,7 +251,15 @@ def create_app():
             'services': {
                 'database': 'active',
                 'notification_service': 'active'
-            }
+            },
+            'database_pool': db_manager.get_pool_stats(),
+            'delivery_log': notification_service.get_delivery_log_stats(),
+            'delivery_engine': notification_service.get_engine_stats(),
+            'throttle': notification_service.get_throttle_stats(),
+            'notification_stream': stream_hub.get_stats(),
+            'outbox_queue': admin_controller.outbox_service.get_queue_stats(),
+            'alert_cache': admin_controller.alert_service.get_cache_stats(),
+            'lifecycle': lifecycle_sweeper.get_stats()
         })
     
     return app
@@ -0,0 +1,160 @@
+"""Deterministic synthetic data for benchmarks: large organizations with history.
+
+    python -m benchmarks.generator --db bench.db [--scale large] [--seed 42]
+
+The same seed and scale always produce the same ids, names, targets,
+severities and states. Timestamps are offsets from ``anchor`` (the start of
+the current hour by default) so that alerts are active when the benchmark
+runs. Rows are bulk-inserted straight into the tables and the analytics
+rollups are rebuilt at the end, which is far faster than going through the
+services and leaves the database in the same shape they would.
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from services.alert_dedup import alert_fingerprint
+from services.analytics_service import rebuild_rollups
+
+class Scale(NamedTuple):
+    organizations: int
+    teams: int
+    users: int
+    alerts: int
+    history_per_alert: int  # recipients per alert with a delivery and a preference row
+
+SCALES = {
+    'small': Scale(organizations=1, teams=20, users=2000, alerts=500, history_per_alert=10),
+    'medium': Scale(organizations=2, teams=100, users=20000, alerts=5000, history_per_alert=20),
+    'large': Scale(organizations=4, teams=500, users=100000, alerts=20000, history_per_alert=20),
+}
+
+SEVERITY_WEIGHTS = {'info': 60, 'warning': 30, 'critical': 10}
+VISIBILITY_WEIGHTS = {'organization': 5, 'team': 45, 'user': 50}
+DELIVERY_WEIGHTS = {'in_app': 70, 'email': 20, 'sms': 10}
+STATUS_WEIGHTS = {'active': 70, 'expired': 20, 'archived': 10}
+PREFERENCE_WEIGHTS = {'unread': 50, 'read': 40, 'snoozed': 10}
+DELIVERY_STATUS_WEIGHTS = {'sent': 97, 'failed': 3}
+
+INSERT_BATCH = 10000
+
+class Dataset(NamedTuple):
+    """Ids of the generated rows, for scenarios to sample from"""
+    organizations: List[str]
+    teams: List[str]
+    users: List[str]
+    alerts: List[str]
+    active_alerts: List[str]
+    admin_id: str
+
+class _Random(random.Random):
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.getrandbits(128), version=4))
+
+    def pick(self, weights: Dict[str, int]) -> str:
+        return self.choices(list(weights), list(weights.values()))[0]
+
+def _insert(conn, sql: str, rows: List[tuple]):
+    for start in range(0, len(rows), INSERT_BATCH):
+        conn.executemany(sql, rows[start:start + INSERT_BATCH])
+
+def generate(db_manager, scale: Scale = SCALES['small'], seed: int = 42,
+             anchor: Optional[datetime] = None) -> Dataset:
+    """Populate an empty database; returns the generated ids"""
+    rng = _Random(seed)
+    anchor = anchor or datetime.now().replace(minute=0, second=0, microsecond=0)
+    at = lambda hours: (anchor + timedelta(hours=hours)).isoformat()
+
+    orgs = [f"org_{i:03d}" for i in range(scale.organizations)]
+    teams = [(rng.uuid(), f"Team {i}", orgs[i % len(orgs)], at(-24 * 365)) for i in range(scale.teams)]
+    members: Dict[str, List[str]] = {team_id: [] for team_id, *_ in teams}
+    org_members: Dict[str, List[str]] = {org: [] for org in orgs}
+    users = []
+    for i in range(scale.users):
+        team_id, _, org, _ = teams[rng.randrange(len(teams))]
+        user_id = rng.uuid()
+        users.append((user_id, f"User {i}", f"user{i}@{org}.example.com", team_id, org, i == 0, at(-24 * 300)))
+        members[team_id].append(user_id)
+        org_members[org].append(user_id)
+    admin_id = users[0][0]
+
+    alerts, deliveries, preferences, active = [], [], [], []
+    for i in range(scale.alerts):
+        alert_id, severity = rng.uuid(), rng.pick(SEVERITY_WEIGHTS)
+        vtype, status = rng.pick(VISIBILITY_WEIGHTS), rng.pick(STATUS_WEIGHTS)
+        if vtype == 'organization':
+            target = rng.choice(orgs)
+            audience = org_members[target]
+        elif vtype == 'team':
+            target = rng.choice(teams)[0]
+            audience = members[target]
+        else:
+            target = rng.choice(users)[0]
+            audience = [target]
+        created = -rng.randrange(1, 24 * 30)
+        # Active alerts run past the anchor; the rest ended before it
+        expiry = rng.randrange(24, 24 * 14) if status == 'active' else created + 1 + rng.randrange(-created)
+        reminders = rng.random() < 0.8
+        title = f"Alert {i}: {rng.choice(('disk', 'cpu', 'latency', 'errors', 'deploy'))} on node {rng.randrange(500)}"
+        alerts.append((alert_id, title, f"Synthetic alert {i}", severity, rng.pick(DELIVERY_WEIGHTS), vtype, target,
+                       at(created), at(expiry), 2, reminders, admin_id, at(created), at(created), status,
+                       alert_fingerprint(title, vtype, target), 1, at(created)))
+        if status == 'active':
+            active.append(alert_id)
+
+        for user_id in rng.sample(audience, min(len(audience), scale.history_per_alert)):
+            delivered = at(created + rng.random())
+            deliveries.append((rng.uuid(), alert_id, user_id, alerts[-1][4], delivered,
+                               rng.pick(DELIVERY_STATUS_WEIGHTS)))
+            state = rng.pick(PREFERENCE_WEIGHTS)
+            read_at = at(created + rng.random() * 4) if state == 'read' else None
+            snoozed_until = at(24) if state == 'snoozed' else None
+            next_reminder = at(rng.random() * 2) if state == 'unread' and reminders and status == 'active' else None
+            preferences.append((rng.uuid(), user_id, alert_id, state, snoozed_until, None, read_at,
+                                delivered, delivered, next_reminder))
+
+    with db_manager.transaction() as conn:
+        _insert(conn, "INSERT INTO teams (id, name, organization_id, created_at) VALUES (?, ?, ?, ?)", teams)
+        _insert(conn, """INSERT INTO users (id, name, email, team_id, organization_id, is_admin, created_at)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)""", users)
+        _insert(conn, """INSERT INTO alerts (id, title, message, severity, delivery_type, visibility_type,
+                         visibility_target, start_time, expiry_time, reminder_frequency_hours, reminders_enabled,
+                         created_by, created_at, updated_at, status, fingerprint, occurrence_count, last_seen_at)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", alerts)
+        _insert(conn, """INSERT INTO notification_deliveries
+                         (id, alert_id, user_id, delivery_channel, delivered_at, delivery_status)
+                         VALUES (?, ?, ?, ?, ?, ?)""", deliveries)
+        _insert(conn, """INSERT INTO user_alert_preferences (id, user_id, alert_id, state, snoozed_until,
+                         last_reminded_at, read_at, created_at, updated_at, next_reminder_at)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", preferences)
+        rebuild_rollups(conn)
+    db_manager.execute("ANALYZE")
+
+    return Dataset(orgs, [t[0] for t in teams], [u[0] for u in users], [a[0] for a in alerts], active, admin_id)
+
+def describe(db_manager) -> Dict[str, Any]:
+    """Row counts of the generated tables"""
+    return {table: db_manager.scalar(f"SELECT COUNT(*) FROM {table}")
+            for table in ('teams', 'users', 'alerts', 'notification_deliveries', 'user_alert_preferences')}
+
+def main(argv=None):
+    from database.database_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', required=True, help="path of a new database file")
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    db_manager = DatabaseManager(args.db)
+    started = time.perf_counter()
+    generate(db_manager, SCALES[args.scale], args.seed)
+    print(json.dumps({'scale': args.scale, 'seed': args.seed, 'rows': describe(db_manager),
+                      'seconds': round(time.perf_counter() - started, 2)}, indent=2))
+
+if __name__ == '__main__':
+    main()
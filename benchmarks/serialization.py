@@ -0,0 +1,90 @@
+"""Compare alert serialization paths used by the list endpoints.
+
+    python -m benchmarks.serialization [--rows 10000] [--repeat 5]
+
+``asdict`` is the previous ``dataclasses.asdict`` based ``to_dict``;
+``compiled`` builds Alert objects from rows and uses the generated
+serializer; ``row_mapper`` maps rows straight to dicts by column name.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import uuid
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
+from database.database_manager import DatabaseManager
+from services.alert_service import AlertService
+
+COLUMNS = ('id', 'title', 'message', 'severity', 'delivery_type', 'visibility_type',
+           'visibility_target', 'start_time', 'expiry_time', 'reminder_frequency_hours',
+           'reminders_enabled', 'created_by', 'created_at', 'updated_at', 'status',
+           'fingerprint', 'occurrence_count', 'last_seen_at')
+
+def make_rows(n):
+    now = datetime(2024, 1, 1)
+    severities = ('info', 'warning', 'critical')
+    return [(str(uuid.UUID(int=i)), f"Alert {i}", "Disk usage above threshold on node", severities[i % 3],
+             'in_app', 'organization', 'org_001', now.isoformat(), (now + timedelta(days=1)).isoformat(),
+             2, 1, 'admin', now.isoformat(), now.isoformat(), 'active', f"{i:032x}", 1, now.isoformat())
+            for i in range(n)]
+
+def legacy_to_dict(alert):
+    data = asdict(alert)
+    data['severity'] = alert.severity.value
+    data['delivery_type'] = alert.delivery_type.value
+    data['visibility_type'] = alert.visibility_type.value
+    data['status'] = alert.status.value
+    data['start_time'] = alert.start_time.isoformat()
+    data['expiry_time'] = alert.expiry_time.isoformat()
+    data['created_at'] = alert.created_at.isoformat()
+    data['updated_at'] = alert.updated_at.isoformat()
+    data['last_seen_at'] = alert.last_seen_at.isoformat()
+    return data
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    service = AlertService(DatabaseManager(os.path.join(tempfile.mkdtemp(), 'bench.db')))
+    rows = make_rows(args.rows)
+    paths = {
+        'asdict': lambda: [legacy_to_dict(service._row_to_alert(r)) for r in rows],
+        'compiled': lambda: [service._row_to_alert(r).to_dict() for r in rows],
+        'row_mapper': lambda: service.rows_to_dicts(COLUMNS, rows),
+    }
+
+    report, outputs = {'rows': args.rows, 'paths': {}}, {}
+    for name, fn in paths.items():
+        seconds, outputs[name] = timed(fn, args.repeat)
+        report['paths'][name] = {'seconds': round(seconds, 4),
+                                 'rows_per_second': round(args.rows / seconds)}
+    baseline = report['paths']['asdict']['seconds']
+    for stats in report['paths'].values():
+        stats['speedup'] = round(baseline / stats['seconds'], 2)
+    report['identical_output'] = outputs['asdict'] == outputs['compiled'] == outputs['row_mapper']
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    alerts = [service._row_to_alert(r) for r in rows]
+    report['bytes_per_alert'] = round((tracemalloc.get_traced_memory()[0] - before) / len(alerts))
+    report['alert_has_dict'] = hasattr(alerts[0], '__dict__')
+    tracemalloc.stop()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""Benchmark the hot paths against a generated large-organization dataset.
+
+    python -m benchmarks.suite run [--scale medium] [--seed 42] [--output run.json]
+    python -m benchmarks.suite compare base.json head.json [--threshold 0.1]
+
+``run`` generates a fresh temporary database (see ``benchmarks.generator``),
+swaps every delivery channel for an in-memory stub and times each scenario.
+Every scenario reports throughput, p50/p99 latency per operation and the
+peak Python memory allocated while it ran, as JSON. ``compare`` diffs two
+runs and exits with status 1 when a scenario regressed by more than the
+threshold in throughput, p99 latency or peak memory.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from benchmarks.generator import SCALES, Dataset, describe, generate
+from database.database_manager import DatabaseManager
+from models.alert import DeliveryType
+from notification_channels.base_channel import NotificationChannel
+
+class StubChannel(NotificationChannel):
+    """Accepts every notification without any I/O"""
+
+    def __init__(self, channel_type: DeliveryType):
+        self.channel_type = channel_type
+        self.sent = 0
+
+    def send_notification(self, user, alert, metadata=None) -> bool:
+        self.sent += 1
+        return True
+
+    def send_batch(self, users, alert, metadata=None):
+        self.sent += len(users)
+        return {user.id: True for user in users}
+
+    def get_channel_type(self):
+        return self.channel_type
+
+class Context(NamedTuple):
+    db: DatabaseManager
+    data: Dataset
+    rng: random.Random
+    services: Dict[str, Any]
+
+class Scenario(NamedTuple):
+    name: str
+    ops: int
+    run: Callable[[Context], int]  # one operation; returns the number of items it handled
+    description: str
+
+def _base_alert(ctx: Context, title: str) -> Dict[str, Any]:
+    now = datetime.now()
+    return {'title': title, 'message': "Benchmark alert", 'severity': ctx.rng.choice(('info', 'warning', 'critical')),
+            'delivery_type': 'in_app', 'start_time': (now - timedelta(minutes=1)).isoformat(),
+            'expiry_time': (now + timedelta(days=1)).isoformat(), 'created_by': ctx.data.admin_id}
+
+def create_alert_fanout(ctx: Context) -> int:
+    """Create a team alert and drain its fan-out through the outbox worker"""
+    worker = ctx.services['outbox_worker']
+    before = worker.stats['delivered']
+    alert = {**_base_alert(ctx, f"bench fanout {ctx.rng.getrandbits(64):x}"),
+             'visibility_type': 'team', 'visibility_target': ctx.rng.choice(ctx.data.teams)}
+    ctx.services['admin'].create_alert(alert)
+    while worker.run_once():
+        pass
+    return worker.stats['delivered'] - before
+
+def create_org_alert_fanout(ctx: Context) -> int:
+    """Create an organization-wide alert and drain its fan-out"""
+    worker = ctx.services['outbox_worker']
+    before = worker.stats['delivered']
+    alert = {**_base_alert(ctx, f"bench org fanout {ctx.rng.getrandbits(64):x}"),
+             'visibility_type': 'organization', 'visibility_target': ctx.rng.choice(ctx.data.organizations)}
+    ctx.services['admin'].create_alert(alert)
+    while worker.run_once():
+        pass
+    return worker.stats['delivered'] - before
+
+def get_user_alerts(ctx: Context) -> int:
+    return len(ctx.services['user'].get_user_alerts(ctx.rng.choice(ctx.data.users))['data'])
+
+def reminder_tick(ctx: Context, due: int = 200) -> int:
+    """Make ``due`` unread reminders due, queue them and drain them through the outbox"""
+    ctx.db.execute("""UPDATE user_alert_preferences SET next_reminder_at = ?
+                      WHERE rowid IN (SELECT rowid FROM user_alert_preferences
+                                      WHERE state = 'unread' AND next_reminder_at IS NOT NULL
+                                      ORDER BY next_reminder_at DESC LIMIT ?)""",
+                   ((datetime.now() - timedelta(seconds=1)).isoformat(), due))
+    worker = ctx.services['outbox_worker']
+    before = worker.stats['delivered']
+    ctx.services['scheduler']._process_due()
+    while worker.run_once():
+        pass
+    return worker.stats['delivered'] - before
+
+def analytics_system(ctx: Context) -> int:
+    ctx.services['analytics'].get_system_metrics()
+    return 1
+
+def analytics_alert(ctx: Context) -> int:
+    ctx.services['analytics'].get_alert_metrics(ctx.rng.choice(ctx.data.alerts))
+    return 1
+
+def mark_all_read(ctx: Context) -> int:
+    return ctx.services['user'].mark_all_read(ctx.rng.choice(ctx.data.users))['data']['updated']
+
+SCENARIOS = [
+    Scenario('create_alert_fanout', 50, create_alert_fanout, "team alert created and delivered via the outbox"),
+    Scenario('create_org_alert_fanout', 3, create_org_alert_fanout, "organization alert created and delivered"),
+    Scenario('get_user_alerts', 500, get_user_alerts, "GET /api/users/<id>/alerts"),
+    Scenario('reminder_tick', 20, reminder_tick, "200 due reminders queued and delivered"),
+    Scenario('analytics_system', 500, analytics_system, "GET /api/analytics/system"),
+    Scenario('analytics_alert', 500, analytics_alert, "GET /api/analytics/alerts/<id>"),
+    Scenario('mark_all_read', 200, mark_all_read, "POST /api/users/<id>/alerts/read-all"),
+]
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q * len(sorted_values) + 0.5) - 1))]
+
+def build_context(db: DatabaseManager, data: Dataset, seed: int) -> Context:
+    from controllers.admin_controller import AdminController
+    from controllers.user_controller import UserController
+    from services.analytics_service import AnalyticsService
+    from services.notification_service import NotificationService
+    from services.user_alert_preference_service import UserAlertPreferenceService
+    from utils.outbox_worker import OutboxWorker
+    from utils.scheduler import ReminderScheduler
+
+    notifier = NotificationService(db)
+    for channel_type in DeliveryType:
+        notifier.register_channel(channel_type, StubChannel(channel_type), concurrency=8, throttle=False)
+    admin = AdminController(db, notifier)
+    scheduler = ReminderScheduler(db, admin.outbox_service, UserAlertPreferenceService(db))
+    scheduler.running = True  # driven synchronously by reminder_tick, never started
+    return Context(db, data, random.Random(seed), {
+        'notifier': notifier, 'admin': admin, 'user': UserController(db), 'scheduler': scheduler,
+        'analytics': AnalyticsService(db),
+        'outbox_worker': OutboxWorker(db, notifier, admin.outbox_service, batch_size=1000),
+    })
+
+def run_scenario(ctx: Context, scenario: Scenario, ops: int, memory_ops: int) -> Dict[str, Any]:
+    """Time ``ops`` operations, then trace ``memory_ops`` more for peak memory"""
+    scenario.run(ctx)  # warm caches and prepared statements
+    latencies, items = [], 0
+    started = time.perf_counter()
+    for _ in range(ops):
+        op_started = time.perf_counter()
+        items += scenario.run(ctx)
+        latencies.append(time.perf_counter() - op_started)
+    elapsed = time.perf_counter() - started
+
+    # Tracing slows every allocation, so memory is measured apart from latency
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for _ in range(min(ops, memory_ops)):
+        scenario.run(ctx)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'description': scenario.description,
+        'ops': ops,
+        'items': items,
+        'seconds': round(elapsed, 4),
+        'ops_per_second': round(ops / elapsed, 2) if elapsed else 0.0,
+        'items_per_second': round(items / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'peak_memory_bytes': peak,
+    }
+
+def run(scale: str, seed: int, only: List[str], ops_factor: float, memory_ops: int) -> Dict[str, Any]:
+    db = DatabaseManager(os.path.join(tempfile.mkdtemp(prefix='alerting-bench-'), 'bench.db'))
+    started = time.perf_counter()
+    data = generate(db, SCALES[scale], seed)
+    report = {
+        'meta': {
+            'scale': scale, 'seed': seed, 'rows': describe(db),
+            'generate_seconds': round(time.perf_counter() - started, 2),
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(), 'started_at': datetime.now().isoformat(),
+        },
+        'scenarios': {}
+    }
+    ctx = build_context(db, data, seed)
+    try:
+        for scenario in SCENARIOS:
+            if only and scenario.name not in only:
+                continue
+            ops = max(1, int(scenario.ops * ops_factor))
+            report['scenarios'][scenario.name] = run_scenario(ctx, scenario, ops, memory_ops)
+            print(f"{scenario.name}: {report['scenarios'][scenario.name]['ops_per_second']} ops/s", file=sys.stderr)
+    finally:
+        ctx.services['notifier'].shutdown()
+    return report
+
+# metric -> True when higher is better
+COMPARED_METRICS = {'ops_per_second': True, 'p50_ms': False, 'p99_ms': False, 'peak_memory_bytes': False}
+GATED_METRICS = ('ops_per_second', 'p99_ms', 'peak_memory_bytes')
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """Relative change per scenario and metric; regressions exceed ``threshold`` in the bad direction"""
+    result = {'threshold': threshold, 'scenarios': {}, 'regressions': []}
+    if base['meta'].get('scale') != head['meta'].get('scale'):
+        result['warning'] = f"scales differ: {base['meta'].get('scale')} vs {head['meta'].get('scale')}"
+    for name, head_stats in head['scenarios'].items():
+        base_stats = base['scenarios'].get(name)
+        if base_stats is None:
+            continue
+        changes = {}
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = base_stats[metric], head_stats[metric]
+            change = (after - before) / before if before else 0.0
+            changes[metric] = {'base': before, 'head': after, 'change': round(change, 4)}
+            worse = -change if higher_is_better else change
+            if metric in GATED_METRICS and worse > threshold:
+                result['regressions'].append(f"{name}.{metric}")
+        result['scenarios'][name] = changes
+    return result
+
+def _print_comparison(result: Dict[str, Any]):
+    if 'warning' in result:
+        print(f"warning: {result['warning']}")
+    print(f"{'scenario':<26}{'metric':<20}{'base':>14}{'head':>14}{'change':>10}")
+    for name, changes in result['scenarios'].items():
+        for metric, change in changes.items():
+            flag = '  REGRESSED' if f"{name}.{metric}" in result['regressions'] else ''
+            print(f"{name:<26}{metric:<20}{change['base']:>14}{change['head']:>14}"
+                  f"{change['change'] * 100:>9.1f}%{flag}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="generate a dataset and run the scenarios")
+    run_parser.add_argument('--scale', choices=SCALES, default='medium')
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--scenario', action='append', default=[], choices=[s.name for s in SCENARIOS],
+                            help="run only this scenario (repeatable)")
+    run_parser.add_argument('--ops-factor', type=float, default=1.0, help="scale the operations per scenario")
+    run_parser.add_argument('--memory-ops', type=int, default=10, help="operations traced for peak memory")
+    run_parser.add_argument('--output', help="write the JSON report here instead of stdout")
+
+    compare_parser = commands.add_parser('compare', help="diff two reports and flag regressions")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+    compare_parser.add_argument('--threshold', type=float, default=0.10)
+    compare_parser.add_argument('--json', action='store_true', help="print the comparison as JSON")
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        report = run(args.scale, args.seed, args.scenario, args.ops_factor, args.memory_ops)
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+        return 0
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    result = compare(base, head, args.threshold)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        _print_comparison(result)
+    return 1 if result['regressions'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
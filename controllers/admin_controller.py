@@ -1,50 +1,60 @@
+import json
 import logging
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 class AdminController:
     """Controller for admin operations"""
     
-    def __init__(self, db_manager, notification_service):
+    REQUIRED_ALERT_FIELDS = ['title', 'message', 'severity', 'visibility_type', 'visibility_target',
+                             'start_time', 'expiry_time', 'created_by']
+    ALERT_DEFAULTS = {'delivery_type': 'in_app', 'reminder_frequency_hours': 2, 'reminders_enabled': True}
+    MAX_BULK_ALERTS = 1000
+    
+    def __init__(self, db_manager, notification_service, inbox_fanout: bool = False):
         self.db_manager = db_manager
         self.notification_service = notification_service
+        self.inbox_fanout = inbox_fanout
         self.logger = logging.getLogger(__name__)
         
         from services.alert_service import AlertService
         from services.user_service import UserService
+        from services.inbox_service import InboxService
+        from services.user_alert_preference_service import UserAlertPreferenceService
+        from services.outbox_service import OutboxService
         self.alert_service = AlertService(db_manager)
         self.user_service = UserService(db_manager)
+        self.inbox_service = InboxService(db_manager)
+        self.preference_service = UserAlertPreferenceService(db_manager)
+        self.outbox_service = OutboxService(db_manager, inbox_fanout)
     
     def create_alert(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new alert"""
         try:
             # Validate required fields
-            required_fields = ['title', 'message', 'severity', 'visibility_type', 'visibility_target', 'start_time', 'expiry_time', 'created_by']
-            missing_fields = [field for field in required_fields if field not in request_data]
+            missing_fields = [field for field in self.REQUIRED_ALERT_FIELDS if field not in request_data]
             
             if missing_fields:
                 return self.error_response(f"Missing required fields: {', '.join(missing_fields)}")
             
             # Set defaults
-            alert_data = {
-                'delivery_type': 'in_app',
-                'reminder_frequency_hours': 2,
-                'reminders_enabled': True,
-                **request_data
-            }
-            
-            alert = self.alert_service.create_alert(alert_data)
+            alert_data = {**self.ALERT_DEFAULTS, **request_data}
             
-            # Send initial notification
-            users = self.user_service.get_users_for_alert(alert)
-            if users:
-                delivery_results = self.notification_service.send_alert_to_users(alert, users)
-                return self.success_response({
-                    'alert': alert.to_dict(),
-                    'initial_delivery': delivery_results
-                }, "Alert created and sent successfully", 201)
-            else:
-                return self.success_response(alert.to_dict(), "Alert created but no target users found", 201)
+            # The alert and its fan-out job commit together; delivery happens
+            # asynchronously in the outbox worker. Repeats of an open alert are
+            # coalesced into it and only re-notify when they escalate.
+            alert, job_id, outcome = self.outbox_service.create_alert_with_job(self.alert_service, alert_data)
+            if outcome == self.alert_service.ESCALATED and self.inbox_fanout:
+                self.inbox_service.sync_alert(alert)
+            if job_id is None:
+                return self.success_response({'alert': alert.to_dict(), 'outcome': outcome, 'job_id': None},
+                                             "Repeat alert coalesced into an open alert")
+            return self.success_response({
+                'alert': alert.to_dict(),
+                'outcome': outcome,
+                'job_id': job_id,
+                'status_url': f"/api/admin/fanout-jobs/{job_id}"
+            }, f"Alert {outcome} and queued for delivery", 202)
             
         except ValueError as e:
             return self.error_response(str(e))
@@ -52,6 +62,166 @@ class AdminController:
             self.logger.error(f"Error creating alert: {str(e)}")
             return self.error_response("Internal server error", 500)
     
+    def create_alerts_bulk(self, body: bytes, content_type: str = "") -> Dict[str, Any]:
+        """Create many alerts from a JSON array or NDJSON body in one transaction.
+        
+        Every item is validated first; valid items are inserted together with
+        their fan-out jobs, and invalid ones are reported per item without
+        failing the batch.
+        """
+        try:
+            items = self._parse_bulk_body(body, content_type)
+        except ValueError as e:
+            return self.error_response(str(e))
+        if not items:
+            return self.error_response("No alerts in request body")
+        if len(items) > self.MAX_BULK_ALERTS:
+            return self.error_response(f"At most {self.MAX_BULK_ALERTS} alerts per request", 413)
+        
+        try:
+            results, alerts = [], []
+            for index, item in enumerate(items):
+                try:
+                    if isinstance(item, Exception):
+                        raise item
+                    if not isinstance(item, dict):
+                        raise ValueError("Alert must be a JSON object")
+                    missing_fields = [f for f in self.REQUIRED_ALERT_FIELDS if f not in item]
+                    if missing_fields:
+                        raise ValueError(f"Missing required fields: {', '.join(missing_fields)}")
+                    alert = self.alert_service.build_alert({**self.ALERT_DEFAULTS, **item})
+                except (ValueError, TypeError, KeyError) as e:
+                    results.append({'index': index, 'status': 'error', 'message': str(e)})
+                    continue
+                alerts.append(alert)
+                results.append({'index': index})
+            
+            stored = iter(self.outbox_service.create_alerts_with_jobs(self.alert_service, alerts)
+                          if alerts else [])
+            summary = {'created': 0, 'coalesced': 0, 'escalated': 0, 'failed': len(results) - len(alerts)}
+            for result in results:
+                if 'status' in result:
+                    continue
+                alert, outcome, job_id = next(stored)
+                summary[outcome] += 1
+                result.update(status=outcome, alert=alert.to_dict(), job_id=job_id)
+                if job_id:
+                    result['status_url'] = f"/api/admin/fanout-jobs/{job_id}"
+                if outcome == self.alert_service.ESCALATED and self.inbox_fanout:
+                    self.inbox_service.sync_alert(alert)
+            summary['results'] = results
+            
+            if not alerts:
+                return {**self.error_response("No valid alerts in request"), 'data': summary}
+            return self.success_response(summary, f"{summary['created']} alerts created, "
+                                                  f"{summary['coalesced'] + summary['escalated']} coalesced", 202)
+        
+        except Exception as e:
+            self.logger.error(f"Error creating alerts in bulk: {str(e)}")
+            return self.error_response("Internal server error", 500)
+    
+    @staticmethod
+    def _parse_bulk_body(body: bytes, content_type: str) -> List[Any]:
+        """Parse a JSON array, or NDJSON with one alert per line (bad lines become per-item errors)"""
+        text = body.decode('utf-8').strip() if body else ""
+        if text.startswith('[') and 'ndjson' not in content_type:
+            try:
+                items = json.loads(text)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON array: {e}")
+            return items
+        
+        items = []
+        for number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(ValueError(f"Invalid JSON on line {number}: {e}"))
+        return items
+    
+    def update_alert(self, alert_id: str, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Update an alert, re-targeting inbox rows when its audience changes"""
+        try:
+            previous = self.alert_service.get_alert_by_id(alert_id)
+            if not previous:
+                return self.error_response("Alert not found", 404)
+            
+            # The inbox follows the alert in the same transaction, so a failed
+            # re-target cannot leave user_inbox on the old audience or window
+            try:
+                with self.db_manager.transaction():
+                    alert = self.alert_service.update_alert(alert_id, request_data or {})
+                    self.preference_service.rearm_alert(alert)
+                    
+                    if self.inbox_fanout:
+                        retargeted = (alert.visibility_type != previous.visibility_type or
+                                      alert.visibility_target != previous.visibility_target)
+                        if retargeted:
+                            self.inbox_service.retarget(alert, self.user_service.audience.resolve_alert(alert))
+                        else:
+                            self.inbox_service.sync_alert(alert)
+            except Exception:
+                # Anything cached while the transaction was open was rolled back with it
+                self.alert_service.cache.invalidate()
+                raise
+            
+            return self.success_response(alert.to_dict(), "Alert updated successfully")
+            
+        except ValueError as e:
+            return self.error_response(str(e))
+        except Exception as e:
+            self.logger.error(f"Error updating alert {alert_id}: {str(e)}")
+            return self.error_response("Internal server error", 500)
+    
+    def get_alerts(self, admin_id: str, filters: Dict[str, str] = None) -> Dict[str, Any]:
+        """List alerts created by an admin, optionally filtered by severity, status or visibility"""
+        if not admin_id:
+            return self.error_response("admin_id is required")
+        try:
+            alerts = self.alert_service.get_alert_dicts(admin_id, filters)
+            return self.success_response(alerts, f"Found {len(alerts)} alerts")
+        except Exception as e:
+            self.logger.error(f"Error listing alerts: {str(e)}")
+            return self.error_response("Internal server error", 500)
+    
+    def get_fanout_job(self, job_id: str) -> Dict[str, Any]:
+        """Report delivery progress for a fan-out job"""
+        status = self.outbox_service.get_job_status(job_id)
+        if not status:
+            return self.error_response("Fan-out job not found", 404)
+        return self.success_response(status)
+    
+    def get_profiler(self, top: int = 20) -> Dict[str, Any]:
+        """Report the sampling profiler's state and hottest functions"""
+        from utils.instrumentation import profiler
+        return self.success_response(profiler.get_stats(top))
+
+    def set_profiler(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Start or stop the sampling profiler; ``interval_ms`` sets the sampling period"""
+        from utils.instrumentation import profiler
+        enabled = (request_data or {}).get('enabled')
+        interval_ms = (request_data or {}).get('interval_ms')
+        if not isinstance(enabled, bool):
+            return self.error_response("'enabled' must be true or false")
+        if interval_ms is not None and (not isinstance(interval_ms, (int, float)) or not 1 <= interval_ms <= 1000):
+            return self.error_response("'interval_ms' must be between 1 and 1000")
+        if enabled:
+            profiler.start(interval_ms / 1000 if interval_ms else None, reset=bool(request_data.get('reset', True)))
+        else:
+            profiler.stop()
+        return self.success_response(profiler.get_stats(), "Profiler started" if enabled else "Profiler stopped")
+
+    def backfill_inbox(self) -> Dict[str, Any]:
+        """Fan every active alert out into the user inbox table"""
+        try:
+            result = self.inbox_service.backfill(self.alert_service.get_active_alerts(), self.user_service)
+            return self.success_response(result, "Inbox backfill complete")
+        except Exception as e:
+            self.logger.error(f"Error backfilling inbox: {str(e)}")
+            return self.error_response("Internal server error", 500)
+    
     def success_response(self, data: Any, message: str = "Success", status_code: int = 200) -> Dict[str, Any]:
         """Create success response"""
         return {
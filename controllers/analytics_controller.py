@@ -1,9 +1,12 @@
 from datetime import datetime
 from services.analytics_service import AnalyticsService
+from services.lifecycle_service import history_source
+from services.timeseries_store import TimeSeriesStore
 
 class AnalyticsController:
     def __init__(self, db):
         self.metrics = AnalyticsService(db)
+        self.timeseries = TimeSeriesStore.for_db(db)
 
     def get_system_analytics(self):
         return {
@@ -13,4 +16,54 @@ class AnalyticsController:
         }
 
     def get_alert_analytics(self, aid):
-        return {"status": "success"}  # stub for brevity
+        # Archived alerts keep their rollups, so they still have analytics
+        with self.metrics.db.connection() as conn:
+            alerts = history_source(conn, "alerts", "id")
+            found = conn.execute(f"SELECT 1 FROM {alerts} WHERE id=?", (aid,)).fetchone()
+        if not found:
+            return {"status": "error", "message": "Alert not found",
+                    "timestamp": datetime.now().isoformat(), "status_code": 404}
+        return {
+            "status": "success",
+            "data": self.metrics.get_alert_metrics(aid),
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def get_timeseries(self, args):
+        try:
+            end = self._parse_time(args.get("to")) or datetime.now().timestamp()
+            start = self._parse_time(args.get("from")) or end - 3600
+            step = self._parse_step(args.get("step"))
+            data = self.timeseries.query(args.get("metric", "deliveries.sent"), start, end, step,
+                                         channel=args.get("channel"), severity=args.get("severity"))
+        except ValueError as e:
+            return {"status": "error", "message": str(e),
+                    "timestamp": datetime.now().isoformat(), "status_code": 400}
+        return {"status": "success", "data": data, "timestamp": datetime.now().isoformat()}
+
+    @staticmethod
+    def _parse_time(value):
+        """Accept epoch seconds or an ISO timestamp"""
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return datetime.fromisoformat(value).timestamp()
+
+    @staticmethod
+    def _parse_step(value):
+        """Accept seconds or a 30s/5m/1h/1d style duration"""
+        if not value:
+            return None
+        units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+        if value[-1] in units:
+            return int(value[:-1]) * units[value[-1]]
+        return int(value)
+
+    def rebuild_rollups(self):
+        return {
+            "status": "success",
+            "data": {"rollup_rows": self.metrics.rebuild()},
+            "timestamp": datetime.now().isoformat()
+        }
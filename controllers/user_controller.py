@@ -2,26 +2,57 @@ from datetime import datetime
 from services.user_service import UserService
 from services.alert_service import AlertService
 from services.user_alert_preference_service import UserAlertPreferenceService
+from services.inbox_service import InboxService
+from services.notification_stream import NotificationStreamHub
+from utils.instrumentation import metrics
 
 class UserController:
-    def __init__(self, db):
+    def __init__(self, db, inbox_fanout=False):
         self.user_srv = UserService(db)
         self.alert_srv = AlertService(db)
         self.pref_srv = UserAlertPreferenceService(db)
+        self.inbox_srv = InboxService(db)
+        self.stream_hub = NotificationStreamHub.for_db(db)
+        self.inbox_fanout = inbox_fanout
 
-    def get_user_alerts(self, uid):
+    def get_user_alerts(self, uid, limit=None, cursor=None, state=None, severity=None):
+        if self.inbox_fanout:
+            return self._get_inbox_page(uid, limit, cursor, state, severity)
         active = self.alert_srv.get_active_alerts()
+        if severity:
+            active = [a for a in active if a.severity.value == severity]
+        visible = self.user_srv.get_visible_alerts(uid, active)
+        prefs = self.pref_srv.get_or_create_many(uid, [a.id for a in visible])
         result = []
-        for a in active:
-            users = self.user_srv.get_users_for_team(a.visibility_target) \
-                    if a.visibility_type.value == "team" else []
-            if any(u.id == uid for u in users):
-                pref = self.pref_srv.get_or_create(uid, a.id)
+        with metrics.time('serialization_seconds', kind='alert'):
+            for a in visible:
                 data = a.to_dict()
-                data["state"] = pref.state.value
-                result.append(data)
+                data["state"] = prefs[a.id].state.value
+                if not state or data["state"] == state:
+                    result.append(data)
         return {"status": "success", "data": result, "timestamp": datetime.now().isoformat()}
 
+    def _get_inbox_page(self, uid, limit, cursor, state, severity):
+        try:
+            result, next_cursor = self.inbox_srv.get_inbox_dicts(uid, self.alert_srv, limit, cursor,
+                                                                 state, severity)
+        except ValueError as e:
+            return {"status": "error", "message": str(e), "status_code": 400,
+                    "timestamp": datetime.now().isoformat()}
+        return {"status": "success", "data": result, "next_cursor": next_cursor,
+                "timestamp": datetime.now().isoformat()}
+
+    def open_alert_stream(self, uid, last_event_id=None):
+        """Subscribe to a user's in-app notifications; returns an SSE frame iterator or an error response"""
+        if not self.user_srv.get_users_by_ids([uid]):
+            return {"status": "error", "message": "User not found", "status_code": 404,
+                    "timestamp": datetime.now().isoformat()}
+        subscription = self.stream_hub.subscribe(uid)
+        if subscription is None:
+            return {"status": "error", "message": "Too many open streams for this user", "status_code": 429,
+                    "timestamp": datetime.now().isoformat()}
+        return self.stream_hub.events(subscription, last_event_id)
+
     def mark_alert_read(self, uid, aid):
         self.pref_srv.mark_read(uid, aid)
         return {"status": "success"}
@@ -29,3 +60,26 @@ class UserController:
     def snooze_alert(self, uid, aid):
         self.pref_srv.snooze(uid, aid)
         return {"status": "success"}
+
+    def mark_alerts_read(self, uid, aids):
+        return self._bulk_update(uid, aids, self.pref_srv.mark_read_many)
+
+    def snooze_alerts(self, uid, aids):
+        return self._bulk_update(uid, aids, self.pref_srv.snooze_many)
+
+    def mark_all_read(self, uid, severity=None):
+        if self.inbox_fanout:
+            aids = self.inbox_srv.get_unread_alert_ids(uid, severity)
+        else:
+            active = self.alert_srv.get_active_alerts()
+            if severity:
+                active = [a for a in active if a.severity.value == severity]
+            aids = [a.id for a in self.user_srv.get_visible_alerts(uid, active)]
+        return self._bulk_update(uid, aids, self.pref_srv.mark_read_many)
+
+    def _bulk_update(self, uid, aids, update):
+        if not isinstance(aids, list) or not all(isinstance(a, str) for a in aids):
+            return {"status": "error", "message": "'alert_ids' must be a list of alert ids",
+                    "status_code": 400, "timestamp": datetime.now().isoformat()}
+        return {"status": "success", "data": {"updated": update(uid, aids)},
+                "timestamp": datetime.now().isoformat()}
@@ -0,0 +1,254 @@
+import queue
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from utils.instrumentation import metrics
+
+class _FlushRequest:
+    """Queue marker asking the writer to commit everything received before it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+_STOP = object()
+
+class BatchWriter(threading.Thread):
+    """Group-commit writer that persists queued records with executemany.
+
+    Producers hand records to a bounded queue and return immediately; when
+    the queue is full ``submit`` blocks, which applies backpressure to the
+    producers instead of growing memory without bound. The writer thread
+    commits a batch once ``batch_size`` records are buffered or
+    ``flush_interval`` seconds have passed since the first buffered record.
+    An optional ``on_flush(conn, records)`` hook runs inside the same
+    transaction, so derived tables commit atomically with the batch.
+
+    A batch whose transaction fails with a transient error (``SQLITE_BUSY``
+    or a locked database) stays at the front of the line and is retried up
+    to ``max_retries`` times with exponential backoff starting at
+    ``retry_backoff`` seconds. The writer takes no new records while backing
+    off, so a persistent failure pushes back on producers through the full
+    queue, and a batch that exhausts its retries is dropped.
+
+    Any other error means some record in the batch can never be written (a
+    constraint violation, a value that cannot be bound). The batch is split
+    in halves that are committed separately, down to single records, so only
+    the records that fail on their own are dead-lettered: logged, counted in
+    ``records_failed`` and kept in ``dead_letters`` (the most recent
+    ``dead_letter_limit``) with their error.
+    """
+
+    def __init__(self, db_manager, sql: str, to_params: Callable[[Any], Sequence[Any]],
+                 batch_size: int = 500, flush_interval: float = 0.05,
+                 max_queue_size: int = 10000, name: str = "batch-writer",
+                 on_flush: Optional[Callable[[Any, List[Any]], None]] = None,
+                 max_retries: int = 5, retry_backoff: float = 0.05, max_retry_backoff: float = 2.0,
+                 dead_letter_limit: int = 1000):
+        super().__init__(daemon=True, name=name)
+        self.db_manager = db_manager
+        self.sql = sql
+        self.to_params = to_params
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.logger = logging.getLogger(__name__)
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stopped = False
+        self._submit_lock = threading.Lock()  # nothing is queued behind the stop marker
+        self.dead_letters = deque(maxlen=dead_letter_limit)  # (record, error) written by no batch
+        self._backlog = deque()  # [records, attempts] of batches not committed yet, oldest first
+        self._retry_at = 0.0
+        self._waiting: List[_FlushRequest] = []  # flushes answered once the backlog clears
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'records_submitted': 0,
+            'records_written': 0,
+            'records_failed': 0,
+            'retries': 0,
+            'splits': 0,
+            'batches_flushed': 0,
+            'max_batch_size': 0,
+            'backpressure_waits': 0,
+            'flush_latency_ms_total': 0.0,
+            'flush_latency_ms_max': 0.0,
+            'last_flush_latency_ms': 0.0
+        }
+
+    def submit(self, record, timeout: Optional[float] = None):
+        """Queue a record for writing, blocking while the queue is full; raises once stopped"""
+        with self._submit_lock:
+            if self._stopped:
+                raise RuntimeError(f"{self.name} has been stopped")
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                with self._stats_lock:
+                    self._stats['backpressure_waits'] += 1
+                self._queue.put(record, timeout=timeout)
+        with self._stats_lock:
+            self._stats['records_submitted'] += 1
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every record submitted so far has been committed"""
+        with self._submit_lock:
+            if not self._stopped and self.is_alive():
+                request = _FlushRequest()
+                self._queue.put(request)
+            else:
+                request = None
+        if request is None:
+            # Stopping drains everything submitted before it
+            if self.is_alive():
+                self.join(timeout)
+            return self._queue.empty() and not self._backlog
+        return request.done.wait(timeout)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Drain the queue, commit the remaining records and stop the thread"""
+        with self._submit_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            if self.is_alive():
+                self._queue.put(_STOP)
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        batch: List[Any] = []
+        deadline = None
+        stopping = False
+
+        while True:
+            if self._backlog:
+                # Back off without taking new records, so a full queue pushes back on producers
+                time.sleep(max(0.0, self._retry_at - time.monotonic()))
+                self._drain_backlog()
+                continue
+            if stopping:
+                return
+
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+
+            if item is None or item is _STOP or isinstance(item, _FlushRequest):
+                self._write(batch)
+                batch, deadline = [], None
+                if isinstance(item, _FlushRequest):
+                    self._waiting.append(item)
+                    self._answer_flushes()
+                stopping = item is _STOP
+                continue
+
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch, deadline = [], None
+
+    def _write(self, batch: List[Any]):
+        """Queue a batch behind any that are waiting for a retry and commit what it can"""
+        if batch:
+            self._backlog.append([batch, 0])
+        self._drain_backlog()
+
+    def _drain_backlog(self):
+        while self._backlog:
+            entry = self._backlog[0]
+            records, attempts = entry
+            error = self._commit(records)
+            if error is None:
+                self._backlog.popleft()
+                continue
+            if not self._is_transient(error):
+                self._backlog.popleft()
+                self._split(records, error)
+                continue
+            entry[1] = attempts = attempts + 1
+            with self._stats_lock:
+                if attempts > self.max_retries:
+                    self._stats['records_failed'] += len(records)
+                else:
+                    self._stats['retries'] += 1
+            if attempts > self.max_retries:
+                self.logger.error(f"{self.name} dropped {len(records)} records after {self.max_retries} retries")
+                metrics.inc('batch_records_dropped', len(records), writer=self.name)
+                self._backlog.popleft()
+                continue
+            backoff = min(self.max_retry_backoff, self.retry_backoff * 2 ** (attempts - 1))
+            self._retry_at = time.monotonic() + backoff
+            return
+        self._answer_flushes()
+
+    def _split(self, records: List[Any], error: Exception):
+        """Retry the halves of a batch that cannot commit as a whole; dead-letter single records"""
+        if len(records) == 1:
+            self.logger.error(f"{self.name} dead-lettered a record: {str(error)}")
+            self.dead_letters.append((records[0], str(error)))
+            with self._stats_lock:
+                self._stats['records_failed'] += 1
+            metrics.inc('batch_records_dropped', 1, writer=self.name)
+            return
+        middle = len(records) // 2
+        self._backlog.extendleft([[records[middle:], 0], [records[:middle], 0]])
+        with self._stats_lock:
+            self._stats['splits'] += 1
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        message = str(error).lower()
+        return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+    def _answer_flushes(self):
+        if not self._backlog:
+            for request in self._waiting:
+                request.done.set()
+            self._waiting = []
+
+    def _commit(self, batch: List[Any]) -> Optional[Exception]:
+        """Commit one batch in a single transaction; returns the error if it failed"""
+        started = time.perf_counter()
+        try:
+            with self.db_manager.transaction() as conn:
+                conn.executemany(self.sql, [self.to_params(record) for record in batch])
+                if self.on_flush:
+                    self.on_flush(conn, batch)
+        except Exception as e:
+            self.logger.warning(f"{self.name} failed to write {len(batch)} records: {str(e)}")
+            return e
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._stats['records_written'] += len(batch)
+            self._stats['batches_flushed'] += 1
+            self._stats['max_batch_size'] = max(self._stats['max_batch_size'], len(batch))
+            self._stats['flush_latency_ms_total'] += latency_ms
+            self._stats['flush_latency_ms_max'] = max(self._stats['flush_latency_ms_max'], latency_ms)
+            self._stats['last_flush_latency_ms'] = latency_ms
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return batch size and flush latency counters"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches = stats['batches_flushed']
+        latency_total = stats.pop('flush_latency_ms_total')
+        stats['avg_batch_size'] = round(stats['records_written'] / batches, 2) if batches else 0
+        stats['avg_flush_latency_ms'] = round(latency_total / batches, 3) if batches else 0
+        stats['flush_latency_ms_max'] = round(stats['flush_latency_ms_max'], 3)
+        stats['last_flush_latency_ms'] = round(stats['last_flush_latency_ms'], 3)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['retry_backlog'] = sum(len(records) for records, _ in list(self._backlog))
+        return stats
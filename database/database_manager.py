@@ -1,93 +1,361 @@
 import sqlite3
 import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils.instrumentation import metrics
 
 class DatabaseManager:
-    """Handles database operations with SQLite"""
-    
-    def __init__(self, db_path: str = "alerting_platform.db"):
+    """Handles database operations with SQLite through a thread-aware connection pool"""
+
+    def __init__(self, db_path: str = "alerting_platform.db", pool_size: int = 10,
+                 busy_timeout_ms: int = 5000, statement_cache_size: int = 256,
+                 pool_timeout: float = 30.0, archive_path: Optional[str] = None):
         self.db_path = db_path
+        self.archive_path = archive_path  # attached as schema 'archive' for cold alert history
+        self.pool_size = pool_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.statement_cache_size = statement_cache_size
+        self.pool_timeout = pool_timeout
+        self.logger = logging.getLogger(__name__)
+
+        # Idle connections are kept LIFO so the warmest connection (and its
+        # statement cache) is handed out first
+        self._idle: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Condition()
+        self._local = threading.local()
+        self._open_connections = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'connections_created': 0,
+            'waits': 0,
+            'wait_time_ms': 0.0,
+            'timeouts': 0,
+            'max_in_use': 0
+        }
+
         self.init_database()
-    
+
+    def _create_connection(self) -> sqlite3.Connection:
+        """Open a new connection configured for concurrent use"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            isolation_level=None,  # transactions are managed explicitly
+            check_same_thread=False,  # connections move between threads via the pool
+            cached_statements=self.statement_cache_size
+        )
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        # Only takes effect on a new database (before WAL writes the header);
+        # existing files keep their mode until a VACUUM
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        if self.archive_path:
+            conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+            conn.execute("PRAGMA archive.journal_mode = WAL")
+            conn.execute("PRAGMA archive.synchronous = NORMAL")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Check a connection out of the pool, waiting if the pool is exhausted"""
+        with self._pool_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("DatabaseManager has been closed")
+
+            if not self._idle and self._open_connections >= self.pool_size:
+                self._stats['waits'] += 1
+                started = time.monotonic()
+                deadline = started + self.pool_timeout
+                while not self._idle and self._open_connections >= self.pool_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise sqlite3.OperationalError("Timed out waiting for a pooled database connection")
+                    self._pool_lock.wait(remaining)
+                self._stats['wait_time_ms'] += (time.monotonic() - started) * 1000
+
+            self._stats['checkouts'] += 1
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                self._open_connections += 1
+                self._stats['connections_created'] += 1
+                conn = None
+
+            in_use = self._open_connections - len(self._idle)
+            self._stats['max_in_use'] = max(self._stats['max_in_use'], in_use)
+
+        if conn is None:
+            try:
+                conn = self._create_connection()
+            except Exception:
+                with self._pool_lock:
+                    self._open_connections -= 1
+                    self._pool_lock.notify()
+                raise
+        return conn
+
+    def _release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool"""
+        if conn.in_transaction:
+            # Never hand out a connection with a dangling transaction
+            conn.rollback()
+
+        with self._pool_lock:
+            if self._closed:
+                self._open_connections -= 1
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._pool_lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Yield the calling thread's pooled connection.
+
+        Nested use on the same thread re-uses the connection that is already
+        checked out, so a service call made inside a transaction joins it.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        self._local.tx_depth = 0
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements in a single write transaction.
+
+        Transactions are re-entrant per thread: only the outermost block
+        issues BEGIN/COMMIT, and any exception rolls the whole unit back.
+        Callbacks registered with ``after_commit`` run once it has ended.
+        """
+        with self.connection() as conn:
+            outermost = self._local.tx_depth == 0
+            if outermost:
+                started = time.perf_counter()
+                conn.execute("BEGIN IMMEDIATE")
+                self._local.callbacks = []
+            self._local.tx_depth += 1
+            try:
+                yield conn
+            except BaseException:
+                self._local.tx_depth -= 1
+                if outermost:
+                    conn.rollback()
+                    self._run_callbacks(committed=False)
+                raise
+            else:
+                self._local.tx_depth -= 1
+                if outermost:
+                    try:
+                        conn.commit()
+                    except BaseException:
+                        self._run_callbacks(committed=False)
+                        raise
+                    metrics.observe('db_transaction_seconds', time.perf_counter() - started)
+                    self._run_callbacks(committed=True)
+
+    def after_commit(self, callback: Callable[[], Any], on_rollback: Optional[Callable[[], Any]] = None):
+        """Run ``callback`` once the calling thread's transaction commits, or ``on_rollback`` if it does not.
+
+        Outside a transaction the caller's statements have already been
+        committed, so ``callback`` runs immediately.
+        """
+        if getattr(self._local, 'conn', None) is None or self._local.tx_depth == 0:
+            callback()
+            return
+        self._local.callbacks.append((callback, on_rollback))
+
+    def _run_callbacks(self, committed: bool):
+        callbacks, self._local.callbacks = self._local.callbacks, []
+        for on_commit, on_rollback in callbacks:
+            callback = on_commit if committed else on_rollback
+            if callback is None:
+                continue
+            try:
+                callback()
+            except Exception as e:
+                self.logger.error(f"Transaction callback failed: {str(e)}")
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Execute a single statement and return the number of affected rows"""
+        with self.connection() as conn, metrics.time('db_query_seconds', op='execute'):
+            return conn.execute(sql, params).rowcount
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Sequence[Any]]) -> int:
+        """Execute a statement against every parameter set in one transaction"""
+        with self.transaction() as conn, metrics.time('db_query_seconds', op='executemany'):
+            return conn.executemany(sql, seq_of_params).rowcount
+
+    def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        with self.connection() as conn, metrics.time('db_query_seconds', op='fetchone'):
+            return conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        with self.connection() as conn, metrics.time('db_query_seconds', op='fetchall'):
+            return conn.execute(sql, params).fetchall()
+
+    def fetchall_with_columns(self, sql: str, params: Sequence[Any] = ()) -> Tuple[Tuple[str, ...], List[tuple]]:
+        """Return (column names, rows) for callers that map rows by column name"""
+        with self.connection() as conn, metrics.time('db_query_seconds', op='fetchall'):
+            cursor = conn.execute(sql, params)
+            return tuple(d[0] for d in cursor.description), cursor.fetchall()
+
+    def scalar(self, sql: str, params: Sequence[Any] = ()) -> Any:
+        """Return the first column of the first row, or None"""
+        row = self.fetchone(sql, params)
+        return row[0] if row else None
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Return connection pool utilization statistics"""
+        with self._pool_lock:
+            idle = len(self._idle)
+            stats = dict(self._stats)
+            stats.update({
+                'pool_size': self.pool_size,
+                'open_connections': self._open_connections,
+                'in_use': self._open_connections - idle,
+                'idle': idle,
+                'utilization': round((self._open_connections - idle) / self.pool_size * 100, 2)
+            })
+        stats['wait_time_ms'] = round(stats['wait_time_ms'], 3)
+        return stats
+
+    def close(self):
+        """Close idle connections; checked-out connections close on release"""
+        with self._pool_lock:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._open_connections -= 1
+
     def init_database(self):
         """Initialize database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                email TEXT NOT NULL UNIQUE,
-                team_id TEXT NOT NULL,
-                organization_id TEXT NOT NULL,
-                is_admin BOOLEAN DEFAULT FALSE,
-                created_at TEXT NOT NULL
-            )
-        ''')
-        
-        # Teams table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS teams (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                organization_id TEXT NOT NULL,
-                created_at TEXT NOT NULL
-            )
-        ''')
-        
-        # Alerts table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS alerts (
-                id TEXT PRIMARY KEY,
-                title TEXT NOT NULL,
-                message TEXT NOT NULL,
-                severity TEXT NOT NULL,
-                delivery_type TEXT NOT NULL,
-                visibility_type TEXT NOT NULL,
-                visibility_target TEXT NOT NULL,
-                start_time TEXT NOT NULL,
-                expiry_time TEXT NOT NULL,
-                reminder_frequency_hours INTEGER DEFAULT 2,
-                reminders_enabled BOOLEAN DEFAULT TRUE,
-                created_by TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                status TEXT DEFAULT 'active'
-            )
-        ''')
-        
-        # Notification deliveries table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notification_deliveries (
-                id TEXT PRIMARY KEY,
-                alert_id TEXT NOT NULL,
-                user_id TEXT NOT NULL,
-                delivery_channel TEXT NOT NULL,
-                delivered_at TEXT NOT NULL,
-                delivery_status TEXT DEFAULT 'sent',
-                FOREIGN KEY (alert_id) REFERENCES alerts (id),
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # User alert preferences table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_alert_preferences (
-                id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                alert_id TEXT NOT NULL,
-                state TEXT NOT NULL,
-                snoozed_until TEXT,
-                last_reminded_at TEXT,
-                read_at TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (alert_id) REFERENCES alerts (id),
-                UNIQUE(user_id, alert_id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+
+            # Users table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    email TEXT NOT NULL UNIQUE,
+                    team_id TEXT NOT NULL,
+                    organization_id TEXT NOT NULL,
+                    is_admin BOOLEAN DEFAULT FALSE,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+
+            # Teams table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS teams (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    organization_id TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+
+            # Alerts table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS alerts (
+                    id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    severity TEXT NOT NULL,
+                    delivery_type TEXT NOT NULL,
+                    visibility_type TEXT NOT NULL,
+                    visibility_target TEXT NOT NULL,
+                    start_time TEXT NOT NULL,
+                    expiry_time TEXT NOT NULL,
+                    reminder_frequency_hours INTEGER DEFAULT 2,
+                    reminders_enabled BOOLEAN DEFAULT TRUE,
+                    created_by TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    status TEXT DEFAULT 'active'
+                )
+            ''')
+
+            # Notification deliveries table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS notification_deliveries (
+                    id TEXT PRIMARY KEY,
+                    alert_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    delivery_channel TEXT NOT NULL,
+                    delivered_at TEXT NOT NULL,
+                    delivery_status TEXT DEFAULT 'sent',
+                    FOREIGN KEY (alert_id) REFERENCES alerts (id),
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+
+            # User alert preferences table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_alert_preferences (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    alert_id TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    snoozed_until TEXT,
+                    last_reminded_at TEXT,
+                    read_at TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    FOREIGN KEY (user_id) REFERENCES users (id),
+                    FOREIGN KEY (alert_id) REFERENCES alerts (id),
+                    UNIQUE(user_id, alert_id)
+                )
+            ''')
+
+            # Fan-out-on-write user inbox (one row per alert recipient)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_inbox (
+                    user_id TEXT NOT NULL,
+                    alert_id TEXT NOT NULL,
+                    severity TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'unread',
+                    start_time TEXT NOT NULL,
+                    expiry_time TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (user_id, alert_id),
+                    FOREIGN KEY (user_id) REFERENCES users (id),
+                    FOREIGN KEY (alert_id) REFERENCES alerts (id)
+                )
+            ''')
+
+        # Secondary indexes and later schema changes
+        from database.migrations import run_migrations, check_query_plans
+        version = run_migrations(self)
+        self.logger.info(f"Database schema at version {version}")
+
+        for name, result in check_query_plans(self).items():
+            if not result['uses_index']:
+                self.logger.warning(f"Hot query '{name}' does not use {result['expected_index']}: "
+                                    f"{' | '.join(result['plan'])}")
+
+    def get_schema_version(self) -> int:
+        from database.migrations import get_schema_version
+        with self.connection() as conn:
+            return get_schema_version(conn)
@@ -1 +1,3 @@
 from .database_manager import DatabaseManager
+from .batch_writer import BatchWriter
+from .migrations import run_migrations, check_query_plans
@@ -0,0 +1,346 @@
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+Step = Union[str, Callable[[Any], None]]
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    steps: Sequence[Step]
+
+def add_column(table: str, column: str, ddl: str) -> Callable[[Any], None]:
+    """Build a step that adds a column only if the table does not have it yet"""
+    def step(conn):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return step
+
+def _backfill_alert_fingerprints(conn):
+    """Give existing alerts the default fingerprint so repeats coalesce into them"""
+    from services.alert_dedup import alert_fingerprint
+    rows = conn.execute("""SELECT id, title, visibility_type, visibility_target FROM alerts
+                           WHERE fingerprint IS NULL""").fetchall()
+    conn.executemany("UPDATE alerts SET fingerprint = ? WHERE id = ?",
+                     [(alert_fingerprint(title, vtype, target), aid) for aid, title, vtype, target in rows])
+
+def _rebuild_analytics_rollups(conn):
+    """Seed the rollup table from the rows that already exist"""
+    from services.analytics_service import rebuild_rollups
+    rebuild_rollups(conn)
+
+# Ordered schema changes applied at startup. Each runs once in its own
+# transaction and is recorded in schema_version; steps must be idempotent
+# (IF NOT EXISTS, add_column) because databases created by older versions of
+# init_database may already contain part of a change.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Index active alerts by status and time window", [
+        "CREATE INDEX IF NOT EXISTS idx_alerts_status_expiry "
+        "ON alerts (status, expiry_time, start_time)",
+    ]),
+    Migration(2, "Index user alert preferences by user and state", [
+        "CREATE INDEX IF NOT EXISTS idx_user_alert_preferences_user_state "
+        "ON user_alert_preferences (user_id, state)",
+    ]),
+    Migration(3, "Index notification deliveries by alert", [
+        "CREATE INDEX IF NOT EXISTS idx_notification_deliveries_alert "
+        "ON notification_deliveries (alert_id, delivered_at)",
+    ]),
+    Migration(4, "Index user inbox for range reads and re-targeting", [
+        "CREATE INDEX IF NOT EXISTS idx_user_inbox_user_created "
+        "ON user_inbox (user_id, created_at DESC, alert_id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_user_inbox_alert ON user_inbox (alert_id)",
+    ]),
+    Migration(5, "Track next reminder time per user alert preference", [
+        add_column("user_alert_preferences", "next_reminder_at", "TEXT"),
+        "CREATE INDEX IF NOT EXISTS idx_user_alert_preferences_next_reminder "
+        "ON user_alert_preferences (next_reminder_at) WHERE next_reminder_at IS NOT NULL",
+    ]),
+    Migration(6, "Add durable fan-out outbox", [
+        """CREATE TABLE IF NOT EXISTS fanout_jobs (
+            id TEXT PRIMARY KEY,
+            alert_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            total_recipients INTEGER NOT NULL DEFAULT 0,
+            sent_count INTEGER NOT NULL DEFAULT 0,
+            dead_count INTEGER NOT NULL DEFAULT 0,
+            retry_count INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires_at TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            completed_at TEXT,
+            FOREIGN KEY (alert_id) REFERENCES alerts (id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS fanout_job_recipients (
+            job_id TEXT NOT NULL,
+            alert_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TEXT NOT NULL,
+            last_error TEXT,
+            lease_owner TEXT,
+            lease_expires_at TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (job_id, user_id),
+            FOREIGN KEY (job_id) REFERENCES fanout_jobs (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_fanout_jobs_status ON fanout_jobs (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_fanout_job_recipients_due "
+        "ON fanout_job_recipients (status, next_attempt_at)",
+        "CREATE INDEX IF NOT EXISTS idx_fanout_job_recipients_lease "
+        "ON fanout_job_recipients (lease_owner) WHERE lease_owner IS NOT NULL",
+    ]),
+    Migration(7, "Persist in-app notifications", [
+        """CREATE TABLE IF NOT EXISTS in_app_notifications (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            alert_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            body TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            delivered_at TEXT NOT NULL,
+            is_read INTEGER NOT NULL DEFAULT 0
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_in_app_notifications_user "
+        "ON in_app_notifications (user_id, delivered_at)",
+    ]),
+    Migration(8, "Add incrementally maintained analytics rollups", [
+        """CREATE TABLE IF NOT EXISTS analytics_rollups (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, key, metric)
+        ) WITHOUT ROWID""",
+        _rebuild_analytics_rollups,
+    ]),
+    Migration(9, "Track cache generations for cross-process invalidation", [
+        """CREATE TABLE IF NOT EXISTS cache_generations (
+            name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL DEFAULT 0
+        )""",
+        "INSERT OR IGNORE INTO cache_generations (name, generation) VALUES ('alerts', 0)",
+    ]),
+    Migration(10, "Deduplicate alerts by fingerprint", [
+        add_column("alerts", "fingerprint", "TEXT"),
+        add_column("alerts", "occurrence_count", "INTEGER NOT NULL DEFAULT 1"),
+        add_column("alerts", "last_seen_at", "TEXT"),
+        "UPDATE alerts SET last_seen_at = created_at WHERE last_seen_at IS NULL",
+        _backfill_alert_fingerprints,
+        "CREATE INDEX IF NOT EXISTS idx_alerts_fingerprint "
+        "ON alerts (fingerprint, last_seen_at) WHERE fingerprint IS NOT NULL",
+    ]),
+    Migration(11, "Claim fan-out recipients by alert severity", [
+        add_column("fanout_job_recipients", "priority", "INTEGER NOT NULL DEFAULT 0"),
+        """UPDATE fanout_job_recipients SET priority = CASE
+               (SELECT severity FROM alerts WHERE alerts.id = fanout_job_recipients.alert_id)
+               WHEN 'critical' THEN 2 WHEN 'warning' THEN 1 ELSE 0 END
+           WHERE status = 'pending'""",
+        "CREATE INDEX IF NOT EXISTS idx_fanout_job_recipients_priority "
+        "ON fanout_job_recipients (status, priority, next_attempt_at)",
+    ]),
+    Migration(12, "Partition fan-out recipients by user for multi-process workers", [
+        add_column("fanout_job_recipients", "partition", "INTEGER NOT NULL DEFAULT 0"),
+        "CREATE INDEX IF NOT EXISTS idx_fanout_job_recipients_partition "
+        "ON fanout_job_recipients (status, partition, priority, next_attempt_at)",
+    ]),
+    Migration(13, "Index alert-owned rows for expiry and archival", [
+        "CREATE INDEX IF NOT EXISTS idx_user_alert_preferences_alert ON user_alert_preferences (alert_id)",
+        "CREATE INDEX IF NOT EXISTS idx_in_app_notifications_alert ON in_app_notifications (alert_id)",
+        "CREATE INDEX IF NOT EXISTS idx_fanout_jobs_alert ON fanout_jobs (alert_id)",
+    ]),
+    Migration(14, "Count digested alerts apart from deliveries in the rollups", [
+        _rebuild_analytics_rollups,
+    ]),
+    Migration(15, "Store the outbox partition count shared by the API and delivery workers", [
+        """CREATE TABLE IF NOT EXISTS outbox_settings (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )""",
+        "INSERT OR IGNORE INTO outbox_settings (name, value) VALUES ('partitions', 1)",
+    ]),
+    Migration(16, "Relay delivery metrics from worker processes to the API", [
+        """CREATE TABLE IF NOT EXISTS worker_metrics (
+            worker TEXT PRIMARY KEY,
+            snapshot TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )""",
+        # AUTOINCREMENT: the API follows ids, so pruned ids must never be reused
+        """CREATE TABLE IF NOT EXISTS timeseries_samples (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            metric TEXT NOT NULL,
+            value REAL NOT NULL,
+            count INTEGER NOT NULL,
+            recorded_at REAL NOT NULL,
+            channel TEXT,
+            severity TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_timeseries_samples_recorded ON timeseries_samples (recorded_at)",
+    ]),
+    Migration(17, "Tag reminder fan-out jobs so acknowledged recipients can be skipped", [
+        add_column("fanout_jobs", "kind", "TEXT NOT NULL DEFAULT 'alert'"),
+    ]),
+    Migration(18, "Store alerts held for digests so a restart does not lose them", [
+        """CREATE TABLE IF NOT EXISTS held_digest_alerts (
+            user_id TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            alert_id TEXT NOT NULL,
+            held_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, channel, alert_id)
+        )""",
+    ]),
+]
+
+def hot_queries() -> Dict[str, Dict[str, Any]]:
+    """Hot queries and the index each one is expected to use.
+
+    The SQL is the constant the owning service runs, so the plan checked at
+    startup is the plan served in production.
+    """
+    from notification_channels.in_app_channel import InAppChannel
+    from services.alert_dedup import FingerprintIndex
+    from services.alert_service import AlertService
+    from services.inbox_service import InboxService
+    from services.lifecycle_service import LifecycleService
+    from services.outbox_service import OutboxService
+    from services.user_alert_preference_service import UserAlertPreferenceService
+    from utils.scheduler import ReminderScheduler
+
+    due_recipients = OutboxService.DUE_RECIPIENTS_SQL.format
+    return {
+        'active_alerts': {
+            'sql': AlertService.UNEXPIRED_SQL,
+            'params': ('',),
+            'index': 'idx_alerts_status_expiry'
+        },
+        'expired_alerts': {
+            'sql': LifecycleService.EXPIRED_SQL,
+            'params': ('', 1),
+            'index': 'idx_alerts_status_expiry'
+        },
+        'archivable_alerts': {
+            'sql': LifecycleService.ARCHIVABLE_SQL,
+            'params': ('', 1),
+            'index': 'idx_alerts_status_expiry'
+        },
+        'alert_preferences': {
+            'sql': LifecycleService.DRAIN_SQL.format(table='user_alert_preferences', where='alert_id IN (?)'),
+            'params': ('', 1),
+            'index': 'idx_user_alert_preferences_alert'
+        },
+        'user_preferences': {
+            'sql': UserAlertPreferenceService.SELECT_BULK_SQL.format(fixed_col='user_id', key_col='alert_id',
+                                                                     marks='?'),
+            'params': ('', ''),
+            'index': 'sqlite_autoindex_user_alert_preferences'  # UNIQUE (user_id, alert_id)
+        },
+        'alert_deliveries': {
+            'sql': LifecycleService.DRAIN_SQL.format(table='notification_deliveries', where='alert_id IN (?)'),
+            'params': ('', 1),
+            'index': 'idx_notification_deliveries_alert'
+        },
+        'due_reminders': {
+            'sql': UserAlertPreferenceService.DUE_REMINDERS_SQL,
+            'params': ('', '', 1),
+            'index': 'idx_user_alert_preferences_next_reminder'
+        },
+        'armed_reminders': {
+            'sql': ReminderScheduler.REFILL_SQL,
+            'params': ('',),
+            'index': 'idx_user_alert_preferences_next_reminder'
+        },
+        'due_fanout_recipients': {
+            'sql': due_recipients(condition=''),
+            'params': ('', '', 1),
+            'index': 'idx_fanout_job_recipients_due'
+        },
+        'alert_fingerprint': {
+            'sql': FingerprintIndex.LOOKUP_SQL,
+            'params': ('', '', ''),
+            'index': 'idx_alerts_fingerprint'
+        },
+        'prioritized_fanout_recipients': {
+            'sql': due_recipients(condition='AND priority = ?'),
+            'params': (0, '', '', 1),
+            'index': 'idx_fanout_job_recipients_priority'
+        },
+        'partitioned_fanout_recipients': {
+            'sql': due_recipients(condition='AND partition = ? AND priority = ?'),
+            'params': (0, 0, '', '', 1),
+            'index': 'idx_fanout_job_recipients_partition'
+        },
+        'in_app_notifications': {
+            'sql': InAppChannel.LOAD_USER_SQL,
+            'params': ('',),
+            'index': 'idx_in_app_notifications_user'
+        },
+        'user_inbox_page': {
+            'sql': InboxService.PAGE_SQL + InboxService.PAGE_ORDER_SQL,
+            'params': ('', '', '', 1),
+            'index': 'idx_user_inbox_user_created'
+        },
+    }
+
+def get_schema_version(conn) -> int:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def run_migrations(db_manager, migrations: Sequence[Migration] = None) -> int:
+    """Apply every pending migration in version order and return the schema version"""
+    migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+
+    with db_manager.connection() as conn:
+        current = get_schema_version(conn)
+
+    for migration in migrations:
+        if migration.version <= current:
+            continue
+        with db_manager.transaction() as conn:
+            # Another process may have applied it while we waited for the write lock
+            if get_schema_version(conn) >= migration.version:
+                continue
+            for step in migration.steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                         (migration.version, migration.description, datetime.now().isoformat()))
+        logger.info(f"Applied migration {migration.version}: {migration.description}")
+        current = migration.version
+
+    return current
+
+def check_query_plans(db_manager) -> Dict[str, Dict[str, Any]]:
+    """EXPLAIN each hot query and report whether it uses its expected index"""
+    report = {}
+    for name, query in hot_queries().items():
+        plan = [row[3] for row in db_manager.fetchall("EXPLAIN QUERY PLAN " + query['sql'], query['params'])]
+        report[name] = {
+            'plan': plan,
+            'expected_index': query['index'],
+            'uses_index': any(query['index'] in detail for detail in plan)
+        }
+    return report
+
+if __name__ == '__main__':
+    import sys
+    from database.database_manager import DatabaseManager
+
+    logging.basicConfig(level=logging.INFO)
+    db_manager = DatabaseManager(sys.argv[1] if len(sys.argv) > 1 else "alerting_platform.db")
+    print(f"Schema version: {db_manager.get_schema_version()}")
+    for name, result in check_query_plans(db_manager).items():
+        status = "OK     " if result['uses_index'] else "MISSING"
+        print(f"{status} {name}: {' | '.join(result['plan'])}")
@@ -1,12 +1,20 @@
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from enum import Enum
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
+from models.serialization import compile_serializer
 
 class Severity(Enum):
     INFO = "info"
     WARNING = "warning"
     CRITICAL = "critical"
+    
+    @property
+    def rank(self) -> int:
+        """Position in escalation order (info < warning < critical)"""
+        return _SEVERITY_RANK[self]
+
+_SEVERITY_RANK = {Severity.INFO: 0, Severity.WARNING: 1, Severity.CRITICAL: 2}
 
 class DeliveryType(Enum):
     IN_APP = "in_app"
@@ -23,7 +31,7 @@ class AlertStatus(Enum):
     EXPIRED = "expired"
     ARCHIVED = "archived"
 
-@dataclass
+@dataclass(slots=True)
 class Alert:
     id: str
     title: str
@@ -40,26 +48,21 @@ class Alert:
     created_at: datetime = None
     updated_at: datetime = None
     status: AlertStatus = AlertStatus.ACTIVE
+    fingerprint: Optional[str] = None  # repeats with the same fingerprint coalesce into this alert
+    occurrence_count: int = 1
+    last_seen_at: Optional[datetime] = None
     
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.now()
         if self.updated_at is None:
             self.updated_at = datetime.now()
+        if self.last_seen_at is None:
+            self.last_seen_at = self.created_at
     
     def is_active(self) -> bool:
         now = datetime.now()
         return (self.status == AlertStatus.ACTIVE and 
                 self.start_time <= now <= self.expiry_time)
-    
-    def to_dict(self) -> Dict[str, Any]:
-        data = asdict(self)
-        data['severity'] = self.severity.value
-        data['delivery_type'] = self.delivery_type.value
-        data['visibility_type'] = self.visibility_type.value
-        data['status'] = self.status.value
-        data['start_time'] = self.start_time.isoformat()
-        data['expiry_time'] = self.expiry_time.isoformat()
-        data['created_at'] = self.created_at.isoformat()
-        data['updated_at'] = self.updated_at.isoformat()
-        return data
+
+Alert.to_dict = compile_serializer(Alert)
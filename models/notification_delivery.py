@@ -1,23 +1,20 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
+from models.serialization import compile_serializer
 
 class Channel(Enum):
     IN_APP = "in_app"
     EMAIL = "email"
     SMS = "sms"
 
-@dataclass
+@dataclass(slots=True)
 class NotificationDelivery:
     id: str
     alert_id: str
     user_id: str
     delivery_channel: Channel
-    delivered_at: datetime = datetime.now()
+    delivered_at: datetime = field(default_factory=datetime.now)
     delivery_status: str = "sent"
 
-    def to_dict(self):
-        d = asdict(self)
-        d["delivery_channel"] = self.delivery_channel.value
-        d["delivered_at"] = self.delivered_at.isoformat()
-        return d
+NotificationDelivery.to_dict = compile_serializer(NotificationDelivery)
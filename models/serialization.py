@@ -0,0 +1,56 @@
+import dataclasses
+import typing
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Mapping, Sequence
+
+def _wire_expr(name: str, annotation) -> str:
+    """Source expression that converts attribute ``name`` of ``o`` to its JSON form"""
+    ref = f"o.{name}"
+    optional = False
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        annotation, optional = args[0], True
+
+    if isinstance(annotation, type) and issubclass(annotation, datetime):
+        # Timestamps default to None until __post_init__ fills them in
+        return f"({ref}.isoformat() if {ref} is not None else None)"
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        return f"({ref}.value if {ref} is not None else None)" if optional else f"{ref}.value"
+    return ref
+
+def compile_serializer(cls) -> Callable[[Any], Dict[str, Any]]:
+    """Generate a to_dict function for a dataclass that builds the wire dict in one expression.
+
+    Unlike ``dataclasses.asdict`` it does not deep-copy, and enum and datetime
+    fields are converted inline, so serializing a model is a single dict
+    literal.
+    """
+    hints = typing.get_type_hints(cls)
+    items = ", ".join(f"{f.name!r}: {_wire_expr(f.name, hints[f.name])}"
+                      for f in dataclasses.fields(cls))
+    namespace: Dict[str, Any] = {}
+    exec(f"def to_dict(o):\n    return {{{items}}}", namespace)
+    to_dict = namespace["to_dict"]
+    to_dict.__qualname__ = f"{cls.__name__}.to_dict"
+    return to_dict
+
+def compile_row_mapper(columns: Sequence[str], converters: Mapping[str, Callable[[Any], Any]] = None,
+                       rename: Mapping[str, str] = None) -> Callable[[Sequence[Any]], Dict[str, Any]]:
+    """Build a function that turns a DB row straight into a wire dict.
+
+    ``columns`` are the row's column names (``cursor.description`` order).
+    Stored values are already in wire form (ISO strings, enum values) for
+    most columns, so only those listed in ``converters`` are transformed and
+    no model object is built.
+    """
+    converters = dict(converters or {})
+    rename = dict(rename or {})
+    namespace: Dict[str, Any] = {"_c": converters}
+    items = []
+    for i, column in enumerate(columns):
+        key = rename.get(column, column)
+        value = f"_c[{column!r}](r[{i}])" if column in converters else f"r[{i}]"
+        items.append(f"{key!r}: {value}")
+    exec(f"def map_row(r):\n    return {{{', '.join(items)}}}", namespace)
+    return namespace["map_row"]
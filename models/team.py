@@ -1,14 +1,12 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field
 from datetime import datetime
+from models.serialization import compile_serializer
 
-@dataclass
+@dataclass(slots=True)
 class Team:
     id: str
     name: str
     organization_id: str
-    created_at: datetime = datetime.now()
+    created_at: datetime = field(default_factory=datetime.now)
 
-    def to_dict(self):
-        d = asdict(self)
-        d["created_at"] = self.created_at.isoformat()
-        return d
+Team.to_dict = compile_serializer(Team)
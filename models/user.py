@@ -1,8 +1,8 @@
 from datetime import datetime
-from typing import Dict, Any
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
+from models.serialization import compile_serializer
 
-@dataclass
+@dataclass(slots=True)
 class User:
     id: str
     name: str
@@ -15,8 +15,5 @@ class User:
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.now()
-    
-    def to_dict(self) -> Dict[str, Any]:
-        data = asdict(self)
-        data['created_at'] = self.created_at.isoformat()
-        return data
+
+User.to_dict = compile_serializer(User)
@@ -1,14 +1,15 @@
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from enum import Enum
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
+from models.serialization import compile_serializer
 
 class UserAlertState(Enum):
     UNREAD = "unread"
     READ = "read"
     SNOOZED = "snoozed"
 
-@dataclass
+@dataclass(slots=True)
 class UserAlertPreference:
     id: str
     user_id: str
@@ -17,6 +18,7 @@ class UserAlertPreference:
     snoozed_until: Optional[datetime] = None
     last_reminded_at: Optional[datetime] = None
     read_at: Optional[datetime] = None
+    next_reminder_at: Optional[datetime] = None
     created_at: datetime = None
     updated_at: datetime = None
     
@@ -35,12 +37,14 @@ class UserAlertPreference:
         """Snooze until next day at midnight"""
         tomorrow = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
         self.snoozed_until = tomorrow
+        self.next_reminder_at = tomorrow
         self.state = UserAlertState.SNOOZED
         self.updated_at = datetime.now()
     
     def mark_as_read(self):
         self.state = UserAlertState.READ
         self.read_at = datetime.now()
+        self.next_reminder_at = None  # reading an alert acknowledges it
         self.updated_at = datetime.now()
     
     def should_remind(self, reminder_frequency_hours: int) -> bool:
@@ -52,13 +56,5 @@ class UserAlertPreference:
             
         time_since_last_reminder = datetime.now() - self.last_reminded_at
         return time_since_last_reminder >= timedelta(hours=reminder_frequency_hours)
-    
-    def to_dict(self) -> Dict[str, Any]:
-        data = asdict(self)
-        data['state'] = self.state.value
-        data['snoozed_until'] = self.snoozed_until.isoformat() if self.snoozed_until else None
-        data['last_reminded_at'] = self.last_reminded_at.isoformat() if self.last_reminded_at else None
-        data['read_at'] = self.read_at.isoformat() if self.read_at else None
-        data['created_at'] = self.created_at.isoformat()
-        data['updated_at'] = self.updated_at.isoformat()
-        return data
+
+UserAlertPreference.to_dict = compile_serializer(UserAlertPreference)
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 import logging
 from typing import Dict, Any
+from models.alert import Severity
 
 class NotificationChannel(ABC):
     """Abstract base class for notification delivery channels"""
@@ -10,6 +11,21 @@ class NotificationChannel(ABC):
         """Send notification to user through this channel"""
         pass
     
+    def send_batch(self, users, alert, metadata: Dict[str, Any] = None) -> Dict[str, bool]:
+        """Send notification to many users, returning {user_id: success}.
+        
+        Channels that can deliver to several recipients per provider call
+        override this; the default falls back to one send_notification per user.
+        """
+        results = {}
+        for user in users:
+            try:
+                results[user.id] = bool(self.send_notification(user, alert, metadata))
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Failed to notify user {user.id}: {str(e)}")
+                results[user.id] = False
+        return results
+    
     @abstractmethod
     def get_channel_type(self):
         """Return the channel type"""
@@ -1,15 +1,144 @@
 import logging
+import smtplib
+import threading
+from email.message import EmailMessage
 from models.alert import DeliveryType
 from .base_channel import NotificationChannel
 
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP sessions open between sends"""
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.max_idle = cfg.get("pool_size", 4)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def release(self, conn, healthy=True):
+        if healthy:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    return
+        self._quit(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._quit(conn)
+
+    def _connect(self):
+        cfg = self.cfg
+        cls = smtplib.SMTP_SSL if cfg.get("use_ssl") else smtplib.SMTP
+        conn = cls(cfg["server"], cfg.get("port", 465 if cfg.get("use_ssl") else 25),
+                   timeout=cfg.get("timeout", 30))
+        if cfg.get("use_tls"):
+            conn.starttls()
+        if cfg.get("username"):
+            conn.login(cfg["username"], cfg.get("password", ""))
+        return conn
+
+    @staticmethod
+    def _quit(conn):
+        try:
+            conn.quit()
+        except smtplib.SMTPException:
+            conn.close()
+        except OSError:
+            pass
+
 class EmailChannel(NotificationChannel):
+    """Email delivery over pooled SMTP sessions.
+
+    Recipients are sent in chunks of ``batch_size`` RCPTs per message over a
+    reused connection, so a fan-out costs one SMTP transaction per chunk
+    instead of one connection per user. Without a configured ``server`` the
+    channel only logs, which keeps local setups working.
+    """
+
     def __init__(self, smtp_config=None):
         self.smtp = smtp_config or {}
         self.log = logging.getLogger(__name__)
+        self.batch_size = self.smtp.get("batch_size", 50)
+        self.sender = self.smtp.get("sender", "alerts@localhost")
+        self.pool = SMTPConnectionPool(self.smtp) if self.smtp.get("server") else None
 
     def send_notification(self, user, alert, metadata=None):
-        self.log.info("EMAIL -> %s : %s", user.email, alert.title)
-        return True
+        return self.send_batch([user], alert, metadata).get(user.id, False)
+
+    def send_batch(self, users, alert, metadata=None):
+        results = {u.id: False for u in users}
+        recipients = {}
+        for u in users:
+            if getattr(u, "email", None):
+                recipients.setdefault(u.email.lower(), []).append(u.id)
+
+        if self.pool is None:
+            # One line per batch; per-recipient lines only at DEBUG
+            self.log.info("EMAIL (no server) -> %d recipients : %s", len(users), alert.title)
+            if self.log.isEnabledFor(logging.DEBUG):
+                for u in users:
+                    self.log.debug("EMAIL -> %s : %s", u.email, alert.title)
+            results.update({uid: True for uids in recipients.values() for uid in uids})
+            return results
+
+        message = self._build_message(alert)
+        addresses = list(recipients)
+        for i in range(0, len(addresses), self.batch_size):
+            chunk = addresses[i:i + self.batch_size]
+            refused = self._send_chunk(message, chunk)
+            for address in chunk:
+                if address not in refused:
+                    for uid in recipients[address]:
+                        results[uid] = True
+        return results
+
+    def _send_chunk(self, message, addresses):
+        """Send one message to a chunk of RCPTs; returns the refused addresses"""
+        for attempt in range(2):
+            conn = None
+            try:
+                conn = self.pool.acquire()
+                refused = conn.send_message(message, from_addr=self.sender, to_addrs=addresses)
+                self.pool.release(conn)
+                return {a.lower() for a in refused}
+            except smtplib.SMTPRecipientsRefused as e:
+                self.pool.release(conn)
+                return {a.lower() for a in e.recipients}
+            except smtplib.SMTPServerDisconnected:
+                # Stale pooled session; reconnect once
+                if conn is not None:
+                    self.pool.release(conn, healthy=False)
+                if attempt:
+                    break
+            except (smtplib.SMTPException, OSError) as e:
+                if conn is not None:
+                    self.pool.release(conn, healthy=False)
+                self.log.error("SMTP send to %d recipients failed: %s", len(addresses), e)
+                break
+        return set(addresses)
+
+    def _build_message(self, alert):
+        formatted = self.format_message(alert)
+        msg = EmailMessage()
+        msg["Subject"] = formatted["title"]
+        msg["From"] = self.sender
+        msg["To"] = "undisclosed-recipients:;"
+        msg["X-Alert-Id"] = formatted["alert_id"]
+        msg["X-Alert-Severity"] = formatted["severity"]
+        msg.set_content(formatted["body"])
+        return msg
+
+    def close(self):
+        if self.pool:
+            self.pool.close()
 
     def get_channel_type(self):
         return DeliveryType.EMAIL
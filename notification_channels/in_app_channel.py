@@ -1,52 +1,298 @@
 import uuid
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+from .base_channel import NotificationChannel
+
+class InAppNotification:
+    """One stored in-app notification (slotted to keep per-record memory small)"""
+
+    __slots__ = ('id', 'user_id', 'alert_id', 'title', 'body', 'severity', 'delivered_at', 'read')
+
+    def __init__(self, id: str, user_id: str, alert_id: str, title: str, body: str,
+                 severity: str, delivered_at: str, read: bool = False):
+        self.id = id
+        self.user_id = user_id
+        self.alert_id = alert_id
+        self.title = title
+        self.body = body
+        self.severity = severity
+        self.delivered_at = delivered_at
+        self.read = read
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "alert_id": self.alert_id,
+            "title": self.title,
+            "body": self.body,
+            "severity": self.severity,
+            "delivered_at": self.delivered_at,
+            "read": self.read,
+            "channel": "in_app"
+        }
+
+class _UserNotifications:
+    """A user's notifications in delivery order.
+
+    ``loaded`` is False while the bucket only holds notifications delivered
+    since the user went cold; the stored history is merged in on first read.
+    """
+
+    __slots__ = ('items', 'loaded')
+
+    def __init__(self, loaded: bool):
+        self.items: List[InAppNotification] = []
+        self.loaded = loaded
 
 class InAppChannel(NotificationChannel):
-    """In-app notification delivery channel"""
-    
-    def __init__(self):
-        self.notifications_store = []  # In-memory store for demo
+    """In-app notification delivery channel.
+
+    Notifications are kept per user, with an id index for O(1) lookups. Each
+    user keeps at most ``max_per_user`` notifications. Past that, the oldest
+    read ones are evicted. Unread ones are only dropped once a user exceeds
+    twice the cap. With a ``db_manager`` every notification is also persisted to
+    ``in_app_notifications`` through a group-commit writer, and only the
+    ``warm_users`` most recently active users stay in memory; colder users
+    are reloaded from SQLite on demand.
+
+    Stored notifications are also published to a ``NotificationStreamHub``
+    (the database's shared hub by default) for Server-Sent Events clients.
+    """
+
+    LOAD_USER_SQL = "SELECT * FROM in_app_notifications WHERE user_id = ? ORDER BY delivered_at"
+
+    def __init__(self, db_manager=None, max_per_user: int = 500, warm_users: int = 10000, stream=None):
+        from services.notification_stream import NotificationStreamHub
+        self.db_manager = db_manager
+        self.stream = stream or (NotificationStreamHub.for_db(db_manager) if db_manager else NotificationStreamHub())
+        self.stream.replay_source = self.notifications_after
+        self.max_per_user = max_per_user
+        self.warm_users = warm_users if db_manager else None  # memory-only stores never evict users
         self.logger = logging.getLogger(__name__)
-    
+
+        self._users: "OrderedDict[str, _UserNotifications]" = OrderedDict()
+        self._by_id: Dict[str, InAppNotification] = {}
+        self._lock = threading.RLock()
+        self._stats = {'stored': 0, 'evicted': 0, 'users_loaded': 0, 'users_cooled': 0}
+
+        self.writer = self.evictions = None
+        if db_manager:
+            from database.batch_writer import BatchWriter
+            self.writer = BatchWriter(
+                db_manager,
+                """
+                INSERT OR IGNORE INTO in_app_notifications
+                (id, user_id, alert_id, title, body, severity, delivered_at, is_read)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                to_params=lambda n: (n.id, n.user_id, n.alert_id, n.title, n.body,
+                                     n.severity, n.delivered_at, int(n.read)),
+                name="in-app-writer"
+            )
+            self.evictions = BatchWriter(
+                db_manager,
+                "DELETE FROM in_app_notifications WHERE id = ?",
+                to_params=lambda notification_id: (notification_id,),
+                name="in-app-evictions"
+            )
+            self.writer.start()
+            self.evictions.start()
+
     def send_notification(self, user, alert, metadata: Dict[str, Any] = None) -> bool:
+        return self.send_batch([user], alert, metadata).get(user.id, False)
+
+    def send_batch(self, users, alert, metadata: Dict[str, Any] = None) -> Dict[str, bool]:
         try:
+            # Every recipient shares the same formatted strings
             formatted_message = self.format_message(alert)
-            
-            notification = {
-                "id": str(uuid.uuid4()),
-                "user_id": user.id,
-                "alert_id": alert.id,
-                "title": formatted_message["title"],
-                "body": formatted_message["body"],
-                "severity": formatted_message["severity"],
-                "delivered_at": datetime.now().isoformat(),
-                "read": False,
-                "channel": "in_app"
-            }
-            
-            self.notifications_store.append(notification)
-            
-            self.logger.info(f"In-app notification sent to user {user.id} for alert {alert.id}")
-            return True
-            
+            delivered_at = datetime.now().isoformat()
+            notifications = [
+                InAppNotification(str(uuid.uuid4()), user.id, alert.id, formatted_message["title"],
+                                  formatted_message["body"], formatted_message["severity"], delivered_at)
+                for user in users
+            ]
+
+            with self._lock:
+                for notification in notifications:
+                    self._add(notification)
+                self._cool_down()
+
+            if self.writer:
+                for notification in notifications:
+                    self.writer.submit(notification)
+            self.stream.publish(notifications)
+
+            self.logger.debug("In-app notification sent to %d users for alert %s", len(notifications), alert.id)
+            return {user.id: True for user in users}
+
         except Exception as e:
             self.logger.error(f"Failed to send in-app notification: {str(e)}")
-            return False
-    
+            return {user.id: False for user in users}
+
     def get_channel_type(self):
         from models.alert import DeliveryType
         return DeliveryType.IN_APP
-    
+
     def get_user_notifications(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all notifications for a specific user"""
-        return [n for n in self.notifications_store if n["user_id"] == user_id]
-    
+        with self._lock:
+            bucket = self._bucket(user_id, create=False)
+            notifications = [n.to_dict() for n in bucket.items] if bucket else []
+            self._cool_down()
+        return notifications
+
+    def notifications_after(self, user_id: str, notification_id: str, limit: int = 100) -> Optional[List[InAppNotification]]:
+        """Return the user's notifications delivered after ``notification_id``, oldest first.
+
+        None means the id is unknown (never delivered to this user, or evicted).
+        """
+        if self.db_manager is None:
+            with self._lock:
+                bucket = self._bucket(user_id, create=False)
+                ids = [n.id for n in bucket.items] if bucket else []
+                if notification_id not in ids:
+                    return None
+                return bucket.items[ids.index(notification_id) + 1:][:limit]
+
+        self.writer.flush()
+        anchor = self.db_manager.fetchone(
+            "SELECT delivered_at, rowid FROM in_app_notifications WHERE id = ? AND user_id = ?",
+            (notification_id, user_id))
+        if anchor is None:
+            return None
+        rows = self.db_manager.fetchall("""
+            SELECT * FROM in_app_notifications
+            WHERE user_id = ? AND (delivered_at, rowid) > (?, ?)
+            ORDER BY delivered_at, rowid LIMIT ?
+        """, (user_id, anchor[0], anchor[1], limit))
+        return [self._row_to_notification(row) for row in rows]
+
+    def get_notification(self, notification_id: str) -> Optional[Dict[str, Any]]:
+        """Look up one notification by id"""
+        with self._lock:
+            notification = self._by_id.get(notification_id)
+            if notification is not None:
+                return notification.to_dict()
+        row = self._fetch_row(notification_id)
+        return self._row_to_notification(row).to_dict() if row else None
+
     def mark_notification_read(self, notification_id: str) -> bool:
         """Mark a specific notification as read"""
-        for notification in self.notifications_store:
-            if notification["id"] == notification_id:
-                notification["read"] = True
-                return True
-        return False
+        with self._lock:
+            notification = self._by_id.get(notification_id)
+            if notification is not None:
+                notification.read = True
+
+        if self.db_manager is None:
+            return notification is not None
+
+        # The insert may still be queued in the writer
+        self.writer.flush()
+        updated = self.db_manager.execute(
+            "UPDATE in_app_notifications SET is_read = 1 WHERE id = ?", (notification_id,))
+        return notification is not None or updated > 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['warm_users'] = len(self._users)
+            stats['warm_notifications'] = len(self._by_id)
+        return stats
+
+    def close(self):
+        """Flush pending writes and stop the writer threads"""
+        if self.writer:
+            self.writer.stop()
+            self.evictions.stop()
+
+    def _add(self, notification: InAppNotification):
+        bucket = self._bucket(notification.user_id, create=True, load=False)
+        bucket.items.append(notification)
+        self._by_id[notification.id] = notification
+        self._stats['stored'] += 1
+        if bucket.loaded and len(bucket.items) > self.max_per_user:
+            self._enforce_retention(bucket)
+
+    def _bucket(self, user_id: str, create: bool, load: bool = True) -> Optional[_UserNotifications]:
+        """Return the user's warm bucket, loading stored history if needed"""
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            if not create and self.db_manager is None:
+                return None
+            bucket = self._users[user_id] = _UserNotifications(loaded=self.db_manager is None)
+        else:
+            self._users.move_to_end(user_id)
+
+        if load and not bucket.loaded:
+            self._load(user_id, bucket)
+        return bucket
+
+    def _load(self, user_id: str, bucket: _UserNotifications):
+        self.writer.flush()
+        rows = self.db_manager.fetchall(self.LOAD_USER_SQL, (user_id,))
+        pending = {n.id: n for n in bucket.items}
+        items = []
+        for row in rows:
+            notification = pending.pop(row[0], None) or self._row_to_notification(row)
+            items.append(notification)
+            self._by_id[notification.id] = notification
+        bucket.items = items + list(pending.values())
+        bucket.loaded = True
+        self._stats['users_loaded'] += 1
+        if len(bucket.items) > self.max_per_user:
+            self._enforce_retention(bucket)
+
+    def _enforce_retention(self, bucket: _UserNotifications):
+        """Evict the oldest read notifications beyond the per-user cap"""
+        excess = len(bucket.items) - self.max_per_user
+        evicted = set()
+        for notification in bucket.items:
+            if len(evicted) >= excess:
+                break
+            if notification.read:
+                evicted.add(notification.id)
+
+        # A user who never reads still has to be bounded
+        hard_excess = len(bucket.items) - len(evicted) - 2 * self.max_per_user
+        if hard_excess > 0:
+            for notification in bucket.items:
+                if hard_excess <= 0:
+                    break
+                if notification.id not in evicted:
+                    evicted.add(notification.id)
+                    hard_excess -= 1
+            if self.writer:
+                self.writer.flush()  # unread rows may not be committed yet
+
+        if not evicted:
+            return
+        bucket.items = [n for n in bucket.items if n.id not in evicted]
+        for notification_id in evicted:
+            self._by_id.pop(notification_id, None)
+            if self.evictions:
+                self.evictions.submit(notification_id)
+        self._stats['evicted'] += len(evicted)
+
+    def _cool_down(self):
+        """Drop the least recently active users from memory (they stay in SQLite)"""
+        if self.warm_users is None:
+            return
+        while len(self._users) > self.warm_users:
+            _, bucket = self._users.popitem(last=False)
+            for notification in bucket.items:
+                self._by_id.pop(notification.id, None)
+            self._stats['users_cooled'] += 1
+
+    def _fetch_row(self, notification_id: str) -> Optional[tuple]:
+        if self.db_manager is None:
+            return None
+        self.writer.flush()
+        return self.db_manager.fetchone("SELECT * FROM in_app_notifications WHERE id = ?", (notification_id,))
+
+    @staticmethod
+    def _row_to_notification(row) -> InAppNotification:
+        return InAppNotification(row[0], row[1], row[2], row[3], row[4], row[5], row[6], bool(row[7]))
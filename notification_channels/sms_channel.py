@@ -1,15 +1,129 @@
+import json
 import logging
+import threading
+import uuid
+import http.client
+from urllib.parse import urlsplit
 from models.alert import DeliveryType
 from .base_channel import NotificationChannel
 
 class SMSChannel(NotificationChannel):
+    """SMS delivery through a bulk provider endpoint.
+
+    Configure ``endpoint`` (and optionally ``api_key``, ``sender``,
+    ``batch_size``, ``timeout``) to POST up to ``batch_size`` messages per
+    request over a keep-alive HTTP connection. The provider is expected to
+    answer with ``{"results": [{"id": ..., "status": "sent" | ...}]}``.
+    Each request carries an ``Idempotency-Key`` that stays the same if it
+    has to be resent on a fresh connection.
+    Without an endpoint the channel only logs, which keeps local setups working.
+    """
+
     def __init__(self, sms_cfg=None):
         self.cfg = sms_cfg or {}
         self.log = logging.getLogger(__name__)
+        self.batch_size = self.cfg.get("batch_size", 100)
+        self.sender = self.cfg.get("sender")
+        self.endpoint = urlsplit(self.cfg["endpoint"]) if self.cfg.get("endpoint") else None
+        self._local = threading.local()  # one kept-alive connection per delivery thread
+        self._connections = set()  # every thread's connection, so close() reaches them all
+        self._conn_lock = threading.Lock()
 
     def send_notification(self, user, alert, metadata=None):
-        self.log.info("SMS -> %s : %s", getattr(user, "phone_number", "n/a"), alert.title)
-        return True
+        return self.send_batch([user], alert, metadata).get(user.id, False)
+
+    def send_batch(self, users, alert, metadata=None):
+        if self.endpoint is None:
+            # One line per batch; per-recipient lines only at DEBUG
+            self.log.info("SMS (no endpoint) -> %d recipients : %s", len(users), alert.title)
+            if self.log.isEnabledFor(logging.DEBUG):
+                for u in users:
+                    self.log.debug("SMS -> %s : %s", getattr(u, "phone_number", "n/a"), alert.title)
+            return {u.id: True for u in users}
+
+        results = {u.id: False for u in users}
+        text = self.format_message(alert)["title"]
+        messages = [{"id": u.id, "to": u.phone_number, "text": text}
+                    for u in users if getattr(u, "phone_number", None)]
+        for i in range(0, len(messages), self.batch_size):
+            chunk = messages[i:i + self.batch_size]
+            for item in self._post({"sender": self.sender, "alert_id": alert.id, "messages": chunk}):
+                if item.get("id") in results:
+                    results[item["id"]] = item.get("status") == "sent"
+        return results
+
+    def _post(self, payload):
+        """POST one bulk request; returns the provider's per-message results"""
+        body = json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.cfg.get("api_key"):
+            headers["Authorization"] = f"Bearer {self.cfg['api_key']}"
+
+        headers["Idempotency-Key"] = uuid.uuid4().hex
+        count = len(payload["messages"])
+
+        for attempt in range(2):
+            conn = self._connection()
+            reused = conn.sock is not None
+            try:
+                conn.request("POST", self.endpoint.path or "/", body, headers)
+            except (OSError, http.client.HTTPException) as e:
+                # The request never got out whole, so the provider cannot have acted on it
+                self._reset()
+                if not attempt:
+                    continue
+                self.log.error("SMS bulk send of %d messages failed: %s", count, e)
+                return []
+            try:
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError) as e:
+                self._reset()
+                if reused and not attempt:
+                    # Idle keep-alive connection closed under us; the provider
+                    # drops the resend if it did see the first copy
+                    continue
+                self.log.error("SMS provider connection dropped after %d messages were sent: %s", count, e)
+                return []
+            except (OSError, http.client.HTTPException) as e:
+                self._reset()
+                self.log.error("SMS bulk send of %d messages failed: %s", count, e)
+                return []
+            if resp.status >= 300:
+                self.log.error("SMS provider returned %s", resp.status)
+                return []
+            try:
+                return json.loads(data or b"{}").get("results", [])
+            except ValueError as e:
+                self.log.error("SMS provider sent an unreadable response: %s", e)
+                return []
+        return []
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.endpoint.scheme == "https" else http.client.HTTPConnection
+            conn = cls(self.endpoint.hostname, self.endpoint.port, timeout=self.cfg.get("timeout", 10))
+            self._local.conn = conn
+        if conn not in self._connections:
+            # New, or closed by close() from another thread and about to reconnect
+            with self._conn_lock:
+                self._connections.add(conn)
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            with self._conn_lock:
+                self._connections.discard(conn)
+            conn.close()
+            self._local.conn = None
+
+    def close(self):
+        with self._conn_lock:
+            conns, self._connections = self._connections, set()
+        for conn in conns:
+            conn.close()
 
     def get_channel_type(self):
         return DeliveryType.SMS
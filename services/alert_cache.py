@@ -0,0 +1,169 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.state_manager import StateManager
+
+class AlertCache:
+    """Process-wide cache of the active alert set and alerts by id.
+
+    The active set is loaded once as every ``active`` alert that has not
+    expired yet, and the currently visible subset is recomputed in memory
+    when the next ``start_time`` or ``expiry_time`` boundary passes, so
+    the time window never needs a query. By-id lookups go through an LRU.
+
+    Writers bump the ``alerts`` row in ``cache_generations`` inside their
+    transaction. Readers compare it with the generation they loaded at, at
+    most every ``check_interval`` seconds, so caches in other app workers
+    drop their state shortly after another worker writes an alert. The
+    writing process itself is coherent as soon as the transaction commits.
+    """
+
+    GENERATION_KEY = 'alerts'
+
+    def __init__(self, db_manager, max_entries: int = 10000, check_interval: float = 0.5):
+        self.db_manager = db_manager
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+
+        self.generation = -1
+        self._min_generation = 0  # generation written by this process; anything older is stale
+        self._checked_at = float('-inf')
+        self._by_id: "OrderedDict[str, Any]" = OrderedDict()
+        self._pending: Optional[List[Any]] = None  # active and not yet expired
+        self._current: List[Any] = []
+        self._next_start: Optional[datetime] = None
+        self._next_expiry: Optional[datetime] = None
+        self._stats = {'active_hits': 0, 'active_misses': 0, 'active_refreshes': 0,
+                       'id_hits': 0, 'id_misses': 0, 'invalidations': 0, 'generation_changes': 0}
+
+    @classmethod
+    def for_db(cls, db_manager) -> "AlertCache":
+        """Return the cache shared by every AlertService using this database"""
+        return StateManager.get(db_manager, 'alert_cache', lambda: cls(db_manager))
+
+    def get_active(self, load: Callable[[], List[Any]], now: Optional[datetime] = None) -> List[Any]:
+        """Return the alerts active at ``now``; ``load`` fetches every unexpired active alert.
+
+        The returned alerts are shared between callers and must not be mutated.
+        """
+        now = now or datetime.now()
+        with self._lock:
+            self._sync()
+            if self._pending is None:
+                self._stats['active_misses'] += 1
+                self._pending = load()
+                self._recompute(now)
+            else:
+                self._stats['active_hits'] += 1
+                if (self._next_start is not None and now >= self._next_start) or \
+                        (self._next_expiry is not None and now > self._next_expiry):
+                    self._stats['active_refreshes'] += 1
+                    self._recompute(now)
+            return self._current
+
+    def get_by_id(self, alert_id: str, load: Callable[[str], Any]):
+        """Return a private copy of the alert, loading it through the LRU on a miss"""
+        with self._lock:
+            self._sync()
+            alert = self._by_id.get(alert_id)
+            if alert is not None:
+                self._by_id.move_to_end(alert_id)
+                self._stats['id_hits'] += 1
+                return copy.copy(alert)
+
+            self._stats['id_misses'] += 1
+            alert = load(alert_id)
+            if alert is not None:
+                self._by_id[alert_id] = alert
+                if len(self._by_id) > self.max_entries:
+                    self._by_id.popitem(last=False)
+                alert = copy.copy(alert)
+            return alert
+
+    def patch(self, alert_id: str, **fields):
+        """Apply a change this process just wrote without invalidating anything.
+        
+        For frequent, cosmetic updates (occurrence counters) that should not
+        throw away the whole cache; other processes see them after their
+        next invalidation.
+        """
+        with self._lock:
+            cached = [self._by_id.get(alert_id)] + [a for a in self._pending or () if a.id == alert_id]
+            for alert in cached:
+                if alert is not None:
+                    for name, value in fields.items():
+                        setattr(alert, name, value)
+    
+    def bump(self, conn) -> int:
+        """Advance the shared generation inside the caller's write transaction.
+
+        This process drops its cache only once the transaction commits, so
+        nothing cached mid-transaction outlives it. After a rollback the
+        cache is dropped too, in case the writing thread read its own
+        uncommitted rows, but the generation it never committed is not
+        recorded.
+        """
+        conn.execute("UPDATE cache_generations SET generation = generation + 1 WHERE name = ?",
+                     (self.GENERATION_KEY,))
+        generation = conn.execute("SELECT generation FROM cache_generations WHERE name = ?",
+                                  (self.GENERATION_KEY,)).fetchone()[0]
+        self.db_manager.after_commit(lambda: self._committed(generation), self.invalidate)
+        return generation
+
+    def _committed(self, generation: int):
+        with self._lock:
+            self._min_generation = max(self._min_generation, generation)
+            self._invalidate()
+
+    def invalidate(self):
+        """Drop everything cached in this process"""
+        with self._lock:
+            self._invalidate()
+
+    def _invalidate(self):
+        self._by_id.clear()
+        self._pending = None
+        self._current = []
+        self._checked_at = float('-inf')
+        self._stats['invalidations'] += 1
+
+    def _sync(self):
+        """Drop cached state if another writer advanced the generation"""
+        now = time.monotonic()
+        if self.generation >= self._min_generation and now - self._checked_at < self.check_interval:
+            return
+        generation = self.db_manager.scalar(
+            "SELECT generation FROM cache_generations WHERE name = ?", (self.GENERATION_KEY,)) or 0
+        self._checked_at = now
+        if generation != self.generation:
+            if self.generation >= 0:
+                self._stats['generation_changes'] += 1
+            self._by_id.clear()
+            self._pending = None
+            self.generation = generation
+
+    def _recompute(self, now: datetime):
+        """Re-derive the visible set and the next time it can change"""
+        self._pending = [a for a in self._pending if a.expiry_time >= now]
+        self._current = [a for a in self._pending if a.start_time <= now]
+        self._next_start = min((a.start_time for a in self._pending if a.start_time > now), default=None)
+        self._next_expiry = min((a.expiry_time for a in self._current), default=None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'generation': self.generation,
+                'cached_alerts': len(self._by_id),
+                'active_alerts': len(self._current) if self._pending is not None else None,
+                'next_start': self._next_start.isoformat() if self._next_start else None,
+                'next_expiry': self._next_expiry.isoformat() if self._next_expiry else None
+            })
+        return stats
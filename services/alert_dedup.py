@@ -0,0 +1,98 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from utils.state_manager import StateManager
+
+def alert_fingerprint(title: str, visibility_type: str, visibility_target: str) -> str:
+    """Default fingerprint: repeats of the same title sent to the same target collapse together"""
+    key = "\x1f".join((title.strip().lower(), visibility_type, visibility_target))
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+class FingerprintEntry(NamedTuple):
+    alert_id: str
+    severity: str
+    last_seen_at: datetime
+    expiry_time: datetime
+
+class FingerprintIndex:
+    """Maps alert fingerprints to the open alert that repeats coalesce into.
+
+    An alert stays open for coalescing while it is active, unexpired and was
+    last seen less than ``window`` ago, so a continuous storm keeps folding
+    into one alert. Lookups hit an in-process LRU first and fall back to the
+    partial ``idx_alerts_fingerprint`` index; callers run both inside their
+    write transaction, which serializes the check-then-insert across
+    processes. Entries are hints: the caller's conditional UPDATE is what
+    confirms an entry is still open, and ``forget`` drops it when it is not.
+    """
+
+    LOOKUP_SQL = """
+        SELECT id, severity, last_seen_at, expiry_time FROM alerts
+        WHERE fingerprint = ? AND last_seen_at >= ? AND status = 'active' AND expiry_time >= ?
+        ORDER BY last_seen_at DESC LIMIT 1
+    """
+
+    def __init__(self, window_seconds: float = 300, max_entries: int = 10000):
+        self.window = timedelta(seconds=window_seconds)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, FingerprintEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+
+    @classmethod
+    def for_db(cls, db_manager) -> "FingerprintIndex":
+        """Return the index shared by every AlertService using this database"""
+        return StateManager.get(db_manager, 'fingerprint_index', cls)
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > timedelta(0)
+
+    def set_window(self, seconds: float):
+        self.window = timedelta(seconds=seconds)
+
+    def lookup(self, conn, fingerprint: str, now: datetime, memory: bool = True) -> Optional[FingerprintEntry]:
+        """Find the open alert for a fingerprint, or None if a repeat should create a new one"""
+        if not self.enabled:
+            return None
+        if memory:
+            with self._lock:
+                entry = self._entries.get(fingerprint)
+                if entry is not None and self._is_open(entry, now):
+                    self._entries.move_to_end(fingerprint)
+                    self._stats['memory_hits'] += 1
+                    return entry
+
+        row = conn.execute(self.LOOKUP_SQL, (fingerprint, (now - self.window).isoformat(), now.isoformat())).fetchone()
+        if row is None:
+            self.forget(fingerprint)
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        entry = FingerprintEntry(row[0], row[1], datetime.fromisoformat(row[2]), datetime.fromisoformat(row[3]))
+        self.remember(fingerprint, entry)
+        with self._lock:
+            self._stats['db_hits'] += 1
+        return entry
+
+    def remember(self, fingerprint: str, entry: FingerprintEntry):
+        with self._lock:
+            self._entries[fingerprint] = entry
+            self._entries.move_to_end(fingerprint)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, fingerprint: str):
+        with self._lock:
+            self._entries.pop(fingerprint, None)
+
+    def _is_open(self, entry: FingerprintEntry, now: datetime) -> bool:
+        return entry.last_seen_at >= now - self.window and entry.expiry_time >= now
+
+    def get_stats(self):
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries),
+                    'window_seconds': self.window.total_seconds()}
@@ -1,21 +1,141 @@
-import sqlite3
 import uuid
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Sequence, Tuple
+
+from models.serialization import compile_row_mapper
+from services.alert_cache import AlertCache
+from services.alert_dedup import FingerprintEntry, FingerprintIndex, alert_fingerprint
+from utils.instrumentation import metrics
+
+_TRUE, _FALSE = ('true', '1', 'yes'), ('false', '0', 'no')
+
+def parse_bool(value: Any, field: str) -> bool:
+    """Read a JSON boolean flag, also accepting 'true'/'false', 'yes'/'no' and 1/0 (raises ValueError)"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in _TRUE + _FALSE:
+        return value.strip().lower() in _TRUE
+    raise ValueError(f"{field} must be a boolean")
 
 class AlertService:
     """Service for managing alerts with CRUD operations"""
     
+    # Stored alert columns are already in wire form except the boolean flag
+    ROW_CONVERTERS = {'reminders_enabled': bool}
+    _row_mappers: Dict[Tuple[str, ...], Callable] = {}
+    
+    # Every active alert that has not expired, including ones not started yet
+    UNEXPIRED_SQL = "SELECT * FROM alerts WHERE status = 'active' AND expiry_time >= ?"
+    
+    # Outcomes of creating an alert when repeats are deduplicated by fingerprint
+    CREATED, COALESCED, ESCALATED = 'created', 'coalesced', 'escalated'
+    
     def __init__(self, db_manager):
         self.db_manager = db_manager
         self.logger = logging.getLogger(__name__)
+        self.cache = AlertCache.for_db(db_manager)
+        self.fingerprints = FingerprintIndex.for_db(db_manager)
     
     def create_alert(self, alert_data: Dict[str, Any]):
-        """Create a new alert"""
+        """Create a new alert, or fold a repeat into the open alert with the same fingerprint"""
+        alert, _ = self.create_or_coalesce(alert_data)
+        return alert
+    
+    def create_or_coalesce(self, alert_data: Dict[str, Any]) -> Tuple[Any, str]:
+        """Create an alert; returns (stored alert, outcome) where outcome is CREATED, COALESCED or ESCALATED"""
+        [(alert, outcome)] = self.create_alerts([self.build_alert(alert_data)])
+        if outcome == self.CREATED:
+            self.logger.info(f"Alert created: {alert.id} - {alert.title}")
+        return alert, outcome
+    
+    def create_alerts(self, alerts: List[Any]) -> List[Tuple[Any, str]]:
+        """Insert already-built alerts in one transaction (joins the caller's, if any).
+        
+        A repeat of an alert that is still open for its fingerprint only bumps
+        that alert's occurrence count and last-seen time; it is reported as
+        ESCALATED when it raises the stored severity. Returns (stored alert,
+        outcome) per input, in order.
+        """
+        from services.analytics_service import record_alerts_created
+        now = datetime.now()
+        results, created, opened = [], [], {}
+        with self.db_manager.transaction() as conn:
+            for alert in alerts:
+                first = opened.get(alert.fingerprint) if self.fingerprints.enabled else None
+                if first is not None:
+                    # Repeat within this batch: fold into the alert about to be inserted
+                    first.occurrence_count += 1
+                    first.last_seen_at = now
+                    if alert.severity.rank > first.severity.rank:
+                        first.severity = alert.severity
+                    results.append((first, self.COALESCED))
+                    continue
+                result = self._coalesce(conn, alert, now)
+                if result is None:
+                    created.append(alert)
+                    opened[alert.fingerprint] = alert
+                    result = (alert, self.CREATED)
+                results.append(result)
+            
+            if created:
+                conn.executemany(self._INSERT_SQL, [self._insert_params(alert) for alert in created])
+                record_alerts_created(conn, created)
+                for alert in created:
+                    self.fingerprints.remember(alert.fingerprint, FingerprintEntry(
+                        alert.id, alert.severity.value, alert.last_seen_at, alert.expiry_time))
+            if created or any(outcome == self.ESCALATED for _, outcome in results):
+                self.cache.bump(conn)
+        if len(alerts) > 1:
+            self.logger.info(f"Bulk created {len(created)} alerts, coalesced {len(alerts) - len(created)}")
+        return results
+    
+    def _coalesce(self, conn, alert, now: datetime) -> Optional[Tuple[Any, str]]:
+        """Fold a repeat into its open alert; returns None when a new alert must be created"""
+        from models.alert import Severity
+        from services.analytics_service import record_severity_change
+        
+        # A remembered entry is only a hint: the conditional UPDATE confirms the
+        # alert is still open at the severity we think it has, otherwise re-check the DB
+        for use_memory in (True, False):
+            entry = self.fingerprints.lookup(conn, alert.fingerprint, now, memory=use_memory)
+            if entry is None:
+                return None
+            stored = Severity(entry.severity)
+            escalated = alert.severity.rank > stored.rank
+            severity = alert.severity if escalated else stored
+            updated = conn.execute("""
+                UPDATE alerts SET occurrence_count = occurrence_count + 1, last_seen_at = ?,
+                    severity = ?, updated_at = CASE WHEN ? THEN ? ELSE updated_at END
+                WHERE id = ? AND severity = ? AND status = 'active' AND expiry_time >= ?
+            """, (now.isoformat(), severity.value, escalated, now.isoformat(),
+                  entry.alert_id, entry.severity, now.isoformat())).rowcount
+            if updated:
+                break
+            self.fingerprints.forget(alert.fingerprint)
+        else:
+            return None
+        
+        self.fingerprints.remember(alert.fingerprint,
+                                   entry._replace(severity=severity.value, last_seen_at=now))
+        existing = self._row_to_alert(conn.execute("SELECT * FROM alerts WHERE id = ?",
+                                                   (entry.alert_id,)).fetchone())
+        if escalated:
+            record_severity_change(conn, entry.alert_id, stored, severity)
+            self.logger.info(f"Alert {entry.alert_id} escalated to {severity.value} "
+                             f"after {existing.occurrence_count} occurrences")
+            return existing, self.ESCALATED
+        self.cache.patch(entry.alert_id, occurrence_count=existing.occurrence_count,
+                         last_seen_at=existing.last_seen_at)
+        return existing, self.COALESCED
+    
+    def build_alert(self, alert_data: Dict[str, Any]):
+        """Validate request data into a new, unsaved Alert (raises KeyError/ValueError)"""
         from models.alert import Alert, Severity, DeliveryType, VisibilityType
         
-        alert = Alert(
+        return Alert(
             id=str(uuid.uuid4()),
             title=alert_data['title'],
             message=alert_data['message'],
@@ -26,13 +146,11 @@ class AlertService:
             start_time=datetime.fromisoformat(alert_data['start_time']),
             expiry_time=datetime.fromisoformat(alert_data['expiry_time']),
             reminder_frequency_hours=alert_data.get('reminder_frequency_hours', 2),
-            reminders_enabled=alert_data.get('reminders_enabled', True),
-            created_by=alert_data['created_by']
+            reminders_enabled=parse_bool(alert_data.get('reminders_enabled', True), 'reminders_enabled'),
+            created_by=alert_data['created_by'],
+            fingerprint=alert_data.get('fingerprint') or alert_fingerprint(
+                alert_data['title'], alert_data['visibility_type'], alert_data['visibility_target'])
         )
-        
-        self._save_alert(alert)
-        self.logger.info(f"Alert created: {alert.id} - {alert.title}")
-        return alert
     
     def update_alert(self, alert_id: str, update_data: Dict[str, Any]):
         """Update an existing alert"""
@@ -40,83 +158,151 @@ class AlertService:
         if not alert:
             return None
         
-        # Update logic here...
+        from models.alert import Severity, DeliveryType, VisibilityType, AlertStatus
+        from services.analytics_service import record_severity_change
+        
+        previous_severity, previous_fingerprint = alert.severity, alert.fingerprint
+        converters = {
+            'title': str,
+            'message': str,
+            'severity': Severity,
+            'delivery_type': DeliveryType,
+            'visibility_type': VisibilityType,
+            'visibility_target': str,
+            'start_time': datetime.fromisoformat,
+            'expiry_time': datetime.fromisoformat,
+            'reminder_frequency_hours': int,
+            'reminders_enabled': lambda value: parse_bool(value, 'reminders_enabled'),
+            'status': AlertStatus
+        }
+        for field, convert in converters.items():
+            if field in update_data:
+                setattr(alert, field, convert(update_data[field]))
+        # Repeats must coalesce under the new title/target, not the old one
+        if update_data.get('fingerprint'):
+            alert.fingerprint = str(update_data['fingerprint'])
+        elif {'title', 'visibility_type', 'visibility_target'} & update_data.keys():
+            alert.fingerprint = alert_fingerprint(alert.title, alert.visibility_type.value,
+                                                  alert.visibility_target)
+        
         alert.updated_at = datetime.now()
-        self._save_alert(alert, is_update=True)
+        with self.db_manager.transaction() as conn:
+            self._save_alert(alert, is_update=True)
+            record_severity_change(conn, alert.id, previous_severity, alert.severity)
+        if alert.fingerprint != previous_fingerprint:
+            self.fingerprints.forget(previous_fingerprint)
+            self.fingerprints.forget(alert.fingerprint)
         return alert
     
     def get_alert_by_id(self, alert_id: str):
-        """Get alert by ID"""
-        conn = sqlite3.connect(self.db_manager.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM alerts WHERE id = ?", (alert_id,))
-        row = cursor.fetchone()
-        conn.close()
+        """Get alert by ID (served from the alert cache; callers get their own copy)"""
+        return self.cache.get_by_id(alert_id, self._load_alert)
+    
+    def get_active_alerts(self):
+        """Get all active alerts (shared cached objects; do not mutate)"""
+        return self.cache.get_active(self._load_unexpired_alerts)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return {**self.cache.get_stats(), 'fingerprints': self.fingerprints.get_stats()}
+    
+    def _load_alert(self, alert_id: str):
+        row = self.db_manager.fetchone("SELECT * FROM alerts WHERE id = ?", (alert_id,))
         
         if not row:
             return None
         
         return self._row_to_alert(row)
     
-    def get_active_alerts(self):
-        """Get all active alerts"""
-        conn = sqlite3.connect(self.db_manager.db_path)
-        cursor = conn.cursor()
-        
-        now = datetime.now().isoformat()
-        cursor.execute("""
-            SELECT * FROM alerts 
-            WHERE status = 'active' 
-            AND start_time <= ? 
-            AND expiry_time >= ?
-        """, (now, now))
-        
-        rows = cursor.fetchall()
-        conn.close()
+    def _load_unexpired_alerts(self):
+        rows = self.db_manager.fetchall(self.UNEXPIRED_SQL, (datetime.now().isoformat(),))
         
         return [self._row_to_alert(row) for row in rows]
     
+    def get_alert_dicts(self, created_by: Optional[str] = None,
+                        filters: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """List alerts as response dicts straight from the rows, newest first"""
+        sql, params = "SELECT * FROM alerts WHERE 1=1", []
+        if created_by:
+            sql += " AND created_by = ?"
+            params.append(created_by)
+        for column in ('severity', 'status', 'visibility_type'):
+            if filters and filters.get(column):
+                sql += f" AND {column} = ?"
+                params.append(filters[column])
+        sql += " ORDER BY created_at DESC"
+        return self.rows_to_dicts(*self.db_manager.fetchall_with_columns(sql, params))
+    
+    def rows_to_dicts(self, columns: Sequence[str], rows: List[tuple]) -> List[Dict[str, Any]]:
+        """Serialize alert rows (plus any extra columns) without building Alert objects"""
+        columns = tuple(columns)
+        mapper = self._row_mappers.get(columns)
+        if mapper is None:
+            mapper = self._row_mappers[columns] = compile_row_mapper(columns, self.ROW_CONVERTERS)
+        with metrics.time('serialization_seconds', kind='row_mapper'):
+            return [mapper(row) for row in rows]
+    
     def _save_alert(self, alert, is_update: bool = False):
-        """Save alert to database"""
-        conn = sqlite3.connect(self.db_manager.db_path)
-        cursor = conn.cursor()
-        
+        """Save alert to database and invalidate cached alerts"""
+        with self.db_manager.transaction() as conn:
+            self._write_alert(alert, is_update)
+            self.cache.bump(conn)
+    
+    def _write_alert(self, alert, is_update: bool):
         if is_update:
-            # Update SQL here
-            pass
-        else:
-            cursor.execute("""
-                INSERT INTO alerts (
-                    id, title, message, severity, delivery_type,
-                    visibility_type, visibility_target, start_time, expiry_time,
-                    reminder_frequency_hours, reminders_enabled, created_by,
-                    created_at, updated_at, status
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            self.db_manager.execute("""
+                UPDATE alerts SET
+                    title = ?, message = ?, severity = ?, delivery_type = ?,
+                    visibility_type = ?, visibility_target = ?, start_time = ?,
+                    expiry_time = ?, reminder_frequency_hours = ?, reminders_enabled = ?,
+                    updated_at = ?, status = ?, fingerprint = ?
+                WHERE id = ?
             """, (
-                alert.id, alert.title, alert.message, alert.severity.value,
+                alert.title, alert.message, alert.severity.value,
                 alert.delivery_type.value, alert.visibility_type.value,
                 alert.visibility_target, alert.start_time.isoformat(),
                 alert.expiry_time.isoformat(), alert.reminder_frequency_hours,
-                alert.reminders_enabled, alert.created_by, alert.created_at.isoformat(),
-                alert.updated_at.isoformat(), alert.status.value
+                alert.reminders_enabled, alert.updated_at.isoformat(),
+                alert.status.value, alert.fingerprint, alert.id
             ))
-        
-        conn.commit()
-        conn.close()
+        else:
+            self.db_manager.execute(self._INSERT_SQL, self._insert_params(alert))
+    
+    _INSERT_SQL = """
+        INSERT INTO alerts (
+            id, title, message, severity, delivery_type,
+            visibility_type, visibility_target, start_time, expiry_time,
+            reminder_frequency_hours, reminders_enabled, created_by,
+            created_at, updated_at, status, fingerprint, occurrence_count, last_seen_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    
+    @staticmethod
+    def _insert_params(alert) -> tuple:
+        return (
+            alert.id, alert.title, alert.message, alert.severity.value,
+            alert.delivery_type.value, alert.visibility_type.value,
+            alert.visibility_target, alert.start_time.isoformat(),
+            alert.expiry_time.isoformat(), alert.reminder_frequency_hours,
+            alert.reminders_enabled, alert.created_by, alert.created_at.isoformat(),
+            alert.updated_at.isoformat(), alert.status.value, alert.fingerprint,
+            alert.occurrence_count, alert.last_seen_at.isoformat()
+        )
     
     def _row_to_alert(self, row):
         """Convert database row to Alert object"""
         from models.alert import Alert, Severity, DeliveryType, VisibilityType, AlertStatus
         
         return Alert(
-            id=row, title=row, message=row,
-            severity=Severity(row), delivery_type=DeliveryType(row),
-            visibility_type=VisibilityType(row), visibility_target=row,
-            start_time=datetime.fromisoformat(row),
-            expiry_time=datetime.fromisoformat(row),
-            reminder_frequency_hours=row, reminders_enabled=bool(row),
-            created_by=row, created_at=datetime.fromisoformat(row),
-            updated_at=datetime.fromisoformat(row),
-            status=AlertStatus(row)
+            id=row[0], title=row[1], message=row[2],
+            severity=Severity(row[3]), delivery_type=DeliveryType(row[4]),
+            visibility_type=VisibilityType(row[5]), visibility_target=row[6],
+            start_time=datetime.fromisoformat(row[7]),
+            expiry_time=datetime.fromisoformat(row[8]),
+            reminder_frequency_hours=row[9], reminders_enabled=bool(row[10]),
+            created_by=row[11], created_at=datetime.fromisoformat(row[12]),
+            updated_at=datetime.fromisoformat(row[13]),
+            status=AlertStatus(row[14]),
+            fingerprint=row[15] if len(row) > 15 else None,
+            occurrence_count=row[16] if len(row) > 16 else 1,
+            last_seen_at=datetime.fromisoformat(row[17]) if len(row) > 17 and row[17] else None
         )
@@ -1,13 +1,173 @@
+from collections import Counter
+
+# Rollup rows are (scope, key, metric) -> value. Scopes:
+#   system   ''          alerts, deliveries, digested, read, snoozed
+#   severity <severity>  alerts, deliveries, read, snoozed
+#   channel  <channel>   deliveries, digested
+#   status   <status>    deliveries
+#   alert    <alert_id>  deliveries, digested, channel:<c>, status:<s>, read, snoozed
+# read/snoozed count preferences currently in that state. A throttled user's
+# alert logged as 'digested' only went out inside a digest; it counts under
+# digested, not deliveries, so a later reminder's 'sent' row is not a second
+# delivery of the same alert.
+
+_BUMP_SQL = """INSERT INTO analytics_rollups (scope, key, metric, value) VALUES (?, ?, ?, ?)
+               ON CONFLICT(scope, key, metric) DO UPDATE SET value = value + excluded.value"""
+
+_BUMP_SEVERITY_SQL = """INSERT INTO analytics_rollups (scope, key, metric, value)
+                        SELECT 'severity', severity, ?, ? FROM alerts WHERE id = ?
+                        ON CONFLICT(scope, key, metric) DO UPDATE SET value = value + excluded.value"""
+
+def _bump(conn, counts):
+    """Apply {(scope, key, metric): delta} increments on the caller's connection"""
+    conn.executemany(_BUMP_SQL, [(*k, v) for k, v in counts.items() if v])
+
+def record_alert_created(conn, alert):
+    record_alerts_created(conn, [alert])
+
+def record_alerts_created(conn, alerts):
+    counts = Counter()
+    for alert in alerts:
+        counts["system", "", "alerts"] += 1
+        counts["severity", alert.severity.value, "alerts"] += 1
+    _bump(conn, counts)
+
+def record_severity_change(conn, aid, old, new):
+    """Move an alert and its per-alert counts to its new severity"""
+    if old == new:
+        return
+    counts = Counter({("severity", old.value, "alerts"): -1, ("severity", new.value, "alerts"): 1})
+    for metric, value in conn.execute("""SELECT metric, value FROM analytics_rollups
+                                         WHERE scope='alert' AND key=?
+                                         AND metric IN ('deliveries', 'read', 'snoozed')""", (aid,)):
+        counts["severity", old.value, metric] -= value
+        counts["severity", new.value, metric] += value
+    _bump(conn, counts)
+
+def record_deliveries(conn, deliveries):
+    """Rollup hook for a committed batch of NotificationDelivery records"""
+    counts, per_alert = Counter(), Counter()
+    for d in deliveries:
+        channel, status = d.delivery_channel.value, d.delivery_status
+        if status == "digested":
+            counts["system", "", "digested"] += 1
+            counts["channel", channel, "digested"] += 1
+            counts["alert", d.alert_id, "digested"] += 1
+            continue
+        counts["system", "", "deliveries"] += 1
+        counts["channel", channel, "deliveries"] += 1
+        counts["status", status, "deliveries"] += 1
+        counts["alert", d.alert_id, "deliveries"] += 1
+        counts["alert", d.alert_id, f"channel:{channel}"] += 1
+        counts["alert", d.alert_id, f"status:{status}"] += 1
+        per_alert[d.alert_id] += 1
+    _bump(conn, counts)
+    conn.executemany(_BUMP_SEVERITY_SQL, [("deliveries", n, aid) for aid, n in per_alert.items()])
+
+def record_state_changes(conn, changes):
+    """Move read/snoozed counts for [(alert_id, old_state, new_state)] transitions"""
+    counts, severity = Counter(), Counter()
+    for aid, old, new in changes:
+        for state, delta in ((old, -1), (new, 1)):
+            if old != new and state in ("read", "snoozed"):
+                counts["system", "", state] += delta
+                counts["alert", aid, state] += delta
+                severity[state, aid] += delta
+    _bump(conn, counts)
+    conn.executemany(_BUMP_SEVERITY_SQL, [(m, n, aid) for (m, aid), n in severity.items() if n])
+
+def rebuild_rollups(conn):
+    """Recompute every rollup row from the raw tables, archived history included"""
+    from services.lifecycle_service import history_source
+    alerts = history_source(conn, "alerts", "id, severity")
+    logged = history_source(conn, "notification_deliveries", "alert_id, delivery_channel, delivery_status")
+    deliveries = f"(SELECT * FROM {logged} WHERE delivery_status != 'digested')"
+    digested = f"(SELECT * FROM {logged} WHERE delivery_status = 'digested')"
+    preferences = history_source(conn, "user_alert_preferences", "alert_id, state")
+    conn.execute("DELETE FROM analytics_rollups")
+    conn.execute(f"""INSERT INTO analytics_rollups (scope, key, metric, value)
+                    SELECT 'system', '', 'alerts', COUNT(*) FROM {alerts}
+                    UNION ALL SELECT 'severity', severity, 'alerts', COUNT(*) FROM {alerts} GROUP BY severity
+                    UNION ALL SELECT 'system', '', 'deliveries', COUNT(*) FROM {deliveries}
+                    UNION ALL SELECT 'channel', delivery_channel, 'deliveries', COUNT(*)
+                              FROM {deliveries} GROUP BY delivery_channel
+                    UNION ALL SELECT 'status', delivery_status, 'deliveries', COUNT(*)
+                              FROM {deliveries} GROUP BY delivery_status
+                    UNION ALL SELECT 'severity', a.severity, 'deliveries', COUNT(*)
+                              FROM {deliveries} d JOIN {alerts} a ON a.id = d.alert_id
+                              GROUP BY a.severity
+                    UNION ALL SELECT 'alert', alert_id, 'deliveries', COUNT(*)
+                              FROM {deliveries} GROUP BY alert_id
+                    UNION ALL SELECT 'alert', alert_id, 'channel:' || delivery_channel, COUNT(*)
+                              FROM {deliveries} GROUP BY alert_id, delivery_channel
+                    UNION ALL SELECT 'alert', alert_id, 'status:' || delivery_status, COUNT(*)
+                              FROM {deliveries} GROUP BY alert_id, delivery_status
+                    UNION ALL SELECT 'system', '', 'digested', COUNT(*) FROM {digested}
+                    UNION ALL SELECT 'channel', delivery_channel, 'digested', COUNT(*)
+                              FROM {digested} GROUP BY delivery_channel
+                    UNION ALL SELECT 'alert', alert_id, 'digested', COUNT(*)
+                              FROM {digested} GROUP BY alert_id
+                    UNION ALL SELECT 'system', '', state, COUNT(*) FROM {preferences}
+                              WHERE state IN ('read', 'snoozed') GROUP BY state
+                    UNION ALL SELECT 'severity', a.severity, p.state, COUNT(*)
+                              FROM {preferences} p JOIN {alerts} a ON a.id = p.alert_id
+                              WHERE p.state IN ('read', 'snoozed') GROUP BY a.severity, p.state
+                    UNION ALL SELECT 'alert', alert_id, state, COUNT(*) FROM {preferences}
+                              WHERE state IN ('read', 'snoozed') GROUP BY alert_id, state""")
+
 class AnalyticsService:
+    """Dashboard metrics read from the incrementally maintained rollup table"""
+
     def __init__(self, db):
         self.db = db
 
     def get_system_metrics(self):
-        total_alerts = self.db.scalar("SELECT COUNT(*) FROM alerts")
-        total_deliveries = self.db.scalar("SELECT COUNT(*) FROM notification_deliveries")
-        reads = self.db.scalar("SELECT COUNT(*) FROM user_alert_preferences WHERE state='read'")
+        rows = self.db.fetchall("""SELECT scope, key, metric, value FROM analytics_rollups
+                                   WHERE scope IN ('system', 'severity', 'channel', 'status')
+                                   AND value != 0""")
+        system = {m: v for s, _, m, v in rows if s == "system"}
+        by_severity = {}
+        for s, k, m, v in rows:
+            if s == "severity":
+                by_severity.setdefault(k, {})[m] = v
+        total_deliveries, reads = system.get("deliveries", 0), system.get("read", 0)
         return {
-            "total_alerts": total_alerts,
+            "total_alerts": system.get("alerts", 0),
             "total_deliveries": total_deliveries,
-            "read_rate": round((reads/total_deliveries*100) if total_deliveries else 0, 2)
+            "read_rate": round((reads/total_deliveries*100) if total_deliveries else 0, 2),
+            "read": reads,
+            "snoozed": system.get("snoozed", 0),
+            "digested": system.get("digested", 0),
+            "by_severity": by_severity,
+            "deliveries_by_channel": {k: v for s, k, m, v in rows if s == "channel" and m == "deliveries"},
+            "digested_by_channel": {k: v for s, k, m, v in rows if s == "channel" and m == "digested"},
+            "deliveries_by_status": {k: v for s, k, _, v in rows if s == "status"}
         }
+
+    def get_alert_metrics(self, aid):
+        metrics = dict(self.db.fetchall(
+            "SELECT metric, value FROM analytics_rollups WHERE scope='alert' AND key=?", (aid,)))
+        deliveries, reads = metrics.get("deliveries", 0), metrics.get("read", 0)
+        return {
+            "alert_id": aid,
+            "total_deliveries": deliveries,
+            "read": reads,
+            "snoozed": metrics.get("snoozed", 0),
+            "digested": metrics.get("digested", 0),
+            "read_rate": round((reads/deliveries*100) if deliveries else 0, 2),
+            "deliveries_by_channel": {m[8:]: v for m, v in metrics.items() if m.startswith("channel:")},
+            "deliveries_by_status": {m[7:]: v for m, v in metrics.items() if m.startswith("status:")}
+        }
+
+    def rebuild(self):
+        with self.db.transaction() as conn:
+            rebuild_rollups(conn)
+        return self.db.scalar("SELECT COUNT(*) FROM analytics_rollups")
+
+if __name__ == '__main__':
+    import sys
+    from database.database_manager import DatabaseManager
+
+    db = DatabaseManager(sys.argv[1] if len(sys.argv) > 1 else "alerting_platform.db",
+                         archive_path=sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Rebuilt {AnalyticsService(db).rebuild()} rollup rows")
@@ -0,0 +1,128 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+from models.alert import VisibilityType
+from utils.instrumentation import metrics
+from utils.state_manager import StateManager
+
+class AudienceIndex:
+    """In-memory membership index used to resolve alert visibility targets.
+
+    Keeps user->team, user->organization, team->members and
+    organization->members mappings so that resolving an alert's audience,
+    or the alerts visible to a user, is a dictionary/set operation rather
+    than a query per alert.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.user_team: Dict[str, str] = {}
+        self.user_org: Dict[str, str] = {}
+        self.team_org: Dict[str, str] = {}
+        self.team_members: Dict[str, Set[str]] = defaultdict(set)
+        self.org_members: Dict[str, Set[str]] = defaultdict(set)
+        self.logger = logging.getLogger(__name__)
+        # Highest users/teams rowid indexed, so rows inserted by other processes can be caught up
+        self._user_rowid = 0
+        self._team_rowid = 0
+
+    @classmethod
+    def for_db(cls, db_manager) -> "AudienceIndex":
+        """Return the index shared by every service using this database"""
+        return StateManager.get(db_manager, 'audience_index', lambda: cls.load(db_manager))
+
+    @classmethod
+    def load(cls, db_manager) -> "AudienceIndex":
+        """Build the index from the users and teams tables"""
+        index = cls()
+        index.catch_up(db_manager)
+        index.logger.info(f"Audience index loaded: {len(index.user_team)} users, "
+                          f"{len(index.team_members)} teams, {len(index.org_members)} organizations")
+        return index
+
+    def catch_up(self, db_manager) -> int:
+        """Index users and teams inserted since the last load or catch-up (by any process).
+
+        Users and teams are only ever inserted, so reading past the highest
+        rowid seen is enough to stay current. Returns the number of rows added.
+        """
+        with self._lock:
+            teams = db_manager.fetchall("SELECT rowid, id, organization_id FROM teams WHERE rowid > ? "
+                                        "ORDER BY rowid", (self._team_rowid,))
+            users = db_manager.fetchall("SELECT rowid, id, team_id, organization_id FROM users "
+                                        "WHERE rowid > ? ORDER BY rowid", (self._user_rowid,))
+            for rowid, team_id, org_id in teams:
+                self.add_team(team_id, org_id)
+                self._team_rowid = rowid
+            for rowid, user_id, team_id, org_id in users:
+                self.add_user(user_id, team_id, org_id)
+                self._user_rowid = rowid
+        return len(teams) + len(users)
+
+    def add_team(self, team_id: str, organization_id: str):
+        with self._lock:
+            self.team_org[team_id] = organization_id
+
+    def add_user(self, user_id: str, team_id: str, organization_id: str):
+        """Add a user, moving them if they were indexed under another team or org"""
+        with self._lock:
+            self.remove_user(user_id)
+            self.user_team[user_id] = team_id
+            self.user_org[user_id] = organization_id
+            self.team_members[team_id].add(user_id)
+            self.org_members[organization_id].add(user_id)
+
+    def remove_user(self, user_id: str):
+        with self._lock:
+            team_id = self.user_team.pop(user_id, None)
+            org_id = self.user_org.pop(user_id, None)
+            if team_id is not None:
+                self.team_members[team_id].discard(user_id)
+            if org_id is not None:
+                self.org_members[org_id].discard(user_id)
+
+    def has_user(self, user_id: str) -> bool:
+        return user_id in self.user_team
+
+    def resolve(self, visibility_type: VisibilityType, target: str) -> Set[str]:
+        """Return the ids of users covered by a visibility target"""
+        with self._lock, metrics.time('audience_resolution_seconds', op='resolve',
+                                      visibility=visibility_type.value):
+            if visibility_type == VisibilityType.ORGANIZATION:
+                return set(self.org_members.get(target, ()))
+            if visibility_type == VisibilityType.TEAM:
+                return set(self.team_members.get(target, ()))
+            if visibility_type == VisibilityType.USER:
+                return {target} if target in self.user_team else set()
+        return set()
+
+    def resolve_alert(self, alert) -> Set[str]:
+        return self.resolve(alert.visibility_type, alert.visibility_target)
+
+    def scopes_for_user(self, user_id: str) -> Set[Tuple[VisibilityType, str]]:
+        """Return every (visibility_type, target) pair that includes the user"""
+        scopes = {(VisibilityType.USER, user_id)}
+        with self._lock:
+            team_id = self.user_team.get(user_id)
+            org_id = self.user_org.get(user_id)
+        if team_id is not None:
+            scopes.add((VisibilityType.TEAM, team_id))
+        if org_id is not None:
+            scopes.add((VisibilityType.ORGANIZATION, org_id))
+        return scopes
+
+    def filter_visible(self, user_id: str, alerts: Iterable) -> List:
+        """Return the alerts whose visibility target includes the user"""
+        with metrics.time('audience_resolution_seconds', op='filter_visible', visibility='all'):
+            scopes = self.scopes_for_user(user_id)
+            return [a for a in alerts if (a.visibility_type, a.visibility_target) in scopes]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'users': len(self.user_team),
+                'teams': len(self.team_members),
+                'organizations': len(self.org_members)
+            }
@@ -0,0 +1,345 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+class ChannelLimits:
+    """Concurrency and rate settings for one registered channel"""
+
+    def __init__(self, concurrency: int = 10, rate_per_second: Optional[float] = None,
+                 send_timeout: float = 30.0, batch_size: int = 50):
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.send_timeout = send_timeout
+        self.batch_size = max(1, batch_size)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'concurrency': self.concurrency,
+            'rate_per_second': self.rate_per_second,
+            'send_timeout': self.send_timeout,
+            'batch_size': self.batch_size
+        }
+
+class _RateLimiter:
+    """Token bucket evaluated on the engine loop (no locking needed)"""
+
+    def __init__(self, rate_per_second: float):
+        self.rate = rate_per_second
+        self.capacity = max(1.0, rate_per_second)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self, n: int = 1):
+        # A batch larger than the bucket drives it negative, which delays
+        # the next batch by the overdraft
+        need = min(n, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= need:
+                self.tokens -= n
+                return
+            await asyncio.sleep((need - self.tokens) / self.rate)
+
+class _ChannelRuntime:
+    def __init__(self, channel, limits: ChannelLimits):
+        self.channel = channel
+        self.limits = limits
+        self.executor = ThreadPoolExecutor(max_workers=limits.concurrency,
+                                           thread_name_prefix=f"deliver-{channel.get_channel_type().value}")
+        self.rate_limiter = _RateLimiter(limits.rate_per_second) if limits.rate_per_second else None
+        # Heap of (dispatch deadline, sequence, job); one entry per job with chunks left
+        self.queue: List[tuple] = []
+        self.ready = None  # asyncio.Event, created on the engine loop
+        self.dispatchers: List[asyncio.Task] = []
+        self.closed = False
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+
+class DeliveryJob:
+    """Progress of one submitted fan-out"""
+
+    def __init__(self, alert, users: List, channel_type):
+        self.id = str(uuid.uuid4())
+        self.alert = alert
+        self.users = users
+        self.total = len(users)
+        self.channel_type = channel_type
+        self.status = 'queued'
+        self.chunks: List[List] = []
+        self.next_chunk = 0
+        self.pending_chunks = 0
+        self.queued_at = 0.0
+        self.successful_deliveries = 0
+        self.failed_deliveries = 0
+        self.delivery_details: List[Dict[str, Any]] = []
+        self.created_at = datetime.now()
+        self.completed_at: Optional[datetime] = None
+        self.done = threading.Event()
+
+    def results(self) -> Dict[str, Any]:
+        return {
+            'successful_deliveries': self.successful_deliveries,
+            'failed_deliveries': self.failed_deliveries,
+            'delivery_details': self.delivery_details
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'alert_id': self.alert.id,
+            'channel': self.channel_type.value,
+            'status': self.status,
+            'total': self.total,
+            'successful_deliveries': self.successful_deliveries,
+            'failed_deliveries': self.failed_deliveries,
+            'created_at': self.created_at.isoformat(),
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+class DeliveryEngine:
+    """Long-lived asyncio delivery engine.
+
+    Runs one event loop on a background thread for the life of the service.
+    Recipients are split into chunks of the channel's ``batch_size`` and each
+    chunk is handed to a synchronous ``NotificationChannel.send_batch`` call
+    on a per-channel thread pool, with in-flight batches bounded by the
+    channel's concurrency limit and optionally paced per recipient by a token
+    bucket, so throughput follows each channel's capacity. ``submit`` returns a job id
+    immediately; ``wait`` blocks for callers that need the results.
+
+    Chunks are scheduled by severity rather than arrival. Each channel keeps
+    a heap of jobs keyed by a dispatch deadline of enqueue time plus the
+    severity's ``aging`` allowance; a job goes back on the heap after every
+    chunk, so a large INFO fan-out yields to a CRITICAL job between chunks,
+    and a job that has waited out its allowance outranks newer urgent work
+    so low priorities never starve.
+    """
+
+    MAX_FINISHED_JOBS = 1000
+    # Seconds a chunk of each severity may be overtaken by more urgent work
+    AGING = {'critical': 0.0, 'warning': 5.0, 'info': 30.0}
+
+    def __init__(self, deliver_batch: Callable[[Any, List, Any], Dict[str, bool]],
+                 aging: Optional[Dict[str, float]] = None):
+        self.deliver_batch = deliver_batch
+        self.aging = {**self.AGING, **(aging or {})}
+        self.logger = logging.getLogger(__name__)
+        self.channels: Dict[Any, _ChannelRuntime] = {}
+        self.jobs: "OrderedDict[str, DeliveryJob]" = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._priority_stats = {severity: {'dispatched_chunks': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+                                for severity in self.aging}
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True, name="delivery-engine")
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def register_channel(self, channel_type, channel, limits: Optional[ChannelLimits] = None):
+        """Register (or replace) a channel with its own concurrency and rate limits"""
+        runtime = _ChannelRuntime(channel, limits or ChannelLimits())
+
+        def install():
+            runtime.ready = asyncio.Event()
+            previous = self.channels.get(channel_type)
+            self.channels[channel_type] = runtime
+            if previous:
+                # Queued work moves to the new runtime; the old dispatchers exit
+                runtime.queue, previous.queue = previous.queue, []
+                previous.closed = True
+                previous.ready.set()
+                previous.executor.shutdown(wait=False)
+            runtime.dispatchers = [self.loop.create_task(self._dispatch(runtime))
+                                   for _ in range(runtime.limits.concurrency)]
+            if runtime.queue:
+                runtime.ready.set()
+
+        asyncio.run_coroutine_threadsafe(self._call(install), self.loop).result()
+
+    async def _call(self, fn):
+        fn()
+
+    def submit(self, alert, users: List, channel_type=None) -> str:
+        """Queue a fan-out and return its delivery job id without waiting"""
+        channel_type = channel_type or alert.delivery_type
+        if channel_type not in self.channels:
+            raise ValueError(f"No channel available for type: {channel_type}")
+
+        job = DeliveryJob(alert, list(users), channel_type)
+        with self._jobs_lock:
+            self.jobs[job.id] = job
+            self._trim_jobs()
+        self.loop.call_soon_threadsafe(self._enqueue, job)
+        return job.id
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[DeliveryJob]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def _enqueue(self, job: DeliveryJob):
+        """Split a job into chunks and queue it (runs on the engine loop)"""
+        size = self.channels[job.channel_type].limits.batch_size
+        job.chunks = [job.users[i:i + size] for i in range(0, len(job.users), size)]
+        job.pending_chunks = len(job.chunks)
+        if not job.chunks:
+            self._finish(job)
+            return
+        self._push(job)
+
+    def _push(self, job: DeliveryJob):
+        runtime = self.channels[job.channel_type]
+        job.queued_at = time.monotonic()
+        deadline = job.queued_at + self.aging.get(job.alert.severity.value, 0.0)
+        heapq.heappush(runtime.queue, (deadline, next(self._sequence), job))
+        runtime.ready.set()
+
+    async def _dispatch(self, runtime: _ChannelRuntime):
+        """One of ``concurrency`` loops per channel sending the most urgent chunk next"""
+        while not runtime.closed:
+            if not runtime.queue:
+                runtime.ready.clear()
+                await runtime.ready.wait()
+                continue
+            _, _, job = heapq.heappop(runtime.queue)
+            users = job.chunks[job.next_chunk]
+            job.chunks[job.next_chunk] = None
+            job.next_chunk += 1
+            self._record_wait(job.alert.severity.value, time.monotonic() - job.queued_at)
+            if job.next_chunk < len(job.chunks):
+                # The rest of the job re-queues behind anything more urgent
+                self._push(job)
+            job.status = 'running'
+            try:
+                await self._send_batch(job, runtime, users)
+            except Exception as e:
+                self.logger.error(f"Delivery job {job.id} failed: {str(e)}")
+                job.status = 'failed'
+            job.pending_chunks -= 1
+            if job.pending_chunks == 0:
+                self._finish(job)
+
+    async def _stop_dispatchers(self):
+        runtimes = list(self.channels.values())
+        for runtime in runtimes:
+            runtime.closed = True
+            runtime.ready.set()
+        await asyncio.gather(*(task for runtime in runtimes for task in runtime.dispatchers),
+                             return_exceptions=True)
+
+    def _finish(self, job: DeliveryJob):
+        if job.status != 'failed':
+            job.status = 'completed'
+        job.completed_at = datetime.now()
+        job.users = []  # recipients are no longer needed once the job is finished
+        job.chunks = []
+        job.done.set()
+
+    def _record_wait(self, severity: str, wait: float):
+        stats = self._priority_stats.setdefault(severity, {'dispatched_chunks': 0, 'total_wait': 0.0,
+                                                           'max_wait': 0.0})
+        stats['dispatched_chunks'] += 1
+        stats['total_wait'] += wait
+        stats['max_wait'] = max(stats['max_wait'], wait)
+
+    async def _send_batch(self, job: DeliveryJob, runtime: _ChannelRuntime, users: List):
+        if runtime.rate_limiter:
+            await runtime.rate_limiter.acquire(len(users))
+        runtime.in_flight += len(users)
+        try:
+            future = self.loop.run_in_executor(runtime.executor, self.deliver_batch,
+                                               job.alert, users, runtime.channel)
+            outcomes = await asyncio.wait_for(future, runtime.limits.send_timeout)
+        except Exception as e:
+            self.logger.error(f"Delivery batch of {len(users)} users failed: {str(e)}")
+            outcomes = {}
+        finally:
+            runtime.in_flight -= len(users)
+
+        for user in users:
+            success = bool(outcomes.get(user.id, False))
+            if success:
+                job.successful_deliveries += 1
+                runtime.sent += 1
+            else:
+                job.failed_deliveries += 1
+                runtime.failed += 1
+            job.delivery_details.append({
+                'user_id': user.id,
+                'user_name': user.name,
+                'success': success
+            })
+
+    def _trim_jobs(self):
+        """Forget the oldest finished jobs beyond MAX_FINISHED_JOBS"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.done.is_set()]
+        for job_id in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._jobs_lock:
+            active_jobs = sum(1 for job in self.jobs.values() if not job.done.is_set())
+        return {
+            'active_jobs': active_jobs,
+            'priorities': self._get_priority_stats(),
+            'channels': {
+                channel_type.value: {
+                    **runtime.limits.to_dict(),
+                    'in_flight': runtime.in_flight,
+                    'sent': runtime.sent,
+                    'failed': runtime.failed
+                }
+                for channel_type, runtime in list(self.channels.items())
+            }
+        }
+
+    def _get_priority_stats(self) -> Dict[str, Any]:
+        """Queue depth and chunk wait time per severity"""
+        result = {}
+        queued = [entry[2] for runtime in list(self.channels.values()) for entry in list(runtime.queue)]
+        for severity, stats in list(self._priority_stats.items()):
+            jobs = [job for job in queued if job.alert.severity.value == severity]
+            chunks = [chunk for job in jobs for chunk in job.chunks[job.next_chunk:] if chunk]
+            dispatched = stats['dispatched_chunks']
+            result[severity] = {
+                'queued_jobs': len(jobs),
+                'queued_chunks': len(chunks),
+                'queued_recipients': sum(len(chunk) for chunk in chunks),
+                'dispatched_chunks': dispatched,
+                'avg_wait_ms': round(stats['total_wait'] / dispatched * 1000, 2) if dispatched else 0.0,
+                'max_wait_ms': round(stats['max_wait'] * 1000, 2)
+            }
+        return result
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Wait for queued jobs, then stop the loop and channel thread pools"""
+        for job in list(self.jobs.values()):
+            job.done.wait(timeout)
+        try:
+            asyncio.run_coroutine_threadsafe(self._stop_dispatchers(), self.loop).result(timeout)
+        except Exception as e:
+            self.logger.warning(f"Delivery dispatchers did not stop cleanly: {str(e)}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        for runtime in self.channels.values():
+            runtime.executor.shutdown(wait=False)
@@ -0,0 +1,175 @@
+import base64
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+class InboxService:
+    """Fan-out-on-write user inbox.
+
+    When an alert is created or re-targeted one user_inbox row is written per
+    recipient, carrying the user's current UserAlertState and the alert's
+    severity and active window. Reading an inbox is then a single indexed
+    range query on (user_id, created_at, alert_id) with keyset pagination.
+    """
+
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+    # A page is PAGE_SQL, any state/severity/cursor filters, then PAGE_ORDER_SQL
+    PAGE_SQL = """
+        SELECT a.*, i.state, i.created_at AS inbox_created_at FROM user_inbox i
+        JOIN alerts a ON a.id = i.alert_id
+        WHERE i.user_id = ? AND i.start_time <= ? AND i.expiry_time >= ?
+        AND a.status = 'active'
+    """
+    PAGE_ORDER_SQL = " ORDER BY i.created_at DESC, i.alert_id DESC LIMIT ?"
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self.logger = logging.getLogger(__name__)
+        
+        from services.user_alert_preference_service import UserAlertPreferenceService
+        self.preference_service = UserAlertPreferenceService(db_manager)
+
+    def fan_out(self, alert, user_ids: Iterable[str]) -> int:
+        """Write an inbox row for every recipient of a newly created alert"""
+        prefs = self.preference_service.get_for_alert(alert.id, user_ids)
+        rows = [self._inbox_row(alert, user_id, pref.state.value) for user_id, pref in prefs.items()]
+        if not rows:
+            return 0
+        self.db_manager.executemany("""
+            INSERT OR IGNORE INTO user_inbox
+            (user_id, alert_id, severity, state, start_time, expiry_time, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        self.logger.info(f"Inbox fan-out for alert {alert.id}: {len(rows)} recipients")
+        return len(rows)
+
+    def retarget(self, alert, user_ids: Iterable[str]) -> Dict[str, int]:
+        """Bring the alert's inbox rows in line with a new audience"""
+        new_audience = set(user_ids)
+        current = {row[0] for row in self.db_manager.fetchall(
+            "SELECT user_id FROM user_inbox WHERE alert_id = ?", (alert.id,))}
+        # Users re-added to an alert keep the state they already had
+        added_prefs = self.preference_service.get_for_alert(alert.id, new_audience - current)
+        
+        with self.db_manager.transaction() as conn:
+            current = {row[0] for row in conn.execute(
+                "SELECT user_id FROM user_inbox WHERE alert_id = ?", (alert.id,))}
+            removed = current - new_audience
+            added = new_audience - current
+
+            conn.executemany("DELETE FROM user_inbox WHERE user_id = ? AND alert_id = ?",
+                             [(user_id, alert.id) for user_id in removed])
+            conn.executemany("""
+                INSERT OR IGNORE INTO user_inbox
+                (user_id, alert_id, severity, state, start_time, expiry_time, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [self._inbox_row(alert, user_id, added_prefs[user_id].state.value)
+                  for user_id in added if user_id in added_prefs])
+            self._sync_alert_columns(conn, alert)
+
+        return {'added': len(added), 'removed': len(removed)}
+
+    def sync_alert(self, alert):
+        """Refresh the denormalized alert columns after an update"""
+        with self.db_manager.transaction() as conn:
+            self._sync_alert_columns(conn, alert)
+
+    def remove_alert(self, alert_id: str) -> int:
+        return self.db_manager.execute("DELETE FROM user_inbox WHERE alert_id = ?", (alert_id,))
+
+    def update_state(self, user_id: str, alert_id: str, state: str):
+        self.db_manager.execute(
+            "UPDATE user_inbox SET state = ? WHERE user_id = ? AND alert_id = ?",
+            (state, user_id, alert_id))
+
+    def get_unread_alert_ids(self, user_id: str, severity: Optional[str] = None) -> List[str]:
+        """Ids of the active alerts in the user's inbox that are not read yet"""
+        now = datetime.now().isoformat()
+        sql = """
+            SELECT i.alert_id FROM user_inbox i JOIN alerts a ON a.id = i.alert_id
+            WHERE i.user_id = ? AND i.state != 'read' AND i.start_time <= ? AND i.expiry_time >= ?
+            AND a.status = 'active'
+        """
+        params: List[Any] = [user_id, now, now]
+        if severity:
+            sql += " AND i.severity = ?"
+            params.append(severity)
+        return [row[0] for row in self.db_manager.fetchall(sql, params)]
+
+    def get_inbox(self, user_id: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                  state: Optional[str] = None, severity: Optional[str] = None) -> Tuple[List[tuple], Optional[str]]:
+        """Return one page of the user's active inbox, newest first.
+
+        Rows are ``alerts.*`` followed by the inbox state. The returned cursor
+        is passed back to fetch the next page, and is None on the last page.
+        """
+        _, rows, next_cursor = self._page(user_id, limit, cursor, state, severity)
+        return rows, next_cursor
+
+    def get_inbox_dicts(self, user_id: str, alert_service, limit: Optional[int] = None,
+                        cursor: Optional[str] = None, state: Optional[str] = None,
+                        severity: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Like get_inbox, but maps rows straight to response dicts by column name"""
+        columns, rows, next_cursor = self._page(user_id, limit, cursor, state, severity)
+        return alert_service.rows_to_dicts(columns, rows), next_cursor
+
+    def _page(self, user_id, limit, cursor, state, severity):
+        limit = min(max(int(limit or self.DEFAULT_PAGE_SIZE), 1), self.MAX_PAGE_SIZE)
+        now = datetime.now().isoformat()
+
+        sql = self.PAGE_SQL
+        params: List[Any] = [user_id, now, now]
+        if state:
+            sql += " AND i.state = ?"
+            params.append(state)
+        if severity:
+            sql += " AND i.severity = ?"
+            params.append(severity)
+        if cursor:
+            sql += " AND (i.created_at, i.alert_id) < (?, ?)"
+            params.extend(self.decode_cursor(cursor))
+        sql += self.PAGE_ORDER_SQL
+        params.append(limit + 1)
+
+        columns, rows = self.db_manager.fetchall_with_columns(sql, params)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = self.encode_cursor(last[-1], last[0])
+        return columns[:-1], [row[:-1] for row in rows], next_cursor
+
+    def backfill(self, alerts: Iterable, user_service) -> Dict[str, int]:
+        """Fan existing alerts out into the inbox table, keeping stored user states"""
+        alert_count = row_count = 0
+        for alert in alerts:
+            result = self.retarget(alert, user_service.audience.resolve_alert(alert))
+            alert_count += 1
+            row_count += result['added']
+        self.logger.info(f"Inbox backfill complete: {alert_count} alerts, {row_count} rows written")
+        return {'alerts': alert_count, 'rows_written': row_count}
+
+    @staticmethod
+    def encode_cursor(created_at: str, alert_id: str) -> str:
+        return base64.urlsafe_b64encode(f"{created_at}|{alert_id}".encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, str]:
+        try:
+            created_at, alert_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError("Invalid inbox cursor")
+        return created_at, alert_id
+
+    def _sync_alert_columns(self, conn, alert):
+        conn.execute("""
+            UPDATE user_inbox SET severity = ?, start_time = ?, expiry_time = ?
+            WHERE alert_id = ?
+        """, (alert.severity.value, alert.start_time.isoformat(),
+              alert.expiry_time.isoformat(), alert.id))
+
+    def _inbox_row(self, alert, user_id: str, state: str) -> tuple:
+        return (user_id, alert.id, alert.severity.value, state,
+                alert.start_time.isoformat(), alert.expiry_time.isoformat(),
+                alert.created_at.isoformat())
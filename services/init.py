@@ -2,3 +2,7 @@ from .user_service import UserService
 from .team_service import TeamService
 from .user_alert_preference_service import UserAlertPreferenceService
 from .analytics_service import AnalyticsService
+from .audience_index import AudienceIndex
+from .timeseries_store import TimeSeriesStore
+from .notification_stream import NotificationStreamHub
+from .lifecycle_service import LifecycleService
@@ -0,0 +1,202 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from services.alert_cache import AlertCache
+from utils.instrumentation import metrics
+
+# Alert-owned tables copied to the archive as archived_<table>, with the
+# column that references the alert. Every one has an ``id`` primary key, so
+# re-running an interrupted batch overwrites rather than duplicates.
+ARCHIVED_TABLES = (
+    ('user_alert_preferences', 'alert_id'),
+    ('notification_deliveries', 'alert_id'),
+    ('in_app_notifications', 'alert_id'),
+)
+
+def archive_schema(conn) -> str:
+    """Schema holding the archive tables: the attached archive database, or main"""
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    return 'archive' if 'archive' in attached else 'main'
+
+def history_source(conn, table: str, columns: str) -> str:
+    """FROM clause covering a table's live rows and its archived copies, if any"""
+    schema = archive_schema(conn)
+    archived = conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?",
+                            (f"archived_{table}",)).fetchone()
+    if not archived:
+        return table
+    return f"(SELECT {columns} FROM main.{table} UNION ALL SELECT {columns} FROM {schema}.archived_{table})"
+
+class LifecycleService:
+    """Moves alerts through EXPIRED and into the archive, keeping hot tables small.
+
+    ``expire_due`` flips active alerts whose ``expiry_time`` has passed to
+    ``expired`` in batches read off the (status, expiry_time) index, cancels
+    their pending reminders and drops their inbox rows. ``archive_due`` moves
+    alerts that ended more than ``archive_after`` ago, with their preferences,
+    deliveries and in-app notifications, into ``archived_*`` tables, and
+    deletes their inbox and fan-out rows. Rows move in transactions of at most
+    ``chunk_size`` so a large organization-wide alert never holds the write
+    lock for long; the alert row itself moves last, so an interrupted pass is
+    simply picked up again.
+
+    Each chunk is copied to the archive in one transaction and deleted from
+    the live table in the next. In WAL mode SQLite does not commit a
+    transaction that writes both the main and an attached database
+    atomically, so one transaction could lose rows on a crash. Splitting it
+    means a crash can at worst leave rows in both places, and the next pass
+    overwrites the copy (``INSERT OR REPLACE``) and deletes the original.
+
+    The archive lives in the database attached as ``archive``
+    (``DatabaseManager(archive_path=...)``) when there is one, otherwise in
+    the main file. Analytics rollups are left alone, so dashboards keep
+    counting archived history. ``reclaim_space`` returns freed pages to the
+    filesystem a few at a time on databases in incremental auto-vacuum mode.
+    """
+
+    EXPIRED_SQL = """
+        SELECT id FROM alerts WHERE status = 'active' AND expiry_time < ?
+        ORDER BY expiry_time LIMIT ?
+    """
+    ARCHIVABLE_SQL = "SELECT id FROM alerts WHERE status IN ('expired', 'archived') AND expiry_time < ? LIMIT ?"
+    # One chunk of an alert's rows in an alert-owned table
+    DRAIN_SQL = "SELECT rowid FROM main.{table} WHERE {where} LIMIT ?"
+
+    def __init__(self, db_manager, archive_after: timedelta = timedelta(days=30),
+                 expire_batch_size: int = 500, archive_batch_size: int = 50,
+                 chunk_size: int = 5000, vacuum_pages: int = 1000):
+        self.db_manager = db_manager
+        self.archive_after = archive_after
+        self.expire_batch_size = expire_batch_size
+        self.archive_batch_size = archive_batch_size
+        self.chunk_size = chunk_size
+        self.vacuum_pages = vacuum_pages
+        self.cache = AlertCache.for_db(db_manager)
+        self.logger = logging.getLogger(__name__)
+        self._schema: Optional[str] = None
+
+    def ensure_archive_tables(self) -> str:
+        """Create or widen the archive tables to match the live ones; returns their schema"""
+        with self.db_manager.transaction() as conn:
+            schema = archive_schema(conn)
+            for table, column in (('alerts', None),) + ARCHIVED_TABLES:
+                archived = f"archived_{table}"
+                conn.execute(f"""CREATE TABLE IF NOT EXISTS {schema}.{archived} (
+                                     id TEXT PRIMARY KEY, archived_at TEXT NOT NULL)""")
+                existing = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({archived})")}
+                for _, name, ddl, *_ in conn.execute(f"PRAGMA main.table_info({table})").fetchall():
+                    if name not in existing:
+                        conn.execute(f"ALTER TABLE {schema}.{archived} ADD COLUMN {name} {ddl}")
+                if column:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_{archived}_alert "
+                                 f"ON {archived} ({column})")
+        self._schema = schema
+        return schema
+
+    def expire_due(self, now: Optional[datetime] = None) -> int:
+        """Mark one batch of active alerts past their expiry as expired; returns how many"""
+        now = (now or datetime.now()).isoformat()
+        with self.db_manager.transaction() as conn:
+            alert_ids = [row[0] for row in conn.execute(self.EXPIRED_SQL, (now, self.expire_batch_size))]
+            if not alert_ids:
+                return 0
+            marks = self._marks(alert_ids)
+            conn.execute(f"UPDATE alerts SET status = 'expired', updated_at = ? WHERE id IN ({marks})",
+                         (now, *alert_ids))
+            conn.execute(f"""UPDATE user_alert_preferences SET next_reminder_at = NULL
+                             WHERE alert_id IN ({marks}) AND next_reminder_at IS NOT NULL""", alert_ids)
+            conn.execute(f"DELETE FROM user_inbox WHERE alert_id IN ({marks})", alert_ids)
+            self.cache.bump(conn)
+        metrics.inc('alerts_expired', len(alert_ids))
+        return len(alert_ids)
+
+    def archive_due(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Move one batch of long-ended alerts and their rows to the archive; returns rows moved per table"""
+        now = now or datetime.now()
+        cutoff = (now - self.archive_after).isoformat()
+        alert_ids = [row[0] for row in self.db_manager.fetchall(self.ARCHIVABLE_SQL,
+                                                                (cutoff, self.archive_batch_size))]
+        if not alert_ids:
+            return {}
+
+        schema = self._schema or self.ensure_archive_tables()
+        archived_at, marks = now.isoformat(), self._marks(alert_ids)
+        moved = {}
+        for table, column in ARCHIVED_TABLES:
+            moved[table] = self._drain(table, f"{column} IN ({marks})", alert_ids, schema, archived_at)
+        moved['user_inbox'] = self._drain('user_inbox', f"alert_id IN ({marks})", alert_ids)
+        moved['fanout_job_recipients'] = self._drain(
+            'fanout_job_recipients', f"job_id IN (SELECT id FROM fanout_jobs WHERE alert_id IN ({marks}))", alert_ids)
+        moved['fanout_jobs'] = self._drain('fanout_jobs', f"alert_id IN ({marks})", alert_ids)
+
+        with self.db_manager.transaction() as conn:
+            self._copy(conn, 'alerts', f"id IN ({marks})", alert_ids, schema, archived_at)
+            conn.execute(f"UPDATE {schema}.archived_alerts SET status = 'archived' WHERE id IN ({marks})",
+                         alert_ids)
+        with self.db_manager.transaction() as conn:
+            moved['alerts'] = conn.execute(f"DELETE FROM main.alerts WHERE id IN ({marks})", alert_ids).rowcount
+            self.cache.bump(conn)
+        for table, count in moved.items():
+            metrics.inc('rows_archived', count, table=table)
+        return moved
+
+    def reclaim_space(self, max_pages: Optional[int] = None) -> int:
+        """Return up to ``max_pages`` free pages to the filesystem; must run outside a transaction"""
+        with self.db_manager.connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return 0
+            pages = min(conn.execute("PRAGMA freelist_count").fetchone()[0], max_pages or self.vacuum_pages)
+            if pages:
+                # executescript steps the pragma to completion; execute frees a single page
+                conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        metrics.inc('pages_reclaimed', pages)
+        return pages
+
+    def enable_incremental_vacuum(self):
+        """Switch an existing database to incremental auto-vacuum (a full VACUUM; run offline)"""
+        with self.db_manager.connection() as conn:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+
+    def get_storage_stats(self) -> Dict[str, Any]:
+        with self.db_manager.connection() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            pages = conn.execute("PRAGMA page_count").fetchone()[0]
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            schema = archive_schema(conn)
+        return {
+            'database_bytes': pages * page_size,
+            'free_bytes': free * page_size,
+            'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(mode, mode),
+            'archive': 'attached' if schema == 'archive' else 'main'
+        }
+
+    def _drain(self, table: str, where: str, params: Sequence[Any], schema: Optional[str] = None,
+               archived_at: Optional[str] = None) -> int:
+        """Move (or with no schema, delete) matching rows in chunks, copying and deleting in separate transactions"""
+        total = 0
+        while True:
+            with self.db_manager.transaction() as conn:
+                rowids = [row[0] for row in conn.execute(self.DRAIN_SQL.format(table=table, where=where),
+                                                         (*params, self.chunk_size))]
+                chunk = f"rowid IN ({self._marks(rowids)}) AND {where}"
+                if rowids and schema:
+                    self._copy(conn, table, chunk, (*rowids, *params), schema, archived_at)
+            if rowids:
+                with self.db_manager.transaction() as conn:
+                    conn.execute(f"DELETE FROM main.{table} WHERE {chunk}", (*rowids, *params))
+            total += len(rowids)
+            if len(rowids) < self.chunk_size:
+                return total
+
+    @staticmethod
+    def _copy(conn, table: str, where: str, params: Sequence[Any], schema: str, archived_at: str):
+        columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+        conn.execute(f"""INSERT OR REPLACE INTO {schema}.archived_{table} ({columns}, archived_at)
+                         SELECT {columns}, ? FROM main.{table} WHERE {where}""", (archived_at, *params))
+
+    @staticmethod
+    def _marks(values: List[Any]) -> str:
+        return ", ".join("?" * len(values))
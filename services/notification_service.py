@@ -1,87 +1,250 @@
+import uuid
+import time
 import threading
 import logging
-from typing import Dict, List, Any
-from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from utils.instrumentation import metrics
 
 class NotificationService:
     """Service for handling notification delivery with Observer pattern"""
     
-    def __init__(self, db_manager):
+    MAX_DIGEST_ATTEMPTS = 3
+    
+    def __init__(self, db_manager, delivery_log_batch_size: int = 500,
+                 delivery_log_flush_interval: float = 0.05, delivery_log_queue_size: int = 10000,
+                 throttle_burst: Optional[int] = None, throttle_per_minute: Optional[float] = None,
+                 digest_interval: float = 300.0, digest_check_interval: float = 1.0):
         self.db_manager = db_manager
         self.channels = {}
         self.observers = []  # Observer pattern for notification events
         self.logger = logging.getLogger(__name__)
         
+        # Delivery records are group-committed by a dedicated writer thread
+        # instead of one INSERT + commit per recipient
+        from database.batch_writer import BatchWriter
+        from services.analytics_service import record_deliveries
+        self.delivery_log = BatchWriter(
+            db_manager,
+            """
+            INSERT INTO notification_deliveries 
+            (id, alert_id, user_id, delivery_channel, delivered_at, delivery_status)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            to_params=self._delivery_params,
+            batch_size=delivery_log_batch_size,
+            flush_interval=delivery_log_flush_interval,
+            max_queue_size=delivery_log_queue_size,
+            name="delivery-log-writer",
+            on_flush=record_deliveries  # rollups commit with the delivery rows
+        )
+        self.delivery_log.start()
+        
+        from services.timeseries_store import TimeSeriesStore
+        self.timeseries = TimeSeriesStore.for_db(db_manager)
+        
+        # Opt-in per (user, channel) token buckets; held non-critical alerts go out as digests
+        from services.notification_throttle import NotificationThrottle
+        self.throttle = NotificationThrottle(throttle_burst, throttle_per_minute, digest_interval)
+        self.digest_check_interval = digest_check_interval
+        self._digest_stop = threading.Event()
+        self._digest_thread = threading.Thread(target=self._run_digest_flusher, daemon=True,
+                                               name="digest-flusher")
+        self._digest_thread.start()
+        
+        # Persistent delivery engine shared by every fan-out
+        from services.delivery_engine import DeliveryEngine
+        self.engine = DeliveryEngine(self._deliver_batch)
+        
         # Initialize default in-app channel
         from notification_channels.in_app_channel import InAppChannel
         from models.alert import DeliveryType
-        self.register_channel(DeliveryType.IN_APP, InAppChannel())
+        self.register_channel(DeliveryType.IN_APP, InAppChannel(db_manager), concurrency=32)
     
-    def register_channel(self, channel_type, channel):
-        """Register a notification channel"""
+    def register_channel(self, channel_type, channel, concurrency: int = 10,
+                         rate_per_second: Optional[float] = None, send_timeout: float = 30.0,
+                         batch_size: int = 50, throttle: bool = True, user_burst: Optional[int] = None,
+                         user_per_minute: Optional[float] = None):
+        """Register a notification channel with its delivery concurrency, rate and batch limits.
+        
+        ``user_burst``/``user_per_minute`` throttle each user on this channel,
+        overriding the service-wide ``throttle_burst`` (off unless set);
+        ``throttle=False`` turns throttling off for the channel.
+        """
+        from services.delivery_engine import ChannelLimits
+        if not throttle:
+            self.throttle.set_limit(channel_type, None, None)
+        elif user_burst is not None:
+            self.throttle.set_limit(channel_type, user_burst, user_per_minute)
         self.channels[channel_type] = channel
+        self.engine.register_channel(channel_type, channel,
+                                     ChannelLimits(concurrency, rate_per_second, send_timeout, batch_size))
         self.logger.info(f"Channel registered: {channel_type.value}")
     
     def send_alert_to_users(self, alert, users: List) -> Dict[str, Any]:
-        """Send alert to multiple users"""
+        """Send alert to multiple users and wait for the results"""
         results = {
             'successful_deliveries': 0,
             'failed_deliveries': 0,
             'delivery_details': []
         }
         
-        channel = self.channels.get(alert.delivery_type)
-        if not channel:
+        if alert.delivery_type not in self.channels:
             self.logger.error(f"No channel available for type: {alert.delivery_type}")
             return results
         
-        # Use thread pool for concurrent delivery
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = []
-            
-            for user in users:
-                future = executor.submit(self._deliver_to_user, alert, user, channel)
-                futures.append((future, user))
-            
-            # Collect results
-            for future, user in futures:
-                try:
-                    success = future.result(timeout=30)  # 30 second timeout
-                    
-                    if success:
-                        results['successful_deliveries'] += 1
-                    else:
-                        results['failed_deliveries'] += 1
-                    
-                    results['delivery_details'].append({
-                        'user_id': user.id,
-                        'user_name': user.name,
-                        'success': success
-                    })
-                    
-                except Exception as e:
-                    self.logger.error(f"Delivery failed for user {user.id}: {str(e)}")
-                    results['failed_deliveries'] += 1
-        
-        return results
-    
-    def _deliver_to_user(self, alert, user, channel) -> bool:
-        """Deliver notification to a single user"""
+        job = self.engine.wait(self.engine.submit(alert, users))
+        return job.results()
+    
+    def submit_alert(self, alert, users: List) -> str:
+        """Queue delivery of an alert and return the delivery job id immediately"""
+        return self.engine.submit(alert, users)
+    
+    def get_delivery_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the progress of a submitted delivery job"""
+        return self.engine.get_job(job_id)
+    
+    def _deliver_batch(self, alert, users: List, channel) -> Dict[str, bool]:
+        """Deliver notification to a batch of users with one channel call"""
+        channel_type = channel.get_channel_type()
+        if alert.created_by == "digest":
+            # Digests are not throttled again; flush_digests logs the alerts they carry
+            return self._send_batch(alert, users, channel, channel_type)
+        users, held = self.throttle.admit(alert, users, channel_type)
+        outcomes = self._send_batch(alert, users, channel, channel_type)
+        
+        sent = 0
+        for user in users:
+            if outcomes.get(user.id):
+                self._log_delivery(alert, user, channel_type)
+                sent += 1
+        
+        dimensions = {'channel': channel_type.value, 'severity': alert.severity.value}
+        if sent:
+            self.timeseries.record('deliveries.sent', sent, sent, **dimensions)
+        if sent < len(users):
+            self.timeseries.record('deliveries.failed', len(users) - sent, len(users) - sent, **dimensions)
+        metrics.inc('deliveries', sent, channel=channel_type.value, status='sent')
+        metrics.inc('deliveries', len(users) - sent, channel=channel_type.value, status='failed')
+        metrics.inc('deliveries', len(held), channel=channel_type.value, status='throttled')
+        # Held recipients are handled once their alert is stored for the next digest
+        if held and self._store_held(alert, held, channel_type):
+            outcomes.update((user.id, True) for user in held)
+        return outcomes
+    
+    def _send_batch(self, alert, users: List, channel, channel_type) -> Dict[str, bool]:
+        if not users:
+            return {}
+        started = time.perf_counter()
         try:
-            # Send notification
-            success = channel.send_notification(user, alert)
-            
-            if success:
-                # Log delivery
-                self._log_delivery(alert, user, channel.get_channel_type())
-            
-            return success
-            
+            outcomes = dict(channel.send_batch(users, alert))
         except Exception as e:
-            self.logger.error(f"Failed to deliver to user {user.id}: {str(e)}")
+            self.logger.error(f"Failed to deliver batch of {len(users)} users: {str(e)}")
+            outcomes = {}
+        metrics.observe('channel_send_seconds', time.perf_counter() - started, channel=channel_type.value)
+        return outcomes
+    
+    def _store_held(self, alert, users: List, channel_type) -> bool:
+        """Persist held alerts so a restart does not lose them; False leaves them to the outbox retry"""
+        held_at = datetime.now().isoformat()
+        try:
+            self.db_manager.executemany("""
+                INSERT OR IGNORE INTO held_digest_alerts (user_id, channel, alert_id, held_at)
+                VALUES (?, ?, ?, ?)
+            """, [(user.id, channel_type.value, alert.id, held_at) for user in users])
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to store {len(users)} held alerts: {str(e)}")
             return False
     
-    def _log_delivery(self, alert, user, channel_type):
+    def _release_held(self, digest):
+        self.db_manager.executemany("""
+            DELETE FROM held_digest_alerts WHERE user_id = ? AND channel = ? AND alert_id = ?
+        """, [(digest.user.id, digest.channel_type.value, alert_id) for alert_id in digest.alerts])
+    
+    def restore_digests(self, owns=None) -> int:
+        """Reload held alerts stored by an earlier process; returns how many were restored.
+        
+        Call it once in the process that delivers for these users; ``owns``
+        filters user ids (a delivery worker passes its partition test). A
+        restored digest keeps the window it was opened in.
+        """
+        from models.alert import DeliveryType
+        from services.alert_service import AlertService
+        from services.user_service import UserService
+        
+        rows = [row for row in self.db_manager.fetchall(
+            "SELECT user_id, channel, alert_id, held_at FROM held_digest_alerts")
+            if owns is None or owns(row[0])]
+        users = {u.id: u for u in UserService(self.db_manager).get_users_by_ids({row[0] for row in rows})}
+        alert_srv = AlertService(self.db_manager)
+        alerts = {alert_id: alert_srv.get_alert_by_id(alert_id) for alert_id in {row[2] for row in rows}}
+        
+        held, opened, stale = defaultdict(list), {}, []
+        for user_id, channel, alert_id, held_at in rows:
+            if alerts.get(alert_id) is None or user_id not in users:
+                stale.append((user_id, channel, alert_id))
+                continue
+            key = (user_id, DeliveryType(channel))
+            held[key].append(alerts[alert_id])
+            opened[key] = min(opened.get(key, held_at), held_at)
+        if stale:
+            self.db_manager.executemany("""
+                DELETE FROM held_digest_alerts WHERE user_id = ? AND channel = ? AND alert_id = ?
+            """, stale)
+        
+        wall, now = datetime.now(), time.monotonic()
+        for (user_id, channel_type), restored in held.items():
+            age = (wall - datetime.fromisoformat(opened[user_id, channel_type])).total_seconds()
+            self.throttle.hold(users[user_id], channel_type, restored, now - max(0.0, age))
+        return sum(len(restored) for restored in held.values())
+    
+    def flush_digests(self, force: bool = False) -> int:
+        """Send every digest whose window has closed through the delivery engine; returns the number sent.
+        
+        A digest that fails is held for another window, up to
+        MAX_DIGEST_ATTEMPTS sends, and its alerts stay stored until then.
+        """
+        due = [(digest, self._submit_digest(digest)) for digest in self.throttle.due_digests(force=force)]
+        sent = 0
+        for digest, job_id in due:
+            job = self.engine.wait(job_id) if job_id else None
+            ok = bool(job and job.successful_deliveries)
+            self.throttle.record_digest(digest, ok)
+            if ok:
+                sent += 1
+                self._release_held(digest)
+                for alert in digest.alerts.values():
+                    self._log_delivery(alert, digest.user, digest.channel_type, status="digested")
+                metrics.inc('deliveries', len(digest.alerts), channel=digest.channel_type.value, status='digested')
+            elif digest.attempts + 1 < self.MAX_DIGEST_ATTEMPTS:
+                retry = self.throttle.hold(digest.user, digest.channel_type, list(digest.alerts.values()),
+                                           time.monotonic())
+                retry.attempts = digest.attempts + 1
+            else:
+                self.logger.error(f"Dropping digest of {len(digest.alerts)} alerts for user {digest.user.id} "
+                                  f"after {self.MAX_DIGEST_ATTEMPTS} failed sends")
+                self._release_held(digest)
+        return sent
+    
+    def _submit_digest(self, digest) -> Optional[str]:
+        try:
+            return self.engine.submit(digest.to_alert(), [digest.user], digest.channel_type)
+        except Exception as e:
+            self.logger.error(f"Failed to send digest to user {digest.user.id}: {str(e)}")
+            return None
+    
+    def _run_digest_flusher(self):
+        while not self._digest_stop.wait(self.digest_check_interval):
+            try:
+                self.flush_digests()
+                self.throttle.compact()
+            except Exception as e:
+                self.logger.error(f"Digest flush failed: {str(e)}")
+    
+    def _log_delivery(self, alert, user, channel_type, status: str = "sent"):
         """Log notification delivery"""
         from models.notification_delivery import NotificationDelivery
         from datetime import datetime
@@ -91,21 +254,41 @@ class NotificationService:
             alert_id=alert.id,
             user_id=user.id,
             delivery_channel=channel_type,
-            delivered_at=datetime.now()
+            delivered_at=datetime.now(),
+            delivery_status=status
         )
         
-        conn = sqlite3.connect(self.db_manager.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO notification_deliveries 
-            (id, alert_id, user_id, delivery_channel, delivered_at, delivery_status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
+        self.delivery_log.submit(delivery)
+    
+    @staticmethod
+    def _delivery_params(delivery):
+        """Map a NotificationDelivery to its notification_deliveries row"""
+        return (
             delivery.id, delivery.alert_id, delivery.user_id,
             delivery.delivery_channel.value, delivery.delivered_at.isoformat(),
             delivery.delivery_status
-        ))
-        
-        conn.commit()
-        conn.close()
+        )
+    
+    def get_delivery_log_stats(self) -> Dict[str, Any]:
+        """Return batch size, flush latency and queue depth of the delivery log writer"""
+        return self.delivery_log.get_stats()
+    
+    def get_engine_stats(self) -> Dict[str, Any]:
+        """Return per-channel concurrency, in-flight and throughput counters"""
+        return self.engine.get_stats()
+    
+    def get_throttle_stats(self) -> Dict[str, Any]:
+        """Return delivered, throttled and digested counters of the per-user throttle"""
+        return self.throttle.get_stats()
+    
+    def shutdown(self):
+        """Finish queued deliveries, flush delivery records and stop background workers"""
+        if self._digest_stop.is_set():
+            return  # already shut down
+        self._digest_stop.set()
+        self._digest_thread.join()  # held alerts stay in held_digest_alerts for restore_digests
+        self.engine.shutdown()
+        self.delivery_log.stop()
+        for channel in self.channels.values():
+            if hasattr(channel, 'close'):
+                channel.close()
@@ -0,0 +1,203 @@
+import json
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from utils.state_manager import StateManager
+
+class Subscription:
+    """One open stream: a bounded buffer of pending notifications and a wake-up event"""
+
+    __slots__ = ('user_id', 'buffer', 'overflowed', 'ready', 'skip')
+
+    def __init__(self, user_id: str, buffer_size: int):
+        self.user_id = user_id
+        self.buffer = deque(maxlen=buffer_size)
+        self.overflowed = False
+        self.ready = threading.Event()
+        self.skip: Optional[Set[str]] = None  # ids already sent by the resume replay
+
+    def push(self, notification):
+        if len(self.buffer) == self.buffer.maxlen:
+            # A client this far behind resynchronizes with one GET instead
+            self.overflowed = True
+        self.buffer.append(notification)
+        self.ready.set()
+
+    def drain(self, timeout: float) -> List:
+        self.ready.wait(timeout)
+        self.ready.clear()
+        items = []
+        while self.buffer:
+            items.append(self.buffer.popleft())
+        return items
+
+class NotificationStreamHub:
+    """Per-user registry of Server-Sent Events subscribers for in-app notifications.
+
+    ``InAppChannel`` publishes every stored batch here; users without an open
+    stream cost one dict lookup. Each subscription buffers at most
+    ``buffer_size`` notifications; a client that falls further behind gets a
+    ``resync`` event and should refetch its alerts once. Idle streams send a
+    comment frame every ``heartbeat_interval`` seconds so proxies keep them
+    open, and a reconnecting client's ``Last-Event-ID`` is resumed from the
+    stored notifications through ``replay_source``.
+
+    When deliveries run in other processes, ``start_tailing`` switches the
+    hub to following ``in_app_notifications`` by rowid instead.
+    """
+
+    def __init__(self, buffer_size: int = 100, heartbeat_interval: float = 15.0,
+                 max_streams_per_user: int = 5, replay_limit: int = 100, retry_ms: int = 3000):
+        self.buffer_size = buffer_size
+        self.heartbeat_interval = heartbeat_interval
+        self.max_streams_per_user = max_streams_per_user
+        self.replay_limit = replay_limit
+        self.retry_ms = retry_ms
+        # (user_id, last notification id, limit) -> notifications after it, or None if unknown
+        self.replay_source: Optional[Callable[[str, str, int], Optional[List]]] = None
+        self.logger = logging.getLogger(__name__)
+
+        self._subscribers: Dict[str, List[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._tail_thread: Optional[threading.Thread] = None
+        self._tail_stop = threading.Event()
+        self._stats = {'published': 0, 'pushed': 0, 'overflows': 0, 'resyncs': 0,
+                       'replayed': 0, 'heartbeats': 0, 'rejected': 0}
+
+    @classmethod
+    def for_db(cls, db_manager) -> "NotificationStreamHub":
+        """Return the hub shared by the in-app channel and the API for this database"""
+        return StateManager.get(db_manager, 'notification_stream', cls)
+
+    @property
+    def tailing(self) -> bool:
+        return self._tail_thread is not None
+
+    def subscribe(self, user_id: str) -> Optional[Subscription]:
+        """Register a stream for a user; None when the user already has too many open"""
+        subscription = Subscription(user_id, self.buffer_size)
+        with self._lock:
+            streams = self._subscribers.setdefault(user_id, [])
+            if len(streams) >= self.max_streams_per_user:
+                self._stats['rejected'] += 1
+                return None
+            streams.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            streams = self._subscribers.get(subscription.user_id)
+            if streams and subscription in streams:
+                streams.remove(subscription)
+                if not streams:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, notifications: List, source: str = 'channel'):
+        """Hand stored notifications to their users' open streams.
+
+        While tailing, only notifications read back from the database are
+        published, so each one reaches a stream exactly once.
+        """
+        if (source == 'channel') == self.tailing or not self._subscribers:
+            return
+        pushed = overflows = 0
+        with self._lock:
+            for notification in notifications:
+                for subscription in self._subscribers.get(notification.user_id, ()):
+                    was_overflowed = subscription.overflowed
+                    subscription.push(notification)
+                    overflows += subscription.overflowed and not was_overflowed
+                    pushed += 1
+            self._stats['published'] += len(notifications)
+            self._stats['pushed'] += pushed
+            self._stats['overflows'] += overflows
+
+    def events(self, subscription: Subscription, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """Yield SSE frames for a subscription until the client goes away or the hub closes"""
+        try:
+            yield f"retry: {self.retry_ms}\n\n"
+            if last_event_id:
+                replay = self.replay_source(subscription.user_id, last_event_id, self.replay_limit) \
+                    if self.replay_source else None
+                if replay is None:
+                    yield self._resync()
+                else:
+                    subscription.skip = {n.id for n in replay}
+                    with self._lock:
+                        self._stats['replayed'] += len(replay)
+                    for notification in replay:
+                        yield self._frame(notification)
+
+            while not self._closed:
+                items = subscription.drain(self.heartbeat_interval)
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield self._resync()
+                    continue
+                if subscription.skip is not None:
+                    items = [n for n in items if n.id not in subscription.skip]
+                    subscription.skip = None
+                if not items:
+                    if not self._closed:
+                        with self._lock:
+                            self._stats['heartbeats'] += 1
+                        yield ": heartbeat\n\n"
+                    continue
+                for notification in items:
+                    yield self._frame(notification)
+        finally:
+            self.unsubscribe(subscription)
+
+    def _resync(self) -> str:
+        with self._lock:
+            self._stats['resyncs'] += 1
+        return "event: resync\ndata: {}\n\n"
+
+    @staticmethod
+    def _frame(notification) -> str:
+        return f"id: {notification.id}\nevent: notification\ndata: {json.dumps(notification.to_dict())}\n\n"
+
+    def start_tailing(self, db_manager, interval: float = 0.25, batch_size: int = 1000):
+        """Follow in_app_notifications written by any process instead of in-process publishes"""
+        from notification_channels.in_app_channel import InAppChannel
+
+        if self._tail_thread is not None:
+            return
+        last_rowid = db_manager.scalar("SELECT COALESCE(MAX(rowid), 0) FROM in_app_notifications")
+
+        def tail():
+            nonlocal last_rowid
+            while not self._tail_stop.wait(interval):
+                try:
+                    rows = db_manager.fetchall("""SELECT rowid, * FROM in_app_notifications
+                                                  WHERE rowid > ? ORDER BY rowid LIMIT ?""",
+                                               (last_rowid, batch_size))
+                    if not rows:
+                        continue
+                    last_rowid = rows[-1][0]
+                    if self._subscribers:
+                        self.publish([InAppChannel._row_to_notification(row[1:]) for row in rows], source='db')
+                except Exception as e:
+                    self.logger.error(f"Notification stream tail failed: {str(e)}")
+
+        self._tail_thread = threading.Thread(target=tail, daemon=True, name="notification-stream-tail")
+        self._tail_thread.start()
+
+    def close(self):
+        """End every open stream (their generators return on the next wake-up)"""
+        self._closed = True
+        self._tail_stop.set()
+        with self._lock:
+            for streams in self._subscribers.values():
+                for subscription in streams:
+                    subscription.ready.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats,
+                    'streams': sum(len(streams) for streams in self._subscribers.values()),
+                    'users': len(self._subscribers),
+                    'mode': 'tail' if self.tailing else 'direct'}
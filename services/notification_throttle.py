@@ -0,0 +1,179 @@
+import threading
+import time
+import uuid
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+class _Digest:
+    """Non-critical alerts held back for one (user, channel) during the current window"""
+
+    __slots__ = ('user', 'channel_type', 'opened_at', 'alerts', 'attempts')
+
+    def __init__(self, user, channel_type, opened_at: float):
+        self.user = user
+        self.channel_type = channel_type
+        self.opened_at = opened_at
+        self.alerts: Dict[str, Any] = {}  # alert_id -> alert; a reminder of a held alert is not repeated
+        self.attempts = 0  # failed sends so far
+
+    def to_alert(self, max_lines: int = 20):
+        """Build the single notification that stands in for every held alert"""
+        from models.alert import Alert, VisibilityType
+
+        alerts = sorted(self.alerts.values(), key=lambda a: (-a.severity.rank, a.title))
+        lines = [f"[{a.severity.value}] {a.title}" for a in alerts[:max_lines]]
+        if len(alerts) > max_lines:
+            lines.append(f"...and {len(alerts) - max_lines} more")
+        now = datetime.now()
+        return Alert(
+            id=f"digest-{uuid.uuid4()}",
+            title=f"{len(alerts)} alerts while notifications were paused",
+            message="\n".join(lines),
+            severity=alerts[0].severity,
+            delivery_type=self.channel_type,
+            visibility_type=VisibilityType.USER,
+            visibility_target=self.user.id,
+            start_time=now,
+            expiry_time=now + timedelta(days=1),
+            reminders_enabled=False,
+            created_by="digest"
+        )
+
+class NotificationThrottle:
+    """Token bucket per (user, channel) with digesting of held non-critical alerts.
+
+    Each bucket holds up to ``burst`` tokens and refills at ``per_minute``;
+    a notification spends one token. Once a user's bucket is empty, INFO and
+    WARNING alerts on that channel are held and sent as one digest per user
+    once ``digest_interval`` seconds have passed since the first one was
+    held. CRITICAL alerts always go out and do not spend tokens. Throttling
+    is opt-in: without a ``burst`` only channels given a limit through
+    ``set_limit`` are throttled.
+
+    Bucket state is two flat arrays (tokens, last refill) indexed by a slot
+    per key. A bucket that has refilled completely behaves exactly like a
+    fresh one, so ``compact`` returns those slots to a free list.
+    """
+
+    COMPACT_INTERVAL = 60.0
+
+    def __init__(self, burst: Optional[int] = None, per_minute: Optional[float] = None,
+                 digest_interval: float = 300.0):
+        # No default limit: only channels given one with set_limit are throttled
+        self.default_limit = None if burst is None else (float(burst), (per_minute or burst) / 60.0)
+        self.limits: Dict[Any, Optional[Tuple[float, float]]] = {}  # channel -> (burst, per second)
+        self.digest_interval = digest_interval
+        self._slots: Dict[Tuple[str, Any], int] = {}
+        self._free: List[int] = []
+        self._tokens = array('d')
+        self._stamps = array('d')
+        self._digests: Dict[Tuple[str, Any], _Digest] = {}
+        self._lock = threading.Lock()
+        self._compacted_at = time.monotonic()
+        self._stats = {'delivered': 0, 'bypassed': 0, 'throttled': 0, 'digested': 0,
+                       'digests_sent': 0, 'digests_failed': 0}
+
+    def set_limit(self, channel_type, burst: Optional[int], per_minute: Optional[float]):
+        """Override the limit for one channel; ``burst=None`` disables throttling on it"""
+        with self._lock:
+            self.limits[channel_type] = None if burst is None else (float(burst), (per_minute or burst) / 60.0)
+
+    def admit(self, alert, users: List, channel_type, now: Optional[float] = None) -> Tuple[List, List]:
+        """Split recipients into (send now, held for the digest)"""
+        from models.alert import Severity
+
+        limit = self.limits.get(channel_type, self.default_limit)
+        if alert.severity == Severity.CRITICAL or limit is None:
+            with self._lock:
+                self._stats['bypassed' if limit is not None else 'delivered'] += len(users)
+            return list(users), []
+
+        burst, rate = limit
+        now = time.monotonic() if now is None else now
+        send, held = [], []
+        with self._lock:
+            for user in users:
+                key = (user.id, channel_type)
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._allocate(key, burst, now)
+                tokens = min(burst, self._tokens[slot] + (now - self._stamps[slot]) * rate)
+                self._stamps[slot] = now
+                if tokens >= 1.0:
+                    self._tokens[slot] = tokens - 1.0
+                    send.append(user)
+                    continue
+                self._tokens[slot] = tokens
+                digest = self._digests.get(key)
+                if digest is None:
+                    digest = self._digests[key] = _Digest(user, channel_type, now)
+                digest.alerts[alert.id] = alert
+                held.append(user)
+            self._stats['delivered'] += len(send)
+            self._stats['throttled'] += len(held)
+        return send, held
+
+    def _allocate(self, key, burst: float, now: float) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self._tokens[slot], self._stamps[slot] = burst, now
+        else:
+            slot = len(self._tokens)
+            self._tokens.append(burst)
+            self._stamps.append(now)
+        self._slots[key] = slot
+        return slot
+
+    def due_digests(self, force: bool = False, now: Optional[float] = None) -> List[_Digest]:
+        """Remove and return digests whose window has closed (all of them with ``force``)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = [key for key, digest in self._digests.items()
+                   if force or now - digest.opened_at >= self.digest_interval]
+            return [self._digests.pop(key) for key in due]
+
+    def hold(self, user, channel_type, alerts: List, opened_at: float):
+        """Put alerts back into a user's digest, e.g. ones restored after a restart or a failed send"""
+        with self._lock:
+            key = (user.id, channel_type)
+            digest = self._digests.get(key)
+            if digest is None:
+                digest = self._digests[key] = _Digest(user, channel_type, opened_at)
+            digest.opened_at = min(digest.opened_at, opened_at)
+            for alert in alerts:
+                digest.alerts.setdefault(alert.id, alert)
+            return digest
+
+    def record_digest(self, digest: _Digest, sent: bool):
+        with self._lock:
+            if sent:
+                self._stats['digests_sent'] += 1
+                self._stats['digested'] += len(digest.alerts)
+            else:
+                self._stats['digests_failed'] += 1
+
+    def compact(self, now: Optional[float] = None):
+        """Free the slots of buckets that have refilled completely"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if now - self._compacted_at < self.COMPACT_INTERVAL:
+                return
+            self._compacted_at = now
+            for key, slot in list(self._slots.items()):
+                limit = self.limits.get(key[1], self.default_limit)
+                if limit is None or self._tokens[slot] + (now - self._stamps[slot]) * limit[1] >= limit[0]:
+                    del self._slots[key]
+                    self._free.append(slot)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                'buckets': len(self._slots),
+                'pending_digests': len(self._digests),
+                'pending_digest_alerts': sum(len(d.alerts) for d in self._digests.values()),
+                'limits': {getattr(channel, 'value', channel): None if limit is None else
+                           {'burst': limit[0], 'per_minute': round(limit[1] * 60, 3)}
+                           for channel, limit in self.limits.items()}
+            }
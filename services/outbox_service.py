@@ -0,0 +1,371 @@
+import uuid
+import zlib
+import random
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from utils.state_manager import StateManager
+
+class OutboxService:
+    """Durable SQLite-backed outbox for asynchronous alert fan-out.
+
+    Creating an alert commits the alert row and a fan-out job in one
+    transaction. Workers then expand the job into one recipient row per
+    target user and deliver those rows in leased batches. Failed recipients
+    are retried with exponential backoff and moved to a dead-letter state
+    after ``max_attempts``. An expired lease makes rows claimable again, so
+    a crashed worker never loses deliveries.
+
+    Recipient rows carry their alert's severity rank as ``priority`` and are
+    claimed most severe first, so a CRITICAL fan-out overtakes an INFO
+    backlog at the next batch. Rows that have been due for longer than
+    ``aging_seconds`` are claimed first regardless of severity, so low
+    priorities never starve.
+
+    Each recipient row is assigned partition ``crc32(user_id) % partitions``
+    when it is inserted, and a worker that claims a single partition sees
+    every delivery for its users (see ``utils.delivery_workers``). Without
+    an explicit ``partitions`` the service uses the count ``repartition``
+    stored in ``outbox_settings``, so reminders queued by the API land in
+    the same partition as the worker pool's fan-out rows.
+    """
+
+    # Due, unleased recipients for one claim pass; {condition} narrows it to a partition and/or priority
+    DUE_RECIPIENTS_SQL = """
+        SELECT rowid FROM fanout_job_recipients
+        WHERE status = 'pending' {condition} AND next_attempt_at <= ?
+        AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+        ORDER BY next_attempt_at LIMIT ?
+    """
+
+    def __init__(self, db_manager, inbox_fanout: bool = False, max_attempts: int = 5,
+                 base_backoff_seconds: float = 2.0, max_backoff_seconds: float = 300.0,
+                 lease_seconds: float = 60.0, aging_seconds: float = 120.0,
+                 partitions: Optional[int] = None):
+        self.db_manager = db_manager
+        self.inbox_fanout = inbox_fanout
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.aging_seconds = aging_seconds
+        self.partitions = max(1, partitions) if partitions else None
+        self.logger = logging.getLogger(__name__)
+
+    def create_alert_with_job(self, alert_service, alert_data: Dict[str, Any]):
+        """Create an alert and its fan-out job atomically; returns (alert, job_id, outcome).
+
+        A repeat coalesced into an open alert gets no job (job_id is None);
+        an escalated repeat re-notifies the alert's audience.
+        """
+        with self.db_manager.transaction():
+            alert, outcome = alert_service.create_or_coalesce(alert_data)
+            job_id = self.enqueue(alert.id) if outcome != alert_service.COALESCED else None
+        if job_id:
+            self._wake_worker()
+        return alert, job_id, outcome
+
+    def create_alerts_with_jobs(self, alert_service, alerts: List[Any]) -> List[tuple]:
+        """Insert built alerts and their fan-out jobs in a single transaction.
+
+        Returns (alert, outcome, job_id) per input, with the same coalescing
+        rules as create_alert_with_job.
+        """
+        now = datetime.now().isoformat()
+        with self.db_manager.transaction() as conn:
+            results = [(alert, outcome, str(uuid.uuid4()) if outcome != alert_service.COALESCED else None)
+                       for alert, outcome in alert_service.create_alerts(alerts)]
+            conn.executemany("""
+                INSERT INTO fanout_jobs (id, alert_id, status, created_at, updated_at)
+                VALUES (?, ?, 'pending', ?, ?)
+            """, [(job_id, alert.id, now, now) for alert, _, job_id in results if job_id])
+        if any(job_id for _, _, job_id in results):
+            self._wake_worker()
+        return results
+
+    def enqueue(self, alert_id: str) -> str:
+        """Insert a pending fan-out job (joins the caller's transaction, if any)"""
+        job_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        self.db_manager.execute("""
+            INSERT INTO fanout_jobs (id, alert_id, status, created_at, updated_at)
+            VALUES (?, ?, 'pending', ?, ?)
+        """, (job_id, alert_id, now, now))
+        return job_id
+
+    def enqueue_reminders(self, reminders: List[tuple]) -> int:
+        """Queue reminder deliveries for [(alert, user_ids)]; returns the number of recipients.
+
+        Reminders skip expansion: each alert gets a running job of kind
+        ``reminder`` whose recipient rows carry severity priority and
+        partition like any fan-out, so they share its leases, retries and
+        dead-lettering (joins the caller's transaction, if any).
+        """
+        now = datetime.now().isoformat()
+        jobs = [(str(uuid.uuid4()), alert, user_ids) for alert, user_ids in reminders if user_ids]
+        with self.db_manager.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO fanout_jobs (id, alert_id, kind, status, total_recipients, created_at, updated_at)
+                VALUES (?, ?, 'reminder', 'running', ?, ?, ?)
+            """, [(job_id, alert.id, len(user_ids), now, now) for job_id, alert, user_ids in jobs])
+            partitions = self.partition_count(conn)
+            conn.executemany("""
+                INSERT INTO fanout_job_recipients
+                (job_id, alert_id, user_id, status, attempts, next_attempt_at, updated_at, priority, partition)
+                VALUES (?, ?, ?, 'pending', 0, ?, ?, ?, ?)
+            """, [(job_id, alert.id, user_id, now, now, alert.severity.rank, self.partition_of(user_id, partitions))
+                  for job_id, alert, user_ids in jobs for user_id in user_ids])
+        if jobs:
+            self._wake_worker()
+        return sum(len(user_ids) for _, _, user_ids in jobs)
+
+    def get_job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db_manager.fetchone("""
+            SELECT id, alert_id, status, total_recipients, sent_count, dead_count, retry_count,
+                   created_at, updated_at, completed_at
+            FROM fanout_jobs WHERE id = ?
+        """, (job_id,))
+        if not row:
+            return None
+
+        total, sent, dead = row[3], row[4], row[5]
+        finished = sent + dead
+        return {
+            'job_id': row[0],
+            'alert_id': row[1],
+            'status': row[2],
+            'total_recipients': total,
+            'sent': sent,
+            'dead_lettered': dead,
+            'pending': max(total - finished, 0),
+            'retries': row[6],
+            'progress_percent': round(finished / total * 100, 2) if total else (100.0 if row[2] != 'pending' else 0.0),
+            'created_at': row[7],
+            'updated_at': row[8],
+            'completed_at': row[9]
+        }
+
+    def claim_pending_jobs(self, limit: int = 10) -> List[str]:
+        """Lease up to ``limit`` jobs that still need their recipients expanded"""
+        token, now = str(uuid.uuid4()), datetime.now()
+        with self.db_manager.transaction() as conn:
+            conn.execute("""
+                UPDATE fanout_jobs SET lease_owner = ?, lease_expires_at = ?
+                WHERE id IN (
+                    SELECT id FROM fanout_jobs
+                    WHERE status = 'pending' AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+                    ORDER BY created_at LIMIT ?
+                )
+            """, (token, self._lease_deadline(now), now.isoformat(), limit))
+            return [row[0] for row in conn.execute(
+                "SELECT id FROM fanout_jobs WHERE lease_owner = ? AND status = 'pending'", (token,))]
+
+    def expand_job(self, job_id: str, alert_service, user_service, inbox_service=None) -> int:
+        """Resolve a job's audience into recipient rows and mark it running"""
+        return self.expand_jobs([job_id], alert_service, user_service, inbox_service)
+
+    def expand_jobs(self, job_ids: List[str], alert_service, user_service, inbox_service=None) -> int:
+        """Expand several jobs in one transaction; returns the number of recipient rows.
+
+        Alerts in the batch that share a visibility target resolve their
+        audience once.
+        """
+        # Pick up users created by other processes since the index loaded
+        user_service.audience.catch_up(self.db_manager)
+        audiences: Dict[tuple, List[str]] = {}
+        planned = []
+        for job_id in job_ids:
+            job = self.db_manager.fetchone("SELECT alert_id FROM fanout_jobs WHERE id = ?", (job_id,))
+            alert = alert_service.get_alert_by_id(job[0]) if job else None
+            user_ids = []
+            if alert:
+                target = (alert.visibility_type, alert.visibility_target)
+                if target not in audiences:
+                    audiences[target] = sorted(user_service.audience.resolve_alert(alert))
+                user_ids = audiences[target]
+            planned.append((job_id, alert, user_ids))
+
+        now = datetime.now().isoformat()
+        with self.db_manager.transaction() as conn:
+            partitions = self.partition_count(conn)
+            conn.executemany("""
+                INSERT OR IGNORE INTO fanout_job_recipients
+                (job_id, alert_id, user_id, status, attempts, next_attempt_at, updated_at, priority, partition)
+                VALUES (?, ?, ?, 'pending', 0, ?, ?, ?, ?)
+            """, [(job_id, alert.id, user_id, now, now, alert.severity.rank, self.partition_of(user_id, partitions))
+                  for job_id, alert, user_ids in planned for user_id in user_ids])
+            conn.executemany("""
+                UPDATE fanout_jobs SET status = ?, total_recipients = ?, lease_owner = NULL,
+                    lease_expires_at = NULL, updated_at = ?, completed_at = ?
+                WHERE id = ?
+            """, [('running' if user_ids else 'completed', len(user_ids), now,
+                   None if user_ids else now, job_id) for job_id, _, user_ids in planned])
+
+        if self.inbox_fanout and inbox_service is not None:
+            for _, alert, user_ids in planned:
+                if alert and user_ids:
+                    inbox_service.fan_out(alert, user_ids)
+        return sum(len(user_ids) for _, _, user_ids in planned)
+
+    def partition_count(self, conn) -> int:
+        """The fixed partition count, else the one stored by the last ``repartition``"""
+        if self.partitions:
+            return self.partitions
+        row = conn.execute("SELECT value FROM outbox_settings WHERE name = 'partitions'").fetchone()
+        return max(1, int(row[0])) if row else 1
+
+    @staticmethod
+    def partition_of(user_id: str, partitions: int) -> int:
+        return zlib.crc32(user_id.encode()) % partitions
+
+    def repartition(self) -> int:
+        """Store this service's partition count and reassign every pending recipient to it; returns rows moved"""
+        with self.db_manager.transaction() as conn:
+            partitions = self.partition_count(conn)
+            conn.execute("""
+                INSERT INTO outbox_settings (name, value) VALUES ('partitions', ?)
+                ON CONFLICT(name) DO UPDATE SET value = excluded.value
+            """, (partitions,))
+            moves = [(partition, rowid) for rowid, user_id, current in conn.execute(
+                         "SELECT rowid, user_id, partition FROM fanout_job_recipients WHERE status = 'pending'")
+                     if (partition := self.partition_of(user_id, partitions)) != current]
+            conn.executemany("UPDATE fanout_job_recipients SET partition = ? WHERE rowid = ?", moves)
+        return len(moves)
+
+    def claim_recipients(self, batch_size: int = 500, partition: Optional[int] = None) -> Dict[str, Any]:
+        """Lease a batch of due recipients, aged rows first and then by severity; returns the lease token and rows.
+
+        ``partition`` restricts the claim to one partition; None claims from all of them.
+        """
+        from models.alert import Severity
+        token, now = str(uuid.uuid4()), datetime.now()
+        aged = (now - timedelta(seconds=self.aging_seconds)).isoformat()
+        # (extra condition, params, due before): aged rows of any severity, then each severity in turn
+        passes = [("", (), aged)] + [("AND priority = ?", (severity.rank,), now.isoformat())
+                                     for severity in sorted(Severity, key=lambda s: -s.rank)]
+        if partition is not None:
+            passes = [("AND partition = ? " + condition, (partition, *params), due_before)
+                      for condition, params, due_before in passes]
+        with self.db_manager.transaction() as conn:
+            claimed = 0
+            for condition, params, due_before in passes:
+                claimed += conn.execute(f"""
+                    UPDATE fanout_job_recipients SET lease_owner = ?, lease_expires_at = ?
+                    WHERE rowid IN ({self.DUE_RECIPIENTS_SQL.format(condition=condition)})
+                """, (token, self._lease_deadline(now), *params, due_before, now.isoformat(),
+                      batch_size - claimed)).rowcount
+                if claimed >= batch_size:
+                    break
+            rows = conn.execute("""
+                SELECT job_id, alert_id, user_id, attempts FROM fanout_job_recipients
+                WHERE lease_owner = ? AND status = 'pending'
+            """, (token,)).fetchall()
+        return {'token': token, 'recipients': rows}
+
+    def reminder_jobs(self, job_ids) -> set:
+        """The subset of ``job_ids`` that deliver reminders rather than a new or escalated alert"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return set()
+        return {row[0] for row in self.db_manager.fetchall(
+            f"SELECT id FROM fanout_jobs WHERE kind = 'reminder' AND id IN ({', '.join('?' * len(job_ids))})",
+            job_ids)}
+
+    def get_queue_stats(self) -> Dict[str, Any]:
+        """Pending recipients and the oldest wait per severity"""
+        from models.alert import Severity
+        now = datetime.now()
+        stats = {severity.value: {'pending': 0, 'oldest_wait_seconds': 0.0} for severity in Severity}
+        for priority, pending, oldest in self.db_manager.fetchall("""
+                SELECT priority, COUNT(*), MIN(next_attempt_at) FROM fanout_job_recipients
+                WHERE status = 'pending' GROUP BY priority"""):
+            severity = next((s.value for s in Severity if s.rank == priority), str(priority))
+            stats[severity] = {
+                'pending': pending,
+                'oldest_wait_seconds': round(max(0.0, (now - datetime.fromisoformat(oldest)).total_seconds()), 3)
+            }
+        return stats
+
+    def complete_recipients(self, token: str, outcomes: Dict[tuple, bool],
+                            attempts: Dict[tuple, int], skipped=()) -> Dict[str, List[tuple]]:
+        """Record delivery outcomes for a leased batch keyed by (job_id, user_id).
+
+        ``skipped`` keys were not delivered on purpose (the user acknowledged
+        the alert before its reminder went out); they are closed and no
+        longer count towards their job. Returns the (job_id, user_id) keys
+        that were sent and those that were dead-lettered; the rest will be
+        retried.
+        """
+        now = datetime.now()
+        sent, retry, dead = [], [], []
+        per_job = defaultdict(lambda: [0, 0, 0, 0])  # sent, dead, retried, skipped
+        for job_id, user_id in skipped:
+            per_job[job_id][3] += 1
+
+        for (job_id, user_id), success in outcomes.items():
+            if success:
+                sent.append((now.isoformat(), job_id, user_id, token))
+                per_job[job_id][0] += 1
+                continue
+            attempt = attempts[(job_id, user_id)] + 1
+            if attempt >= self.max_attempts:
+                dead.append((attempt, now.isoformat(), job_id, user_id, token))
+                per_job[job_id][1] += 1
+            else:
+                retry.append((attempt, self._next_attempt(now, attempt), now.isoformat(),
+                              job_id, user_id, token))
+                per_job[job_id][2] += 1
+
+        with self.db_manager.transaction() as conn:
+            conn.executemany("""
+                UPDATE fanout_job_recipients SET status = 'sent', lease_owner = NULL,
+                    lease_expires_at = NULL, last_error = NULL, updated_at = ?
+                WHERE job_id = ? AND user_id = ? AND lease_owner = ?
+            """, sent)
+            conn.executemany("""
+                UPDATE fanout_job_recipients SET status = 'dead', attempts = ?, lease_owner = NULL,
+                    lease_expires_at = NULL, last_error = 'delivery failed', updated_at = ?
+                WHERE job_id = ? AND user_id = ? AND lease_owner = ?
+            """, dead)
+            conn.executemany("""
+                UPDATE fanout_job_recipients SET attempts = ?, next_attempt_at = ?, lease_owner = NULL,
+                    lease_expires_at = NULL, last_error = 'delivery failed', updated_at = ?
+                WHERE job_id = ? AND user_id = ? AND lease_owner = ?
+            """, retry)
+            conn.executemany("""
+                UPDATE fanout_job_recipients SET status = 'skipped', lease_owner = NULL,
+                    lease_expires_at = NULL, updated_at = ?
+                WHERE job_id = ? AND user_id = ? AND lease_owner = ?
+            """, [(now.isoformat(), job_id, user_id, token) for job_id, user_id in skipped])
+            for job_id, (n_sent, n_dead, n_retried, n_skipped) in per_job.items():
+                conn.execute("""
+                    UPDATE fanout_jobs SET sent_count = sent_count + ?, dead_count = dead_count + ?,
+                        retry_count = retry_count + ?, total_recipients = total_recipients - ?, updated_at = ?
+                    WHERE id = ?
+                """, (n_sent, n_dead, n_retried, n_skipped, now.isoformat(), job_id))
+                conn.execute("""
+                    UPDATE fanout_jobs SET completed_at = ?,
+                        status = CASE WHEN dead_count > 0 THEN 'completed_with_errors' ELSE 'completed' END
+                    WHERE id = ? AND status = 'running' AND sent_count + dead_count >= total_recipients
+                """, (now.isoformat(), job_id))
+
+        if dead:
+            self.logger.warning(f"{len(dead)} recipients moved to dead letter after {self.max_attempts} attempts")
+        return {'sent': [(job_id, user_id) for _, job_id, user_id, _ in sent],
+                'dead': [(job_id, user_id) for _, _, job_id, user_id, _ in dead]}
+
+    def _next_attempt(self, now: datetime, attempt: int) -> str:
+        """Exponential backoff with jitter for the given attempt number"""
+        delay = min(self.base_backoff_seconds * (2 ** (attempt - 1)), self.max_backoff_seconds)
+        delay *= random.uniform(0.8, 1.2)
+        return (now + timedelta(seconds=delay)).isoformat()
+
+    def _lease_deadline(self, now: datetime) -> str:
+        return (now + timedelta(seconds=self.lease_seconds)).isoformat()
+
+    def _wake_worker(self):
+        worker = StateManager.peek(self.db_manager, "outbox_worker")
+        if worker is not None:
+            worker.wake()
@@ -1,12 +1,15 @@
 import sqlite3, uuid
 from models.team import Team
+from services.audience_index import AudienceIndex
 
 class TeamService:
     def __init__(self, db):
         self.db = db
+        self.audience = AudienceIndex.for_db(db)
 
     def create_team(self, data):
         t = Team(id=str(uuid.uuid4()), name=data["name"], organization_id=data["organization_id"])
         self.db.execute("INSERT INTO teams VALUES(?,?,?,?)",
                         (t.id, t.name, t.organization_id, t.created_at.isoformat()))
+        self.audience.add_team(t.id, t.organization_id)
         return t
@@ -0,0 +1,180 @@
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.state_manager import StateManager
+
+class _Ring:
+    """Fixed-width ring of buckets for one resolution.
+
+    ``stamps[i]`` holds the absolute bucket number stored in slot ``i`` so
+    a slot left over from an earlier lap reads as empty instead of being
+    cleared eagerly.
+    """
+
+    __slots__ = ('resolution', 'size', 'stamps', 'sums', 'counts')
+
+    def __init__(self, resolution: int, size: int):
+        self.resolution = resolution
+        self.size = size
+        self.stamps = array('q', [-1]) * size
+        self.sums = array('d', [0.0]) * size
+        self.counts = array('q', [0]) * size
+
+    def add(self, bucket: int, value: float, count: int):
+        slot = bucket % self.size
+        if self.stamps[slot] != bucket:
+            self.stamps[slot], self.sums[slot], self.counts[slot] = bucket, 0.0, 0
+        self.sums[slot] += value
+        self.counts[slot] += count
+
+    def window(self, first: int, last: int) -> Tuple[List[float], List[int]]:
+        """Return (sums, counts) for buckets first..last inclusive, zeros where empty"""
+        sums, counts = [], []
+        bucket = first
+        while bucket <= last:
+            slot = bucket % self.size
+            take = min(self.size - slot, last - bucket + 1)
+            live = [stamp == expected for stamp, expected in
+                    zip(self.stamps[slot:slot + take], range(bucket, bucket + take))]
+            sums.extend(v if ok else 0.0 for v, ok in zip(self.sums[slot:slot + take], live))
+            counts.extend(c if ok else 0 for c, ok in zip(self.counts[slot:slot + take], live))
+            bucket += take
+        return sums, counts
+
+class TimeSeriesStore:
+    """In-memory, time-bucketed delivery metrics.
+
+    Every sample is added to minute, hour and day rings at once, so coarse
+    tiers are always the exact rollup of the fine one while each tier keeps
+    its own retention. Series are keyed by metric plus an optional
+    ``channel`` or ``severity`` dimension. Range queries pick the finest
+    tier that covers the range and sum fixed-width array slices per step.
+
+    ``start_capture`` also keeps every recorded sample until
+    ``drain_captured`` takes it, so a delivery worker process can hand its
+    samples to the API's store (see ``utils.metrics_relay``).
+    """
+
+    # (resolution seconds, retained buckets)
+    TIERS = ((60, 24 * 60), (3600, 30 * 24), (86400, 365))
+
+    COUNTERS = ('deliveries.sent', 'deliveries.failed')
+    AVERAGES = ('read_latency_seconds',)
+    DERIVED = {'deliveries.failure_rate': ('deliveries.failed', 'deliveries.sent')}
+    DIMENSIONS = ('channel', 'severity')
+    MAX_POINTS = 5000
+
+    def __init__(self, tiers=None):
+        self.tiers = tiers or self.TIERS
+        self._series: Dict[Tuple[str, str, str], List[_Ring]] = {}
+        self._captured: Optional[List[tuple]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_db(cls, db_manager) -> "TimeSeriesStore":
+        """Return the store shared by every service using this database"""
+        return StateManager.get(db_manager, 'timeseries', cls)
+
+    def record(self, metric: str, value: float = 1.0, count: int = 1, at: Optional[float] = None,
+               channel: Optional[str] = None, severity: Optional[str] = None):
+        """Add a sample to the metric's total series and its dimension series"""
+        at = time.time() if at is None else at
+        keys = [(metric, '', '')]
+        if channel:
+            keys.append((metric, 'channel', channel))
+        if severity:
+            keys.append((metric, 'severity', severity))
+
+        with self._lock:
+            if self._captured is not None:
+                self._captured.append((metric, value, count, at, channel, severity))
+            for key in keys:
+                rings = self._series.get(key)
+                if rings is None:
+                    rings = self._series[key] = [_Ring(res, size) for res, size in self.tiers]
+                for ring in rings:
+                    ring.add(int(at // ring.resolution), value, count)
+
+    def start_capture(self):
+        with self._lock:
+            if self._captured is None:
+                self._captured = []
+
+    def drain_captured(self) -> List[tuple]:
+        """Samples recorded since the last drain as (metric, value, count, at, channel, severity)"""
+        with self._lock:
+            if not self._captured:
+                return []
+            captured, self._captured = self._captured, []
+        return captured
+
+    def query(self, metric: str, start: float, end: float, step: Optional[int] = None,
+              channel: Optional[str] = None, severity: Optional[str] = None) -> Dict[str, Any]:
+        """Aggregate a metric over [start, end] in ``step``-second points"""
+        if metric not in self.COUNTERS + self.AVERAGES and metric not in self.DERIVED:
+            raise ValueError(f"Unknown metric: {metric}")
+        if end <= start:
+            raise ValueError("'to' must be after 'from'")
+
+        dimension, value = ('channel', channel) if channel else ('severity', severity) if severity else ('', '')
+        ring_index = self._pick_tier(start, end, step)
+        resolution = self.tiers[ring_index][0]
+        step = max(resolution, (int(step or resolution) // resolution) * resolution)
+        per_point = step // resolution
+        first, last = int(start // step) * per_point, int(end // resolution)
+        if (last - first) // per_point >= self.MAX_POINTS:
+            raise ValueError(f"Range too large for step {step}s (max {self.MAX_POINTS} points)")
+
+        if metric in self.DERIVED:
+            failed_key, sent_key = self.DERIVED[metric]
+            failed = self._points(failed_key, dimension, value, ring_index, first, last, per_point)
+            sent = self._points(sent_key, dimension, value, ring_index, first, last, per_point)
+            values = [round(f / (f + s) * 100, 2) if f + s else 0.0
+                      for (f, _), (s, _) in zip(failed, sent)]
+        else:
+            points = self._points(metric, dimension, value, ring_index, first, last, per_point)
+            if metric in self.AVERAGES:
+                values = [round(total / n, 3) if n else None for total, n in points]
+            else:
+                values = [total for total, _ in points]
+
+        return {
+            'metric': metric,
+            'dimension': {dimension: value} if dimension else None,
+            'resolution': resolution,
+            'step': step,
+            'points': [{'t': datetime.fromtimestamp((first + i * per_point) * resolution).isoformat(),
+                        'value': v} for i, v in enumerate(values)]
+        }
+
+    def _pick_tier(self, start: float, end: float, step: Optional[int]) -> int:
+        """Finest tier that still retains ``start`` and is not finer than needed"""
+        now = time.time()
+        retaining = [i for i, (res, size) in enumerate(self.tiers)
+                     if now - start <= res * size] or [len(self.tiers) - 1]
+        candidates = [i for i in retaining if step is None or self.tiers[i][0] <= step]
+        if not candidates:
+            return retaining[0]
+        if step is None:
+            return candidates[0]
+        # Prefer the coarsest resolution that evenly divides the step
+        dividing = [i for i in candidates if step % self.tiers[i][0] == 0]
+        return dividing[-1] if dividing else candidates[0]
+
+    def _points(self, metric, dimension, value, ring_index, first, last, per_point):
+        with self._lock:
+            rings = self._series.get((metric, dimension, value))
+            if rings is None:
+                sums, counts = [0.0] * (last - first + 1), [0] * (last - first + 1)
+            else:
+                sums, counts = rings[ring_index].window(first, last)
+        return [(sum(sums[i:i + per_point]), sum(counts[i:i + per_point]))
+                for i in range(0, len(sums), per_point)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'series': len(self._series),
+                    'buckets_per_series': sum(size for _, size in self.tiers)}
@@ -1,8 +1,30 @@
 import uuid, sqlite3
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta
 from models.user_alert_preference import UserAlertPreference, UserAlertState
+from utils.state_manager import StateManager
+from services.analytics_service import record_state_changes
+
+# uuid4-formatted id generated inside SQLite for rows created by set-based upserts
+_UUID_SQL = """lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' ||
+               substr(lower(hex(randomblob(2))), 2) || '-' ||
+               substr('89ab', 1 + abs(random()) % 4, 1) || substr(lower(hex(randomblob(2))), 2) || '-' ||
+               lower(hex(randomblob(6)))"""
 
 class UserAlertPreferenceService:
+    # Upper bound on due (user, alert) rows handled per scheduler wake-up
+    REMINDER_BATCH_LIMIT = 10000
+    # Stays well below SQLite's bound-parameter limit
+    ID_CHUNK_SIZE = 500
+    # Preferences of one user or alert for a chunk of the other ids
+    SELECT_BULK_SQL = "SELECT * FROM user_alert_preferences WHERE {fixed_col}=? AND {key_col} IN ({marks})"
+    # Unread or no-longer-snoozed preferences whose next reminder is due
+    DUE_REMINDERS_SQL = """SELECT alert_id, user_id FROM user_alert_preferences
+                           WHERE next_reminder_at IS NOT NULL AND next_reminder_at <= ?
+                           AND (state = 'unread' OR (state = 'snoozed'
+                                AND COALESCE(snoozed_until, '') <= ?))
+                           ORDER BY next_reminder_at LIMIT ?"""
+
     def __init__(self, db):
         self.db = db
 
@@ -16,32 +38,269 @@ class UserAlertPreferenceService:
         self._save(pref)
         return pref
 
+    def get_or_create_many(self, uid, aids):
+        """Return {alert_id: preference} for one user, creating missing rows in bulk"""
+        return self._get_or_create_bulk("user_id", uid, "alert_id", aids)
+
+    def get_for_alert(self, aid, uids):
+        """Return {user_id: preference} for one alert, creating missing rows in bulk"""
+        return self._get_or_create_bulk("alert_id", aid, "user_id", uids)
+
+    def _get_or_create_bulk(self, fixed_col, fixed_val, key_col, keys):
+        keys = list(dict.fromkeys(keys))
+        found = self._select_bulk(fixed_col, fixed_val, key_col, keys)
+        missing = [k for k in keys if k not in found]
+        if missing:
+            created = {}
+            for k in missing:
+                ids = {fixed_col: fixed_val, key_col: k}
+                created[k] = UserAlertPreference(id=str(uuid.uuid4()), user_id=ids["user_id"],
+                                                 alert_id=ids["alert_id"], state=UserAlertState.UNREAD)
+            inserted = self.db.executemany("""INSERT OR IGNORE INTO user_alert_preferences
+                                              (id, user_id, alert_id, state, created_at, updated_at)
+                                              VALUES(?,?,?,?,?,?)""",
+                                           [(p.id, p.user_id, p.alert_id, p.state.value,
+                                             p.created_at.isoformat(), p.updated_at.isoformat())
+                                            for p in created.values()])
+            if inserted < len(missing):
+                # Lost a race with a concurrent insert; read back the winners
+                created.update(self._select_bulk(fixed_col, fixed_val, key_col, missing))
+            found.update(created)
+        return found
+
+    def _select_bulk(self, fixed_col, fixed_val, key_col, keys):
+        key_index = 1 if key_col == "user_id" else 2
+        found = {}
+        for i in range(0, len(keys), self.ID_CHUNK_SIZE):
+            chunk = keys[i:i + self.ID_CHUNK_SIZE]
+            marks = ",".join("?" * len(chunk))
+            for r in self.db.fetchall(self.SELECT_BULK_SQL.format(fixed_col=fixed_col, key_col=key_col,
+                                                                  marks=marks), [fixed_val, *chunk]):
+                found[r[key_index]] = self._row_to_model(r)
+        return found
+
     def mark_read(self, uid, aid):
         p = self.get_or_create(uid, aid)
+        was_read = p.state == UserAlertState.READ
         p.mark_as_read()
         self._save(p, update=True)
+        self._rearm([(uid, aid)], None)
+        if not was_read:
+            self._record_read_latency(p)
         return True
 
     def snooze(self, uid, aid):
         p = self.get_or_create(uid, aid)
         p.snooze_for_day()
         self._save(p, update=True)
+        self._rearm([(uid, aid)], p.next_reminder_at)
         return True
 
+    def mark_read_many(self, uid, aids):
+        """Mark a user's alerts read in one transaction; returns the number of rows changed.
+
+        Missing preference rows are created by the upsert, rows that are
+        already read are left alone and unknown alert ids are ignored.
+        """
+        now = datetime.now()
+        changed, moved = self._set_state_many(uid, aids, UserAlertState.READ, """
+            state='read', read_at=excluded.read_at, next_reminder_at=NULL,
+            updated_at=excluded.updated_at
+            WHERE state != 'read'""", read_at=now.isoformat(), now=now)
+        self._rearm([(uid, aid) for aid, _ in moved], None)
+        self._record_read_latencies([(aid, created_at, now) for aid, created_at in moved])
+        return changed
+
+    def snooze_many(self, uid, aids):
+        """Snooze a user's alerts until tomorrow in one transaction; returns the number of rows changed"""
+        now = datetime.now()
+        until = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        changed, moved = self._set_state_many(uid, aids, UserAlertState.SNOOZED, """
+            state='snoozed', snoozed_until=excluded.snoozed_until,
+            next_reminder_at=excluded.next_reminder_at, updated_at=excluded.updated_at
+            WHERE state != 'snoozed' OR snoozed_until IS NOT excluded.snoozed_until""",
+            snoozed_until=until.isoformat(), now=now)
+        self._rearm([(uid, aid) for aid, _ in moved], until)
+        return changed
+
+    def _set_state_many(self, uid, aids, state, update_sql, now, read_at=None, snoozed_until=None):
+        """Upsert one state for a user's existing alerts; returns (rows changed, [(alert_id, created_at)])"""
+        aids = list(dict.fromkeys(aids))
+        stamp = now.isoformat()
+        changed, moved, transitions = 0, [], []
+        with self.db.transaction() as conn:
+            for i in range(0, len(aids), self.ID_CHUNK_SIZE):
+                chunk = aids[i:i + self.ID_CHUNK_SIZE]
+                marks = ",".join("?" * len(chunk))
+                # Stored states are read under the write lock so rollups move exactly once
+                for aid, old, created_at, snoozed in conn.execute(f"""
+                        SELECT a.id, p.state, p.created_at, p.snoozed_until FROM alerts a
+                        LEFT JOIN user_alert_preferences p ON p.alert_id = a.id AND p.user_id = ?
+                        WHERE a.id IN ({marks})""", [uid, *chunk]):
+                    if old != state.value or (snoozed_until and snoozed != snoozed_until):
+                        transitions.append((aid, old, state.value))
+                        moved.append((aid, datetime.fromisoformat(created_at) if created_at else now))
+                changed += conn.execute(f"""
+                    INSERT INTO user_alert_preferences
+                        (id, user_id, alert_id, state, snoozed_until, read_at, next_reminder_at,
+                         created_at, updated_at)
+                    SELECT {_UUID_SQL}, ?, id, ?, ?, ?, ?, ?, ? FROM alerts WHERE id IN ({marks})
+                    ON CONFLICT(user_id, alert_id) DO UPDATE SET {update_sql}""",
+                    [uid, state.value, snoozed_until, read_at, snoozed_until, stamp, stamp,
+                     *chunk]).rowcount
+                # Keep the fan-out inbox copy of the state current
+                conn.execute(f"UPDATE user_inbox SET state=? WHERE user_id=? AND alert_id IN ({marks})",
+                             [state.value, uid, *chunk])
+            record_state_changes(conn, transitions)
+        return changed, moved
+
+    def record_reminders(self, alert, uids, at=None, delivered=True):
+        """Mark users as reminded of an alert and schedule their next reminder.
+
+        Called by the outbox worker once the initial delivery or a reminder
+        has gone out; rows are created for users that have no preference
+        yet. With ``delivered=False`` (dead-lettered) only the next reminder
+        is scheduled. Rows the user has read, or snoozed past ``at``, are left
+        alone, so a reminder that was in flight when the user acknowledged
+        the alert does not re-arm it. Returns the next reminder time, or None
+        when the alert expires first.
+        """
+        at = at or datetime.now()
+        due = at + timedelta(hours=alert.reminder_frequency_hours)
+        if not alert.reminders_enabled or due > alert.expiry_time:
+            due = None
+        now, due_iso = at.isoformat(), due.isoformat() if due else None
+        reminded = now if delivered else None
+        self.db.executemany("""INSERT INTO user_alert_preferences
+                               (id, user_id, alert_id, state, last_reminded_at, next_reminder_at,
+                                created_at, updated_at)
+                               VALUES(?,?,?,?,?,?,?,?)
+                               ON CONFLICT(user_id, alert_id) DO UPDATE SET
+                                   last_reminded_at=COALESCE(excluded.last_reminded_at, last_reminded_at),
+                                   next_reminder_at=excluded.next_reminder_at
+                               WHERE user_alert_preferences.state = 'unread'
+                                  OR (user_alert_preferences.state = 'snoozed'
+                                      AND COALESCE(user_alert_preferences.snoozed_until, '') <= excluded.updated_at)""",
+                            [(str(uuid.uuid4()), uid, alert.id, UserAlertState.UNREAD.value,
+                              reminded, due_iso, now, now) for uid in uids])
+        self._rearm([(uid, alert.id) for uid in uids], due)
+        return due
+
+    def hold_reminders(self, reminders):
+        """Clear next_reminder_at for [(alert, user_ids)] while their reminder is queued for delivery"""
+        self.db.executemany("""UPDATE user_alert_preferences SET next_reminder_at=NULL
+                               WHERE user_id=? AND alert_id=?""",
+                            [(uid, alert.id) for alert, uids in reminders for uid in uids])
+
+    def awaiting_reminder(self, aid, uids, now=None):
+        """Return the users in ``uids`` who still want reminders of an alert: unread, or snoozed until before now"""
+        now = (now or datetime.now()).isoformat()
+        uids = list(dict.fromkeys(uids))
+        done = set()
+        for i in range(0, len(uids), self.ID_CHUNK_SIZE):
+            chunk = uids[i:i + self.ID_CHUNK_SIZE]
+            done.update(uid for (uid,) in self.db.fetchall(f"""
+                SELECT user_id FROM user_alert_preferences
+                WHERE alert_id=? AND user_id IN ({','.join('?' * len(chunk))})
+                AND (state = 'read' OR (state = 'snoozed' AND snoozed_until > ?))""", [aid, *chunk, now]))
+        return {uid for uid in uids if uid not in done}
+
+    def get_alerts_needing_reminder(self, now=None):
+        """Return [(alert, users)] for every unread or no-longer-snoozed preference whose next reminder is due.
+
+        Reads the indexed next_reminder_at column instead of evaluating every
+        preference. Alerts that are no longer active have their pending
+        reminders cleared; alerts that have not started yet are deferred to
+        their start time.
+        """
+        from services.alert_service import AlertService
+        from services.user_service import UserService
+
+        now = now or datetime.now()
+        due = defaultdict(list)
+        for aid, uid in self.db.fetchall(self.DUE_REMINDERS_SQL,
+                                         (now.isoformat(), now.isoformat(), self.REMINDER_BATCH_LIMIT)):
+            due[aid].append(uid)
+
+        alert_srv, user_srv = AlertService(self.db), UserService(self.db)
+        result = []
+        for aid, uids in due.items():
+            alert = alert_srv.get_alert_by_id(aid)
+            if alert and alert.reminders_enabled and alert.is_active():
+                result.append((alert, user_srv.get_users_by_ids(uids)))
+            elif alert and alert.reminders_enabled and alert.status.value == "active" \
+                    and alert.start_time > now:
+                self._set_next_reminder(aid, uids, alert.start_time)
+            else:
+                self.clear_reminders(aid)
+        return result
+
+    def clear_reminders(self, aid):
+        """Cancel every pending reminder for an alert (expired, archived or disabled)"""
+        self.db.execute("""UPDATE user_alert_preferences SET next_reminder_at=NULL
+                           WHERE alert_id=? AND next_reminder_at IS NOT NULL""", (aid,))
+
+    def rearm_alert(self, alert):
+        """Re-evaluate pending reminders after an alert's window or status changed"""
+        if not alert.reminders_enabled or alert.status.value != "active" \
+                or alert.expiry_time <= datetime.now():
+            self.clear_reminders(alert.id)
+
+    def _set_next_reminder(self, aid, uids, due):
+        self.db.executemany(
+            "UPDATE user_alert_preferences SET next_reminder_at=? WHERE user_id=? AND alert_id=?",
+            [(due.isoformat(), uid, aid) for uid in uids])
+        self._rearm([(uid, aid) for uid in uids], due)
+
+    def _record_read_latency(self, p):
+        self._record_read_latencies([(p.alert_id, p.created_at, p.read_at)])
+
+    def _record_read_latencies(self, reads):
+        """Time from the preference row being created (first delivery) to the read, per (alert_id, created_at, read_at)"""
+        from services.timeseries_store import TimeSeriesStore
+        if not reads:
+            return
+        aids = list({aid for aid, _, _ in reads})
+        severities = {}
+        for i in range(0, len(aids), self.ID_CHUNK_SIZE):
+            chunk = aids[i:i + self.ID_CHUNK_SIZE]
+            severities.update(self.db.fetchall(
+                f"SELECT id, severity FROM alerts WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+        store = TimeSeriesStore.for_db(self.db)
+        for aid, created_at, read_at in reads:
+            store.record("read_latency_seconds", (read_at - created_at).total_seconds(),
+                         at=read_at.timestamp(), severity=severities.get(aid))
+
+    def _rearm(self, keys, due):
+        """Tell the in-process reminder scheduler, if one is running, about a new due time"""
+        scheduler = StateManager.peek(self.db, "reminder_scheduler")
+        if scheduler is not None:
+            scheduler.arm_many(keys, due)
+
     def _save(self, p, update=False):
         if update:
-            self.db.execute("""UPDATE user_alert_preferences
-                               SET state=?, snoozed_until=?, read_at=?, updated_at=?
-                               WHERE id=?""",
-                            (p.state.value,
-                             p.snoozed_until.isoformat() if p.snoozed_until else None,
-                             p.read_at.isoformat() if p.read_at else None,
-                             p.updated_at.isoformat(), p.id))
+            with self.db.transaction() as conn:
+                # Read the stored state under the write lock so rollups move exactly once
+                old = self.db.scalar("SELECT state FROM user_alert_preferences WHERE id=?", (p.id,))
+                self.db.execute("""UPDATE user_alert_preferences
+                                   SET state=?, snoozed_until=?, read_at=?, next_reminder_at=?,
+                                       updated_at=?
+                                   WHERE id=?""",
+                                (p.state.value,
+                                 p.snoozed_until.isoformat() if p.snoozed_until else None,
+                                 p.read_at.isoformat() if p.read_at else None,
+                                 p.next_reminder_at.isoformat() if p.next_reminder_at else None,
+                                 p.updated_at.isoformat(), p.id))
+                # Keep the fan-out inbox copy of the state current
+                self.db.execute("UPDATE user_inbox SET state=? WHERE user_id=? AND alert_id=?",
+                                (p.state.value, p.user_id, p.alert_id))
+                record_state_changes(conn, [(p.alert_id, old, p.state.value)])
         else:
             self.db.execute("""INSERT INTO user_alert_preferences
-                               VALUES(?,?,?,?,?,?,?,?,?)""",
-                            (p.id, p.user_id, p.alert_id, p.state.value, None, None,
-                             None, p.created_at.isoformat(), p.updated_at.isoformat()))
+                               (id, user_id, alert_id, state, created_at, updated_at)
+                               VALUES(?,?,?,?,?,?)""",
+                            (p.id, p.user_id, p.alert_id, p.state.value,
+                             p.created_at.isoformat(), p.updated_at.isoformat()))
 
     def _row_to_model(self, r):
         from datetime import datetime as dt
@@ -51,6 +310,7 @@ class UserAlertPreferenceService:
             snoozed_until=dt.fromisoformat(r[4]) if r[4] else None,
             last_reminded_at=dt.fromisoformat(r[5]) if r[5] else None,
             read_at=dt.fromisoformat(r[6]) if r[6] else None,
+            next_reminder_at=dt.fromisoformat(r[9]) if len(r) > 9 and r[9] else None,
             created_at=dt.fromisoformat(r[7]),
             updated_at=dt.fromisoformat(r[8])
         )
@@ -1,9 +1,14 @@
 import sqlite3, uuid
 from models.user import User
+from services.audience_index import AudienceIndex
 
 class UserService:
+    # Stays well below SQLite's bound-parameter limit
+    ID_CHUNK_SIZE = 500
+
     def __init__(self, db):
         self.db = db
+        self.audience = AudienceIndex.for_db(db)
 
     def create_user(self, data):
         user = User(
@@ -15,16 +20,40 @@ class UserService:
             is_admin=data.get("is_admin", False)
         )
         self._save(user)
+        self.audience.add_user(user.id, user.team_id, user.organization_id)
         return user
 
     def get_user_by_id(self, uid):
         row = self.db.fetchone("SELECT * FROM users WHERE id=?", (uid,))
         return self._row_to_model(row) if row else None
 
+    def get_users_by_ids(self, uids):
+        uids = list(uids)
+        users = []
+        for i in range(0, len(uids), self.ID_CHUNK_SIZE):
+            chunk = uids[i:i + self.ID_CHUNK_SIZE]
+            marks = ",".join("?" * len(chunk))
+            users.extend(self._row_to_model(r)
+                         for r in self.db.fetchall(f"SELECT * FROM users WHERE id IN ({marks})", chunk))
+        return users
+
     def get_users_for_team(self, tid):
         return [self._row_to_model(r)
                 for r in self.db.fetchall("SELECT * FROM users WHERE team_id=?", (tid,))]
 
+    def get_users_for_alert(self, alert):
+        """Resolve the alert's organization, team or user target to User objects"""
+        return self.get_users_by_ids(self.audience.resolve_alert(alert))
+
+    def get_visible_alerts(self, uid, alerts):
+        """Filter alerts down to those whose visibility target includes the user"""
+        if not self.audience.has_user(uid):
+            # The user may have been created by another process since the index loaded
+            row = self.db.fetchone("SELECT id, team_id, organization_id FROM users WHERE id=?", (uid,))
+            if row:
+                self.audience.add_user(*row)
+        return self.audience.filter_visible(uid, alerts)
+
     def _save(self, u):
         self.db.execute(
             "INSERT INTO users VALUES(?,?,?,?,?,?,?)",
@@ -0,0 +1,63 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# Run from anywhere: the packages live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database_manager import DatabaseManager
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "alerts.db"))
+
+@pytest.fixture
+def platform(db):
+    """Seeded database with an admin controller, notification service and outbox worker"""
+    from controllers.admin_controller import AdminController
+    from database.seed_data import seed
+    from services.notification_service import NotificationService
+    from services.user_service import UserService
+    from utils.outbox_worker import OutboxWorker
+
+    seeded = seed(db)
+    users = UserService(db)
+    team_id = seeded["admin"].team_id
+    members = [users.create_user({"name": f"User {i}", "email": f"user{i}@org.com",
+                                  "team_id": team_id, "organization_id": seeded["org"]}) for i in range(3)]
+    notifier = NotificationService(db)
+    admin = AdminController(db, notifier)
+    worker = OutboxWorker(db, notifier, admin.outbox_service)
+    platform = type("Platform", (), {})()
+    platform.db, platform.admin, platform.notifier, platform.worker = db, admin, notifier, worker
+    platform.org, platform.team_id, platform.users = seeded["org"], team_id, [seeded["admin"], *members]
+    yield platform
+    notifier.shutdown()
+
+def alert_data(**overrides):
+    now = datetime.now()
+    data = {"title": "Disk almost full", "message": "db-1 is at 95%", "severity": "warning",
+            "delivery_type": "in_app", "visibility_type": "organization", "visibility_target": "org_001",
+            "start_time": (now - timedelta(minutes=1)).isoformat(),
+            "expiry_time": (now + timedelta(days=1)).isoformat(), "created_by": "admin"}
+    data.update(overrides)
+    return data
+
+class FailingChannel:
+    """Channel whose every send fails"""
+
+    def __init__(self, channel_type):
+        self.channel_type = channel_type
+
+    def get_channel_type(self):
+        return self.channel_type
+
+    def send_batch(self, users, alert):
+        return {}
+
+def drain(worker):
+    """Run the outbox worker until it finds no more work"""
+    while worker.run_once():
+        pass
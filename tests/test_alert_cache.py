@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import alert_data
+from services.alert_service import AlertService
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def alert(platform):
+    return platform.admin.create_alert(alert_data())["data"]["alert"]
+
+def test_write_is_visible_after_commit(platform, alert):
+    service = AlertService(platform.db)
+    assert service.get_alert_by_id(alert["id"]).title == "Disk almost full"
+
+    service.update_alert(alert["id"], {"title": "Disk full"})
+
+    assert service.get_alert_by_id(alert["id"]).title == "Disk full"
+    assert [a.title for a in service.get_active_alerts()] == ["Disk full"]
+
+def test_rollback_drops_uncommitted_reads_and_keeps_generation(platform, alert, monkeypatch):
+    service = AlertService(platform.db)
+    service.get_active_alerts()
+    generation = service.cache.generation
+
+    with pytest.raises(RuntimeError):
+        with platform.db.transaction() as conn:
+            conn.execute("UPDATE alerts SET title = 'Uncommitted' WHERE id = ?", (alert["id"],))
+            service.cache.bump(conn)
+            # The writing thread reads its own uncommitted row into the cache
+            assert service.get_alert_by_id(alert["id"]).title == "Uncommitted"
+            raise RuntimeError("abort")
+
+    assert service.get_alert_by_id(alert["id"]).title == "Disk almost full"
+    assert service.cache.generation == generation
+    # The generation that never committed is not waited for: within check_interval
+    # reads are served without asking the database again
+    service.cache.check_interval = 60.0
+    checks = []
+    monkeypatch.setattr(platform.db, "scalar", lambda *args: checks.append(args))
+    service.get_active_alerts()
+    service.get_active_alerts()
+    assert checks == []
+
+def test_after_commit_callbacks_run_once_for_nested_transactions(db):
+    events = []
+    with db.transaction():
+        with db.transaction():
+            db.after_commit(lambda: events.append("committed"), lambda: events.append("rolled back"))
+        assert events == []
+    assert events == ["committed"]
+
+    with pytest.raises(ValueError):
+        with db.transaction():
+            db.after_commit(lambda: events.append("committed"), lambda: events.append("rolled back"))
+            raise ValueError
+    assert events == ["committed", "rolled back"]
+
+    db.after_commit(lambda: events.append("outside"))
+    assert events[-1] == "outside"
+
+def test_write_from_another_process_invalidates_the_cache(platform, alert):
+    service = AlertService(platform.db)
+    service.cache.check_interval = 0.0
+    assert service.get_alert_by_id(alert["id"]).title == "Disk almost full"
+    assert [a.title for a in service.get_active_alerts()] == ["Disk almost full"]
+
+    subprocess.run([sys.executable, "-c", (
+        "import sys; from database.database_manager import DatabaseManager; "
+        "from services.alert_service import AlertService; "
+        "AlertService(DatabaseManager(sys.argv[1])).update_alert(sys.argv[2], {'title': 'Disk full'})"),
+        platform.db.db_path, alert["id"]], cwd=ROOT, check=True)
+
+    assert service.get_alert_by_id(alert["id"]).title == "Disk full"
+    assert [a.title for a in service.get_active_alerts()] == ["Disk full"]
+    assert service.cache.get_stats()["generation_changes"] >= 1
@@ -0,0 +1,24 @@
+import pytest
+
+from conftest import alert_data
+
+@pytest.mark.parametrize("value, expected", [(False, False), ("false", False), ("0", False), (0, False),
+                                             (True, True), ("True", True), ("yes", True), (1, True)])
+def test_reminders_enabled_accepts_boolean_spellings(platform, value, expected):
+    created = platform.admin.create_alert(alert_data(reminders_enabled=value))
+    assert created["status_code"] == 202
+    assert created["data"]["alert"]["reminders_enabled"] is expected
+
+    updated = platform.admin.update_alert(created["data"]["alert"]["id"], {"reminders_enabled": not expected})
+    assert updated["data"]["reminders_enabled"] is (not expected)
+    updated = platform.admin.update_alert(created["data"]["alert"]["id"], {"reminders_enabled": value})
+    assert updated["data"]["reminders_enabled"] is expected
+
+@pytest.mark.parametrize("value", ["maybe", 2, None, []])
+def test_reminders_enabled_rejects_other_values(platform, value):
+    assert platform.admin.create_alert(alert_data(reminders_enabled=value))["status_code"] == 400
+
+    alert = platform.admin.create_alert(alert_data())["data"]["alert"]
+    response = platform.admin.update_alert(alert["id"], {"reminders_enabled": value})
+    assert response["status_code"] == 400
+    assert platform.admin.alert_service.get_alert_by_id(alert["id"]).reminders_enabled is True
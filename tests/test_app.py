@@ -0,0 +1,19 @@
+import pytest
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # create_app opens alerting_platform.db in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('LIFECYCLE_ENABLED', 'false')
+    from app import create_app
+    return create_app().test_client()
+
+def test_backfill_inbox_reports_the_controller_status(client, monkeypatch):
+    response = client.post('/api/admin/inbox/backfill')
+    assert response.status_code == 200 and response.get_json()['status'] == 'success'
+
+    from controllers.admin_controller import AdminController
+    monkeypatch.setattr(AdminController, 'backfill_inbox',
+                        lambda self: self.error_response("Internal server error", 500))
+    response = client.post('/api/admin/inbox/backfill')
+    assert response.status_code == 500 and response.get_json()['status'] == 'error'
@@ -0,0 +1,82 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from database.batch_writer import BatchWriter
+from database.database_manager import DatabaseManager
+
+@pytest.fixture
+def table(db):
+    db.execute("CREATE TABLE samples (id INTEGER PRIMARY KEY, value TEXT NOT NULL)")
+    return db
+
+def make_writer(db, **options):
+    writer = BatchWriter(db, "INSERT INTO samples (id, value) VALUES (?, ?)", lambda record: record,
+                         **{'flush_interval': 0.01, 'retry_backoff': 0.01, **options})
+    writer.start()
+    return writer
+
+def test_only_failing_records_are_dead_lettered(table):
+    writer = make_writer(table, batch_size=100)
+    records = [(i, None if i in (3, 40) else f"value {i}") for i in range(64)]
+    for record in records:
+        writer.submit(record)
+    assert writer.flush(5)
+    writer.stop()
+
+    assert table.scalar("SELECT COUNT(*) FROM samples") == 62
+    assert [record for record, _ in writer.dead_letters] == [(3, None), (40, None)]
+    assert all("NOT NULL" in error for _, error in writer.dead_letters)
+    stats = writer.get_stats()
+    assert stats['records_failed'] == 2 and stats['records_written'] == 62 and stats['splits'] > 0
+
+def test_transient_errors_are_retried_without_splitting(tmp_path):
+    db = DatabaseManager(str(tmp_path / "busy.db"), busy_timeout_ms=10)
+    db.execute("CREATE TABLE samples (id INTEGER PRIMARY KEY, value TEXT NOT NULL)")
+    blocker = sqlite3.connect(db.db_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    writer = make_writer(db, max_retries=10)
+    for i in range(5):
+        writer.submit((i, "value"))
+    time.sleep(0.2)
+    blocker.rollback()
+    assert writer.flush(10)
+    writer.stop()
+
+    assert db.scalar("SELECT COUNT(*) FROM samples") == 5
+    stats = writer.get_stats()
+    assert stats['retries'] > 0 and stats['splits'] == 0 and not writer.dead_letters
+
+def test_submit_after_stop_raises(table):
+    writer = make_writer(table)
+    writer.stop()
+    with pytest.raises(RuntimeError):
+        writer.submit((1, "late"))
+    assert writer.flush(1)
+
+def test_every_accepted_record_is_written_when_stop_races_submit(table):
+    writer = make_writer(table, max_queue_size=50)
+    accepted = []
+    start = threading.Barrier(5)
+
+    def produce(base):
+        start.wait()
+        for i in range(base, base + 2000):
+            try:
+                writer.submit((i, "value"))
+            except RuntimeError:
+                return
+            accepted.append(i)
+
+    producers = [threading.Thread(target=produce, args=(n * 10000,)) for n in range(4)]
+    for producer in producers:
+        producer.start()
+    start.wait()
+    time.sleep(0.02)
+    writer.stop()
+    for producer in producers:
+        producer.join()
+
+    assert table.scalar("SELECT COUNT(*) FROM samples") == len(accepted)
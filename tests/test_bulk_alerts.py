@@ -0,0 +1,56 @@
+import json
+
+from conftest import alert_data, drain
+
+def count(db, table):
+    return db.scalar(f"SELECT COUNT(*) FROM {table}")
+
+def test_array_creates_valid_alerts_and_reports_invalid_ones(platform):
+    items = [alert_data(title=f"Alert {i}") for i in range(3)] + [{"title": "No message"}]
+    response = platform.admin.create_alerts_bulk(json.dumps(items).encode(), "application/json")
+
+    assert response["status_code"] == 202
+    data = response["data"]
+    assert (data["created"], data["failed"]) == (3, 1)
+    assert [r["status"] for r in data["results"]] == ["created", "created", "created", "error"]
+    assert "Missing required fields" in data["results"][3]["message"]
+    assert count(platform.db, "alerts") == 3 and count(platform.db, "fanout_jobs") == 3
+
+    drain(platform.worker)
+    assert count(platform.db, "fanout_job_recipients") == 3 * len(platform.users)
+    for result in data["results"][:3]:
+        assert platform.admin.get_fanout_job(result["job_id"])["data"]["status"] == "completed"
+
+def test_ndjson_reports_bad_lines_per_item(platform):
+    body = "\n".join([json.dumps(alert_data(title="First")), "{not json", "",
+                      json.dumps(alert_data(title="Second", severity="loud"))]).encode()
+    data = platform.admin.create_alerts_bulk(body, "application/x-ndjson")["data"]
+
+    assert [r["status"] for r in data["results"]] == ["created", "error", "error"]
+    assert "line 2" in data["results"][1]["message"]
+    assert count(platform.db, "alerts") == 1
+
+def test_repeats_coalesce_and_only_escalations_fan_out_again(platform):
+    items = [alert_data(), alert_data(), alert_data(severity="critical")]
+    data = platform.admin.create_alerts_bulk(json.dumps(items).encode(), "application/json")["data"]
+
+    # Repeats in the batch fold into the alert before its single fan-out is queued
+    assert [r["status"] for r in data["results"]] == ["created", "coalesced", "coalesced"]
+    assert data["results"][0]["alert"]["severity"] == "critical"
+    assert count(platform.db, "alerts") == 1 and count(platform.db, "fanout_jobs") == 1
+
+    items = [alert_data(severity="info"), alert_data(title="Other", severity="info")]
+    data = platform.admin.create_alerts_bulk(json.dumps(items).encode(), "application/json")["data"]
+    assert [r["status"] for r in data["results"]] == ["coalesced", "created"]
+    assert data["results"][0]["job_id"] is None
+
+    data = platform.admin.create_alerts_bulk(json.dumps([alert_data(title="Other", severity="warning")]).encode(),
+                                             "application/json")["data"]
+    assert data["results"][0]["status"] == "escalated" and data["results"][0]["job_id"]
+    assert count(platform.db, "alerts") == 2 and count(platform.db, "fanout_jobs") == 3
+
+def test_batch_without_valid_alerts_writes_nothing(platform):
+    response = platform.admin.create_alerts_bulk(json.dumps([{}, 3]).encode(), "application/json")
+
+    assert response["status_code"] == 400 and response["data"]["failed"] == 2
+    assert count(platform.db, "alerts") == 0 and count(platform.db, "fanout_jobs") == 0
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import alert_data
+from controllers.user_controller import UserController
+
+@pytest.fixture
+def alerts(platform):
+    return [platform.admin.create_alert(alert_data(title=f"Alert {i}", severity=severity))["data"]["alert"]["id"]
+            for i, severity in enumerate(["info", "warning", "critical"])]
+
+def prefs(db, user):
+    return dict(db.fetchall("SELECT alert_id, state FROM user_alert_preferences WHERE user_id = ?", (user.id,)))
+
+def rollup(db, metric):
+    return db.scalar("SELECT value FROM analytics_rollups WHERE scope = 'system' AND key = '' AND metric = ?",
+                     (metric,)) or 0
+
+def test_mark_read_upserts_missing_rows_and_counts_changes_once(platform, alerts):
+    users, user = UserController(platform.db), platform.users[1]
+    users.pref_srv.mark_read(user.id, alerts[0])
+
+    result = users.mark_alerts_read(user.id, alerts + ["no-such-alert"])
+    assert result["data"]["updated"] == 2
+    assert prefs(platform.db, user) == {alert_id: "read" for alert_id in alerts}
+    assert rollup(platform.db, "read") == 3
+
+    assert users.mark_alerts_read(user.id, alerts)["data"]["updated"] == 0
+    assert rollup(platform.db, "read") == 3
+
+def test_snooze_many_defers_reminders_until_tomorrow(platform, alerts):
+    users, user = UserController(platform.db), platform.users[1]
+    assert users.snooze_alerts(user.id, alerts)["data"]["updated"] == 3
+    assert users.snooze_alerts(user.id, alerts)["data"]["updated"] == 0
+
+    tomorrow = (datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+    rows = platform.db.fetchall("SELECT state, snoozed_until, next_reminder_at FROM user_alert_preferences "
+                                "WHERE user_id = ?", (user.id,))
+    assert set(rows) == {("snoozed", tomorrow, tomorrow)}
+    assert rollup(platform.db, "snoozed") == 3
+
+def test_mark_all_read_honours_the_severity_filter(platform, alerts):
+    users, user = UserController(platform.db), platform.users[1]
+    assert users.mark_all_read(user.id, severity="warning")["data"]["updated"] == 1
+    assert prefs(platform.db, user) == {alerts[1]: "read"}
+
+    assert users.mark_all_read(user.id)["data"]["updated"] == 2
+    assert set(prefs(platform.db, user).values()) == {"read"}
+
+@pytest.mark.parametrize("alert_ids", [None, "alert-1", [1, 2]])
+def test_bulk_updates_reject_anything_but_a_list_of_ids(platform, alert_ids):
+    result = UserController(platform.db).mark_alerts_read(platform.users[1].id, alert_ids)
+    assert result["status_code"] == 400
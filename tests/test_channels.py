@@ -0,0 +1,141 @@
+import json
+import socket
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from models.alert import Alert, DeliveryType, Severity, VisibilityType
+from notification_channels.email_channel import EmailChannel
+from notification_channels.sms_channel import SMSChannel
+
+@pytest.fixture
+def alert():
+    now = datetime.now()
+    return Alert(id="alert-1", title="Disk almost full", message="db-1 is at 95%",
+                 severity=Severity.WARNING, delivery_type=DeliveryType.EMAIL,
+                 visibility_type=VisibilityType.ORGANIZATION, visibility_target="org-1",
+                 start_time=now, expiry_time=now + timedelta(hours=1))
+
+def user(uid, email=None, phone=None):
+    return SimpleNamespace(id=uid, email=email or f"{uid}@example.com", phone_number=phone)
+
+@pytest.fixture
+def smtp_server():
+    """Local SMTP server that refuses every RCPT whose address starts with "bad"."""
+    controller_mod = pytest.importorskip("aiosmtpd.controller")
+
+    class Handler:
+        def __init__(self):
+            self.delivered = []
+
+        async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+            if address.startswith("bad"):
+                return "550 no such user"
+            envelope.rcpt_tos.append(address)
+            return "250 OK"
+
+        async def handle_DATA(self, server, session, envelope):
+            self.delivered.append(list(envelope.rcpt_tos))
+            return "250 Message accepted for delivery"
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = Handler()
+    controller = controller_mod.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        yield SimpleNamespace(port=port, handler=handler)
+    finally:
+        controller.stop()
+
+@pytest.fixture
+def sms_server():
+    """Bulk SMS stub: messages to numbers ending in 0 fail, the rest are sent."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            requests.append((dict(self.headers), payload))
+            body = json.dumps({"results": [
+                {"id": m["id"], "status": "failed" if m["to"].endswith("0") else "sent"}
+                for m in payload["messages"]]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield SimpleNamespace(url=f"http://127.0.0.1:{server.server_port}/bulk", requests=requests)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_email_send_batch_reports_refused_recipients(smtp_server, alert):
+    channel = EmailChannel({"server": "127.0.0.1", "port": smtp_server.port, "batch_size": 2})
+    users = [user("u1"), user("u2", email="bad-u2@example.com"), user("u3"),
+             user("u4", email="bad-u4@example.com"), user("u5")]
+    try:
+        results = channel.send_batch(users, alert)
+    finally:
+        channel.close()
+
+    assert results == {"u1": True, "u2": False, "u3": True, "u4": False, "u5": True}
+    assert sorted(a for batch in smtp_server.handler.delivered for a in batch) == \
+        ["u1@example.com", "u3@example.com", "u5@example.com"]
+
+def test_email_send_batch_reuses_pooled_session(smtp_server, alert):
+    channel = EmailChannel({"server": "127.0.0.1", "port": smtp_server.port, "batch_size": 1})
+    try:
+        assert all(channel.send_batch([user("u1"), user("u2")], alert).values())
+        assert len(channel.pool._idle) == 1
+    finally:
+        channel.close()
+    assert channel.pool._idle == []
+
+def test_sms_send_batch_reports_per_message_failures(sms_server, alert):
+    channel = SMSChannel({"endpoint": sms_server.url, "batch_size": 2})
+    users = [user("u1", phone="+15550001"), user("u2", phone="+15550010"),
+             user("u3", phone="+15550003"), user("u4")]
+    try:
+        results = channel.send_batch(users, alert)
+    finally:
+        channel.close()
+
+    # u4 has no phone number and is never posted
+    assert results == {"u1": True, "u2": False, "u3": True, "u4": False}
+    assert [len(payload["messages"]) for _, payload in sms_server.requests] == [2, 1]
+    keys = {headers["Idempotency-Key"] for headers, _ in sms_server.requests}
+    assert len(keys) == 2
+
+def test_sms_send_batch_fails_chunk_when_provider_unreachable(alert):
+    channel = SMSChannel({"endpoint": "http://127.0.0.1:9/bulk", "timeout": 1})
+    assert channel.send_batch([user("u1", phone="+15550001")], alert) == {"u1": False}
+
+def test_sms_close_closes_every_thread_connection(sms_server, alert):
+    channel = SMSChannel({"endpoint": sms_server.url})
+    workers = [threading.Thread(target=channel.send_batch, args=([user(f"u{i}", phone="+15550001")], alert))
+               for i in range(3)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    conns = set(channel._connections)
+    assert len(conns) == 3 and all(c.sock is not None for c in conns)
+
+    channel.close()
+    assert channel._connections == set()
+    assert all(c.sock is None for c in conns)
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from conftest import alert_data, drain
+from services.alert_dedup import FingerprintIndex
+
+def deliveries(db, alert_id):
+    return db.scalar("SELECT COUNT(*) FROM notification_deliveries WHERE alert_id = ?", (alert_id,))
+
+def test_repeat_inside_the_window_coalesces_without_notifying(platform):
+    first = platform.admin.create_alert(alert_data())["data"]
+    drain(platform.worker)
+    repeat = platform.admin.create_alert(alert_data())
+    drain(platform.worker)
+    platform.notifier.delivery_log.flush()
+
+    assert repeat["status_code"] == 200 and repeat["data"]["outcome"] == "coalesced"
+    assert repeat["data"]["job_id"] is None and repeat["data"]["alert"]["id"] == first["alert"]["id"]
+    assert repeat["data"]["alert"]["occurrence_count"] == 2
+    assert deliveries(platform.db, first["alert"]["id"]) == len(platform.users)
+
+def test_escalation_renotifies_the_audience(platform):
+    alert_id = platform.admin.create_alert(alert_data(severity="info"))["data"]["alert"]["id"]
+    drain(platform.worker)
+    escalated = platform.admin.create_alert(alert_data(severity="critical"))["data"]
+    drain(platform.worker)
+    platform.notifier.delivery_log.flush()
+
+    assert escalated["outcome"] == "escalated" and escalated["job_id"]
+    assert escalated["alert"]["id"] == alert_id and escalated["alert"]["severity"] == "critical"
+    assert deliveries(platform.db, alert_id) == 2 * len(platform.users)
+
+def test_repeat_after_the_window_creates_a_new_alert(platform):
+    first = platform.admin.create_alert(alert_data())["data"]["alert"]
+    stale = (datetime.now() - timedelta(hours=1)).isoformat()
+    platform.db.execute("UPDATE alerts SET last_seen_at = ? WHERE id = ?", (stale, first["id"]))
+    FingerprintIndex.for_db(platform.db).forget(first["fingerprint"])
+
+    repeat = platform.admin.create_alert(alert_data())["data"]
+    assert repeat["outcome"] == "created" and repeat["alert"]["id"] != first["id"]
+
+def test_window_of_zero_disables_deduplication(platform):
+    FingerprintIndex.for_db(platform.db).set_window(0)
+    ids = {platform.admin.create_alert(alert_data())["data"]["alert"]["id"] for _ in range(3)}
+    assert len(ids) == 3
+
+def test_retitled_alert_coalesces_under_its_new_fingerprint(platform):
+    alert_id = platform.admin.create_alert(alert_data())["data"]["alert"]["id"]
+    platform.admin.update_alert(alert_id, {"title": "Disk full"})
+
+    assert platform.admin.create_alert(alert_data(title="Disk full"))["data"]["alert"]["id"] == alert_id
+    assert platform.admin.create_alert(alert_data())["data"]["alert"]["id"] != alert_id
@@ -0,0 +1,67 @@
+import time
+
+from conftest import alert_data
+from database.database_manager import DatabaseManager
+from services.outbox_service import OutboxService
+from services.timeseries_store import TimeSeriesStore
+from utils.instrumentation import MetricsRegistry, metrics
+from utils.metrics_relay import MetricsFollower, MetricsPublisher
+
+def partitions(db):
+    return dict(db.fetchall("SELECT user_id, partition FROM fanout_job_recipients"))
+
+def expand(platform, outbox):
+    worker = platform.worker
+    outbox.expand_jobs(outbox.claim_pending_jobs(), worker.alert_srv, worker.user_srv)
+
+def test_each_partition_claims_only_its_own_users(platform):
+    outbox = OutboxService(platform.db, partitions=3)
+    platform.admin.create_alert(alert_data())
+    expand(platform, outbox)
+
+    assigned = partitions(platform.db)
+    assert assigned == {user.id: OutboxService.partition_of(user.id, 3) for user in platform.users}
+
+    claimed = {}
+    for partition in range(3):
+        for _, _, user_id, _ in outbox.claim_recipients(10, partition=partition)["recipients"]:
+            claimed[user_id] = partition
+    assert claimed == assigned
+
+def test_repartition_moves_pending_rows_and_stores_the_count(platform):
+    platform.admin.create_alert(alert_data())
+    expand(platform, platform.admin.outbox_service)
+    assert set(partitions(platform.db).values()) == {0}
+
+    moved = OutboxService(platform.db, partitions=4).repartition()
+
+    expected = {user.id: OutboxService.partition_of(user.id, 4) for user in platform.users}
+    assert partitions(platform.db) == expected
+    assert moved == sum(1 for partition in expected.values() if partition != 0)
+    assert platform.db.scalar("SELECT value FROM outbox_settings WHERE name = 'partitions'") == 4
+    # A service without its own count, like the API's, now inserts into the same partitions
+    with platform.db.transaction() as conn:
+        assert platform.admin.outbox_service.partition_count(conn) == 4
+
+def test_metrics_relay_carries_samples_and_counters_to_another_process(db):
+    # Separate managers on one file stand in for the worker and API processes:
+    # each gets its own TimeSeriesStore
+    api_db = DatabaseManager(db.db_path)
+    publisher, follower = MetricsPublisher(db, "worker-0"), MetricsFollower(api_db)
+    assert TimeSeriesStore.for_db(db) is not TimeSeriesStore.for_db(api_db)
+
+    now = time.time()
+    metrics.inc("relay_test_deliveries", 3, channel="in_app")
+    TimeSeriesStore.for_db(db).record("deliveries.sent", 5, at=now, channel="in_app")
+    assert publisher.publish() == 1
+    assert publisher.publish() == 0  # samples are written once
+
+    assert follower.follow() == 1
+    assert follower.follow() == 0
+    points = follower.timeseries.query("deliveries.sent", now - 60, now + 60, step=60, channel="in_app")["points"]
+    assert sum(point["value"] for point in points) == 5
+
+    merged = MetricsRegistry()
+    for snapshot in follower.worker_snapshots():
+        merged.absorb(snapshot)
+    assert 'relay_test_deliveries_total{channel="in_app"} 3' in merged.render()
@@ -0,0 +1,8 @@
+from database.migrations import MIGRATIONS, check_query_plans
+
+def test_fresh_database_is_at_latest_version(db):
+    assert db.get_schema_version() == max(m.version for m in MIGRATIONS)
+
+def test_every_hot_query_uses_its_index(db):
+    missing = {name: result['plan'] for name, result in check_query_plans(db).items() if not result['uses_index']}
+    assert missing == {}
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from conftest import FailingChannel, alert_data, drain
+from models.alert import DeliveryType
+from services.outbox_service import OutboxService
+from utils.outbox_worker import OutboxWorker
+
+def recipients(db, job_id):
+    return db.fetchall("SELECT user_id, status, attempts, next_attempt_at FROM fanout_job_recipients "
+                       "WHERE job_id = ? ORDER BY user_id", (job_id,))
+
+def expand(platform, outbox):
+    worker = platform.worker
+    outbox.expand_jobs(outbox.claim_pending_jobs(), worker.alert_srv, worker.user_srv)
+
+def test_create_alert_returns_a_job_that_completes(platform):
+    created = platform.admin.create_alert(alert_data())
+    assert created["status_code"] == 202
+    job_id = created["data"]["job_id"]
+    assert platform.admin.get_fanout_job(job_id)["data"]["status"] == "pending"
+
+    drain(platform.worker)
+
+    job = platform.admin.get_fanout_job(job_id)["data"]
+    assert job["status"] == "completed" and job["sent"] == len(platform.users)
+    assert job["pending"] == 0 and job["progress_percent"] == 100.0
+    assert {status for _, status, _, _ in recipients(platform.db, job_id)} == {"sent"}
+
+def test_leased_recipients_are_claimed_once_until_the_lease_expires(platform):
+    outbox = platform.admin.outbox_service
+    platform.admin.create_alert(alert_data())
+    expand(platform, outbox)
+
+    first, second = outbox.claim_recipients(2), outbox.claim_recipients(10)
+    assert len(first["recipients"]) == 2 and len(second["recipients"]) == len(platform.users) - 2
+    assert not {r[2] for r in first["recipients"]} & {r[2] for r in second["recipients"]}
+    assert outbox.claim_recipients(10)["recipients"] == []
+
+    # A crashed worker's lease runs out and its rows are claimed again
+    platform.db.execute("UPDATE fanout_job_recipients SET lease_expires_at = ? WHERE lease_owner = ?",
+                        ((datetime.now() - timedelta(seconds=1)).isoformat(), first["token"]))
+    again = outbox.claim_recipients(10)
+    assert sorted(again["recipients"]) == sorted(first["recipients"])
+
+    # The late worker's results no longer count against the new lease
+    outbox.complete_recipients(first["token"], {r[::2]: True for r in first["recipients"]},
+                               {r[::2]: r[3] for r in first["recipients"]})
+    job_id = first["recipients"][0][0]
+    assert {status for _, status, _, _ in recipients(platform.db, job_id)} == {"pending"}
+
+def test_failed_recipients_back_off_then_dead_letter(platform):
+    outbox = OutboxService(platform.db, max_attempts=2)
+    worker = OutboxWorker(platform.db, platform.notifier, outbox)
+    platform.notifier.register_channel(DeliveryType.IN_APP, FailingChannel(DeliveryType.IN_APP))
+    job_id = platform.admin.create_alert(alert_data())["data"]["job_id"]
+
+    drain(worker)
+    rows = recipients(platform.db, job_id)
+    assert {(status, attempts) for _, status, attempts, _ in rows} == {("pending", 1)}
+    assert all(next_at > datetime.now().isoformat() for _, _, _, next_at in rows)
+    assert outbox.get_job_status(job_id)["retries"] == len(platform.users)
+
+    platform.db.execute("UPDATE fanout_job_recipients SET next_attempt_at = ?", (datetime.now().isoformat(),))
+    drain(worker)
+    assert {(status, attempts) for _, status, attempts, _ in recipients(platform.db, job_id)} == {("dead", 2)}
+    job = outbox.get_job_status(job_id)
+    assert job["status"] == "completed_with_errors" and job["dead_lettered"] == len(platform.users)
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import alert_data, drain
+from services.user_alert_preference_service import UserAlertPreferenceService
+from utils.scheduler import ReminderScheduler
+
+@pytest.fixture
+def reminders(platform):
+    prefs = UserAlertPreferenceService(platform.db)
+    scheduler = ReminderScheduler(platform.db, platform.admin.outbox_service, prefs)
+    scheduler.running = True
+    alert = platform.admin.create_alert(alert_data(severity="critical"))["data"]["alert"]
+    drain(platform.worker)
+    return prefs, scheduler, alert["id"]
+
+def make_due(platform, prefs, alert_id, user):
+    prefs._set_next_reminder(alert_id, [user.id], datetime.now() - timedelta(seconds=1))
+
+def reminder_rows(db, user):
+    return db.fetchall("""SELECT r.status FROM fanout_job_recipients r JOIN fanout_jobs j ON j.id = r.job_id
+                          WHERE j.kind = 'reminder' AND r.user_id = ?""", (user.id,))
+
+def pref_row(db, alert_id, user):
+    return db.fetchone("""SELECT state, next_reminder_at, last_reminded_at FROM user_alert_preferences
+                          WHERE alert_id = ? AND user_id = ?""", (alert_id, user.id))
+
+def test_delivery_schedules_next_reminder(platform, reminders):
+    prefs, _, alert_id = reminders
+    state, next_at, reminded_at = pref_row(platform.db, alert_id, platform.users[1])
+    assert state == "unread" and next_at is not None and reminded_at is not None
+
+def test_due_reminder_is_queued_once_and_rescheduled_after_delivery(platform, reminders):
+    prefs, scheduler, alert_id = reminders
+    user = platform.users[1]
+    make_due(platform, prefs, alert_id, user)
+
+    scheduler._queue_due()
+    scheduler._queue_due()
+    assert reminder_rows(platform.db, user) == [("pending",)]
+    assert pref_row(platform.db, alert_id, user)[1] is None
+
+    drain(platform.worker)
+    assert reminder_rows(platform.db, user) == [("sent",)]
+    assert pref_row(platform.db, alert_id, user)[1] is not None
+
+def test_reminder_not_sent_after_read(platform, reminders):
+    prefs, scheduler, alert_id = reminders
+    user = platform.users[1]
+    make_due(platform, prefs, alert_id, user)
+    scheduler._queue_due()
+
+    prefs.mark_read(user.id, alert_id)
+    drain(platform.worker)
+
+    assert reminder_rows(platform.db, user) == [("skipped",)]
+    assert pref_row(platform.db, alert_id, user)[:2] == ("read", None)
+    job = platform.db.fetchone("""SELECT status, total_recipients, sent_count FROM fanout_jobs
+                                  WHERE kind = 'reminder' AND alert_id = ?""", (alert_id,))
+    assert job == ("completed", 0, 0)
+
+def test_snooze_survives_in_flight_reminder(platform, reminders):
+    prefs, scheduler, alert_id = reminders
+    user = platform.users[1]
+    make_due(platform, prefs, alert_id, user)
+    scheduler._queue_due()
+
+    prefs.snooze(user.id, alert_id)
+    snoozed = pref_row(platform.db, alert_id, user)
+    drain(platform.worker)
+
+    assert reminder_rows(platform.db, user) == [("skipped",)]
+    assert pref_row(platform.db, alert_id, user) == snoozed
+
+def test_record_reminders_leaves_read_rows_alone(platform, reminders):
+    prefs, _, alert_id = reminders
+    user = platform.users[1]
+    prefs.mark_read(user.id, alert_id)
+    alert = platform.admin.alert_service.get_alert_by_id(alert_id)
+
+    prefs.record_reminders(alert, [user.id])
+
+    assert pref_row(platform.db, alert_id, user)[:2] == ("read", None)
+    due = prefs.get_alerts_needing_reminder(datetime.now() + timedelta(hours=3))
+    assert user.id not in {u.id for _, users in due for u in users}
@@ -0,0 +1,109 @@
+import pytest
+
+from conftest import FailingChannel, alert_data, drain
+from models.alert import DeliveryType
+from services.notification_service import NotificationService
+from utils.outbox_worker import OutboxWorker
+
+@pytest.fixture
+def throttled(platform):
+    """A notifier allowing one in-app alert per user per hour, and a worker delivering through it"""
+    notifier = NotificationService(platform.db, throttle_burst=1, throttle_per_minute=1 / 60,
+                                   digest_interval=3600, digest_check_interval=3600)
+    yield notifier, OutboxWorker(platform.db, notifier, platform.admin.outbox_service)
+    notifier.shutdown()
+
+def deliveries(db, status):
+    return db.scalar("SELECT COUNT(*) FROM notification_deliveries WHERE delivery_status = ?", (status,))
+
+def held_rows(db):
+    return db.fetchall("SELECT user_id, alert_id FROM held_digest_alerts ORDER BY user_id")
+
+def test_throttling_is_off_by_default(platform):
+    for i in range(12):
+        platform.admin.create_alert(alert_data(title=f"Alert {i}"))
+    drain(platform.worker)
+
+    stats = platform.notifier.get_throttle_stats()
+    assert stats["throttled"] == 0 and stats["delivered"] == 12 * len(platform.users)
+    assert held_rows(platform.db) == []
+
+def test_held_alerts_are_stored_before_the_outbox_settles(platform, throttled):
+    notifier, worker = throttled
+    platform.admin.create_alert(alert_data(title="First"))
+    second = platform.admin.create_alert(alert_data(title="Second"))["data"]["alert"]
+    drain(worker)
+
+    assert [alert_id for _, alert_id in held_rows(platform.db)] == [second["id"]] * len(platform.users)
+    assert platform.db.scalar("SELECT COUNT(*) FROM fanout_job_recipients WHERE status != 'sent'") == 0
+
+def test_digest_survives_restart(platform, throttled):
+    notifier, worker = throttled
+    platform.admin.create_alert(alert_data(title="First"))
+    platform.admin.create_alert(alert_data(title="Second"))
+    drain(worker)
+    notifier.shutdown()  # a restart: nothing is sent early, the held alerts stay stored
+
+    restarted = NotificationService(platform.db, throttle_burst=1, digest_interval=3600, digest_check_interval=3600)
+    try:
+        assert restarted.restore_digests() == len(platform.users)
+        assert restarted.flush_digests() == 0  # the original window is still open
+        assert restarted.flush_digests(force=True) == len(platform.users)
+    finally:
+        restarted.shutdown()
+
+    assert held_rows(platform.db) == []
+    assert deliveries(platform.db, "digested") == len(platform.users)
+
+def test_restore_only_takes_owned_users(platform, throttled):
+    notifier, worker = throttled
+    platform.admin.create_alert(alert_data(title="First"))
+    platform.admin.create_alert(alert_data(title="Second"))
+    drain(worker)
+    owner = platform.users[1].id
+
+    restarted = NotificationService(platform.db, throttle_burst=1, digest_interval=3600, digest_check_interval=3600)
+    try:
+        assert restarted.restore_digests(lambda user_id: user_id == owner) == 1
+        assert restarted.flush_digests(force=True) == 1
+    finally:
+        restarted.shutdown()
+    assert owner not in {user_id for user_id, _ in held_rows(platform.db)}
+    assert len(held_rows(platform.db)) == len(platform.users) - 1
+
+def test_failed_digest_is_held_again_until_attempts_run_out(platform, throttled):
+    notifier, worker = throttled
+    platform.admin.create_alert(alert_data(title="First"))
+    platform.admin.create_alert(alert_data(title="Second"))
+    drain(worker)
+    notifier.register_channel(DeliveryType.IN_APP, FailingChannel(DeliveryType.IN_APP))
+
+    for attempt in range(1, NotificationService.MAX_DIGEST_ATTEMPTS):
+        assert notifier.flush_digests(force=True) == 0
+        assert len(held_rows(platform.db)) == len(platform.users)
+        assert notifier.get_throttle_stats()["pending_digests"] == len(platform.users)
+
+    assert notifier.flush_digests(force=True) == 0
+    assert held_rows(platform.db) == []
+    assert notifier.get_throttle_stats()["digests_failed"] == len(platform.users) * NotificationService.MAX_DIGEST_ATTEMPTS
+
+def test_bucket_holds_after_burst_and_refills(platform):
+    from services.notification_throttle import NotificationThrottle
+
+    throttle = NotificationThrottle(burst=2, per_minute=60)
+    user = platform.users[1]
+    build = platform.admin.alert_service.build_alert
+    warning, critical = build(alert_data(severity="warning")), build(alert_data(severity="critical"))
+    admitted = [throttle.admit(warning, [user], DeliveryType.IN_APP, now=0.0)[0] for _ in range(3)]
+    assert [len(send) for send in admitted] == [1, 1, 0]
+    assert throttle.admit(critical, [user], DeliveryType.IN_APP, now=0.0) == ([user], [])
+    assert throttle.admit(warning, [user], DeliveryType.IN_APP, now=1.0) == ([user], [])
+    assert throttle.get_stats()["pending_digest_alerts"] == 1
+
+def test_channel_opts_in_with_its_own_limit(platform):
+    from services.notification_throttle import NotificationThrottle
+
+    throttle = NotificationThrottle()
+    throttle.set_limit(DeliveryType.EMAIL, 1, 1)
+    assert throttle.get_stats()["limits"] == {"email": {"burst": 1.0, "per_minute": 1.0}}
+    assert throttle.limits.get(DeliveryType.IN_APP, throttle.default_limit) is None
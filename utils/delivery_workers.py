@@ -0,0 +1,140 @@
+"""Run fan-out delivery in a pool of worker processes.
+
+    python -m utils.delivery_workers [--workers N] [--db alerting_platform.db]
+
+Recipients are partitioned by ``crc32(user_id) % N`` when jobs are
+expanded or reminders are queued, and worker ``i`` only claims partition
+``i``, so the GIL-bound part of delivery (formatting, serialization,
+delivery bookkeeping) runs on N cores. Each worker has its own database connection, NotificationService
+and channel instances; processes coordinate only through the outbox
+tables and their leases. Because a user always lands on the same worker,
+that worker's per-user throttle buckets and digests see all of the user's
+notifications; on startup it reloads the held alerts of its partition's
+users, whichever worker stored them.
+
+Run the API with ``OUTBOX_WORKER_ENABLED=false`` so the in-process worker
+does not claim recipients across partitions. Each worker publishes its
+metrics for the API to report (see ``utils.metrics_relay``).
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+def run_worker(partition: int, partitions: int, db_path: str, batch_size: int, idle_interval: float):
+    """Process entry point: drain one outbox partition until SIGTERM"""
+    from database.database_manager import DatabaseManager
+    from services.notification_service import NotificationService
+    from services.outbox_service import OutboxService
+    from utils.metrics_relay import MetricsPublisher
+    from utils.outbox_worker import OutboxWorker
+
+    logging.basicConfig(level=logging.INFO,
+                        format=f'%(asctime)s - worker-{partition} - %(name)s - %(levelname)s - %(message)s')
+    db_manager = DatabaseManager(db_path)
+    burst = os.environ.get('USER_THROTTLE_BURST')
+    notification_service = NotificationService(
+        db_manager, throttle_burst=int(burst) if burst else None,
+        throttle_per_minute=float(os.environ.get('USER_THROTTLE_PER_MINUTE', '10')))
+    # Held alerts of this partition's users, stored by an earlier run of any worker
+    notification_service.restore_digests(lambda user_id: OutboxService.partition_of(user_id, partitions) == partition)
+    inbox_fanout = os.environ.get('INBOX_FANOUT_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    outbox = OutboxService(db_manager, inbox_fanout, partitions=partitions)
+    worker = OutboxWorker(db_manager, notification_service, outbox, batch_size=batch_size,
+                          idle_interval=idle_interval, partition=partition)
+    publisher = MetricsPublisher(db_manager, f"worker-{partition}")
+    publisher.start()
+
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor decides when to stop
+    try:
+        worker.run()
+    finally:
+        notification_service.shutdown()
+        publisher.stop()
+        logging.getLogger(__name__).info("Worker %d stopped: %s", partition, worker.stats)
+
+class WorkerPool:
+    """Start one worker process per partition and restart any that exit unexpectedly"""
+
+    def __init__(self, db_path: str, workers: int, batch_size: int = 500, idle_interval: float = 0.5):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self.processes = {}
+        self.running = False
+        self.logger = logging.getLogger(__name__)
+        self._context = multiprocessing.get_context('spawn')
+
+    def prepare(self):
+        """Apply migrations once, store the worker count and repartition every pending recipient"""
+        from database.database_manager import DatabaseManager
+        from services.outbox_service import OutboxService
+
+        moved = OutboxService(DatabaseManager(self.db_path), partitions=self.workers).repartition()
+        if moved:
+            self.logger.info("Repartitioned %d pending recipients across %d workers", moved, self.workers)
+
+    def _spawn(self, partition: int):
+        process = self._context.Process(
+            target=run_worker, name=f"delivery-worker-{partition}",
+            args=(partition, self.workers, self.db_path, self.batch_size, self.idle_interval))
+        process.start()
+        self.processes[partition] = process
+
+    def start(self):
+        self.prepare()
+        self.running = True
+        for partition in range(self.workers):
+            self._spawn(partition)
+        self.logger.info("Started %d delivery workers on %s", self.workers, self.db_path)
+
+    def supervise(self, check_interval: float = 1.0):
+        """Restart crashed workers until ``stop`` is called"""
+        while self.running:
+            for partition, process in list(self.processes.items()):
+                if not process.is_alive() and self.running:
+                    self.logger.warning("Worker %d exited with code %s; restarting", partition, process.exitcode)
+                    self._spawn(partition)
+            time.sleep(check_interval)
+
+    def stop(self, timeout: float = 30.0):
+        """SIGTERM every worker, letting it finish its batch and flush delivery records"""
+        self.running = False
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for partition, process in self.processes.items():
+            process.join(timeout)
+            if process.is_alive():
+                self.logger.error("Worker %d did not stop in %.0fs; killing it", partition, timeout)
+                process.kill()
+                process.join()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run partitioned fan-out delivery workers")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--db', default="alerting_platform.db")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--idle-interval', type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    pool = WorkerPool(args.db, args.workers, args.batch_size, args.idle_interval)
+
+    def shutdown(*_):
+        pool.running = False
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    pool.start()
+    try:
+        pool.supervise()
+    finally:
+        pool.stop()
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,7 @@
 from .scheduler import ReminderScheduler
+from .state_manager import StateManager
+from .outbox_worker import OutboxWorker
+from .delivery_workers import WorkerPool
+from .lifecycle_sweeper import LifecycleSweeper
+from .metrics_relay import MetricsFollower, MetricsPublisher
+from .instrumentation import MetricsRegistry, SamplingProfiler, metrics, profiler
@@ -0,0 +1,397 @@
+"""Process-wide counters, latency histograms and a sampling profiler.
+
+Hot paths record into the module-level ``metrics`` registry::
+
+    from utils.instrumentation import metrics
+
+    with metrics.time('db_query_seconds', op='fetchall'):
+        ...
+    metrics.inc('deliveries', 3, channel='email', status='sent')
+
+and ``/api/metrics`` renders the registry in the Prometheus text format.
+``snapshot`` and ``absorb`` carry counters and histograms between
+processes, so the API can report deliveries made by separate worker
+processes (see ``utils.metrics_relay``).
+Recording is a perf_counter pair, a bisect over fixed buckets and one
+short lock per sample; ``metrics.enabled = False`` turns it into a no-op.
+Series are keyed by their label values, so labels must stay low
+cardinality (an operation, channel or route, never an id).
+"""
+import collections
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; covers sub-millisecond SQLite calls up to slow provider sends
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# HELP text for the metrics recorded across the code base
+METRIC_HELP = {
+    'http_request_seconds': "API request latency by route, method and status",
+    'db_query_seconds': "DatabaseManager statement latency by helper",
+    'db_transaction_seconds': "Duration of outermost write transactions",
+    'batch_records_dropped': "Records a group-commit writer dead-lettered or gave up on after exhausting its retries",
+    'channel_send_seconds': "Latency of one channel send_batch call",
+    'deliveries': "Notification deliveries by channel and status",
+    'serialization_seconds': "Time spent serializing alerts for responses",
+    'audience_resolution_seconds': "Time spent resolving alert audiences",
+    'scheduler_tick_seconds': "Duration of one reminder scheduler pass",
+    'reminders_queued': "Reminders queued in the outbox by the scheduler",
+    'alerts_expired': "Alerts moved to expired by the lifecycle sweeper",
+    'rows_archived': "Rows moved to the archive (or dropped) by table",
+    'pages_reclaimed': "Free database pages returned to the filesystem",
+    'lifecycle_pass_seconds': "Duration of one lifecycle sweeper pass",
+}
+
+def _label_key(labels: Dict[str, Any]) -> tuple:
+    # Raw (name, value) pairs in call order; normalized only when exported
+    return tuple(labels.items()) if labels else ()
+
+def _normalize(key: tuple) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in key))
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str):
+        self.name, self.help = name, help_text
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        wanted = _normalize(_label_key(labels))
+        with self._lock:
+            return sum(v for key, v in self._values.items() if _normalize(key) == wanted)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        merged: Dict[tuple, float] = {}
+        with self._lock:
+            for key, value in self._values.items():
+                key = _normalize(key)
+                merged[key] = merged.get(key, 0) + value
+        for key, value in merged.items():
+            yield self.name + "_total", _format_labels(key), value
+
+    def snapshot(self) -> List[list]:
+        with self._lock:
+            return [[list(_normalize(key)), value] for key, value in self._values.items()]
+
+    def absorb(self, series: List[list]):
+        with self._lock:
+            for labels, value in series:
+                key = tuple(map(tuple, labels))
+                self._values[key] = self._values.get(key, 0) + value
+
+class Histogram:
+    """Bucketed distribution per label set, with cumulative buckets on export"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help = name, help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # key -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        wanted = _normalize(_label_key(labels))
+        with self._lock:
+            return sum(s[2] for key, s in self._series.items() if _normalize(key) == wanted)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        merged: Dict[tuple, list] = {}
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                key = _normalize(key)
+                if key not in merged:
+                    merged[key] = [list(counts), total, count]
+                else:
+                    target = merged[key]
+                    target[0] = [a + b for a, b in zip(target[0], counts)]
+                    target[1] += total
+                    target[2] += count
+        for key, (counts, total, count) in merged.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                yield self.name + "_bucket", _format_labels(key, (("le", _format_value(bound)),)), cumulative
+            yield self.name + "_sum", _format_labels(key), total
+            yield self.name + "_count", _format_labels(key), count
+
+    def snapshot(self) -> List[list]:
+        with self._lock:
+            return [[list(_normalize(key)), list(counts), total, count]
+                    for key, (counts, total, count) in self._series.items()]
+
+    def absorb(self, series: List[list]):
+        with self._lock:
+            for labels, counts, total, count in series:
+                if len(counts) != len(self.buckets) + 1:
+                    continue  # recorded with other buckets; cannot be merged
+                key = tuple(map(tuple, labels))
+                target = self._series.get(key)
+                if target is None:
+                    target = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                target[0] = [a + b for a, b in zip(target[0], counts)]
+                target[1] += total
+                target[2] += count
+
+class _Timer:
+    """Class-based timer; cheaper per use than a generator context manager"""
+
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class MetricsRegistry:
+    """Named counters and histograms plus callbacks that export gauges on scrape"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, Any], float]]]] = []
+        self._snapshot_sources: List[Callable[[], Iterable[Dict[str, Any]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, Counter(name, help_text or METRIC_HELP.get(name, "")))
+        return metric
+
+    def histogram(self, name: str, help_text: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(
+                    name, Histogram(name, help_text or METRIC_HELP.get(name, ""), buckets))
+        return metric
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        if self.enabled and amount:
+            self.counter(name).inc(amount, **labels)
+
+    def observe(self, name: str, value: float, **labels):
+        if self.enabled:
+            self.histogram(name).observe(value, **labels)
+
+    def time(self, name: str, **labels) -> "_Timer":
+        """Context manager observing the duration of the enclosed block in seconds"""
+        return _Timer(self.histogram(name), labels) if self.enabled else _NULL_TIMER
+
+    def timed(self, name: str, **labels):
+        """Decorator form of ``time``"""
+        def decorate(fn):
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.histogram(name).observe(time.perf_counter() - started, **labels)
+            wrapper.__name__, wrapper.__doc__, wrapper.__wrapped__ = fn.__name__, fn.__doc__, fn
+            return wrapper
+        return decorate
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, Dict[str, Any], float]]]):
+        """Add a callback yielding (name, help, labels, value) gauges, evaluated on every scrape"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def register_snapshot_source(self, source: Callable[[], Iterable[Dict[str, Any]]]):
+        """Add a callback returning other processes' ``snapshot`` dicts, merged into every scrape"""
+        with self._lock:
+            self._snapshot_sources.append(source)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-serializable copy of every counter and histogram, for ``absorb`` in another process"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: {'kind': m.kind, 'buckets': list(getattr(m, 'buckets', ())), 'series': m.snapshot()}
+                for m in metrics}
+
+    def absorb(self, snapshot: Dict[str, Any]):
+        """Add the counts of another registry's ``snapshot`` to this one"""
+        for name, data in snapshot.items():
+            if data['kind'] == 'counter':
+                self.counter(name).absorb(data['series'])
+            else:
+                self.histogram(name, buckets=tuple(data['buckets'])).absorb(data['series'])
+
+    def render(self) -> str:
+        """Export everything in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+            collectors = list(self._collectors)
+            sources = list(self._snapshot_sources)
+        if sources:
+            merged = MetricsRegistry()
+            merged.absorb(self.snapshot())
+            for source in sources:
+                for snapshot in source():
+                    merged.absorb(snapshot)
+            metrics = sorted(merged._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            exported = metric.name + ("_total" if metric.kind == 'counter' else "")
+            lines.append(f"# HELP {exported} {metric.help or metric.name}")
+            lines.append(f"# TYPE {exported} {metric.kind}")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples())
+
+        gauges: Dict[str, Tuple[str, List[str]]] = {}
+        for collector in collectors:
+            for name, help_text, labels, value in collector():
+                if value is None:
+                    continue
+                _, samples = gauges.setdefault(name, (help_text, []))
+                samples.append(f"{name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        for name, (help_text, samples) in sorted(gauges.items()):
+            lines.append(f"# HELP {name} {help_text or name}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry(enabled=os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+
+class SamplingProfiler:
+    """Statistical profiler that samples every thread's stack at a fixed interval.
+
+    A daemon thread reads ``sys._current_frames()`` every ``interval``
+    seconds and counts each stack in the collapsed ``a;b;c`` form used by
+    flame graph tools. It costs nothing while stopped and a stack walk per
+    thread per sample while running, so it can be left off and switched on
+    in production when something is slow.
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks: "collections.Counter[str]" = collections.Counter()
+        self._samples = 0
+        self._started_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: Optional[float] = None, reset: bool = True):
+        with self._lock:
+            if self.running:
+                return
+            if interval:
+                self.interval = interval
+            if reset:
+                self._stacks.clear()
+                self._samples = 0
+            self._started_at = time.monotonic()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="sampling-profiler")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                parts = []
+                while frame is not None and len(parts) < self.max_depth:
+                    code = frame.f_code
+                    parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                parts.append(names.get(thread_id, str(thread_id)))
+                stacks.append(";".join(reversed(parts)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self._samples += 1
+
+    def folded(self) -> str:
+        """Collapsed stacks with sample counts, one per line (flamegraph.pl / speedscope input)"""
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common()) + "\n"
+
+    def get_stats(self, top: int = 20) -> Dict[str, Any]:
+        """Running state and the most frequently sampled leaf functions"""
+        leaves: "collections.Counter[str]" = collections.Counter()
+        with self._lock:
+            for stack, count in self._stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            samples = self._samples
+        return {
+            'running': self.running,
+            'interval_ms': round(self.interval * 1000, 3),
+            'samples': samples,
+            'seconds': round(time.monotonic() - self._started_at, 3) if self._started_at else 0.0,
+            'top_functions': [{'function': name, 'samples': count} for name, count in leaves.most_common(top)]
+        }
+
+profiler = SamplingProfiler()
@@ -0,0 +1,126 @@
+"""Background expiry, archival and space reclaim for alerts.
+
+    python -m utils.lifecycle_sweeper --db alerting_platform.db [--archive-db archive.db] [--once]
+
+Runs inside the API process by default (LIFECYCLE_ENABLED); the command
+line form suits a cron job or a separate process. ``--convert`` switches a
+database created before incremental auto-vacuum to that mode with one
+full VACUUM, which should run while the API is stopped.
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from services.lifecycle_service import LifecycleService
+from utils.instrumentation import metrics
+from utils.state_manager import StateManager
+
+class LifecycleSweeper(threading.Thread):
+    """Periodic loop that expires, archives and vacuums through a LifecycleService.
+
+    Each pass expires and archives batches until none is left, yielding the
+    write lock between batches, then reclaims at most ``vacuum_pages`` free
+    pages. A pass cut short by ``max_batches`` is followed by another right
+    away; otherwise the loop sleeps ``interval`` seconds.
+    """
+
+    def __init__(self, db, lifecycle=None, interval=60.0, max_batches=100):
+        super().__init__(daemon=True, name="lifecycle-sweeper")
+        self.db = db
+        self.lifecycle = lifecycle or LifecycleService(db)
+        self.interval = interval
+        self.max_batches = max_batches
+        self.running = False
+        self.log = logging.getLogger(__name__)
+        self._wakeup = threading.Event()
+        self.stats = {"passes": 0, "expired": 0, "alerts_archived": 0, "rows_archived": 0,
+                      "pages_reclaimed": 0, "last_pass_at": None}
+
+        StateManager.get(db, "lifecycle_sweeper", lambda: self)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def run(self):
+        self.running = True
+        if self.lifecycle.get_storage_stats()['auto_vacuum'] != 'incremental':
+            self.log.warning("Database is not in incremental auto-vacuum mode; archived rows leave free pages "
+                             "behind until `python -m utils.lifecycle_sweeper --convert` is run once")
+        while self.running:
+            try:
+                busy = self.run_once()
+            except Exception as e:
+                self.log.error("Lifecycle pass failed: %s", e)
+                busy = False
+            if not busy:
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+
+    def run_once(self):
+        """Run one expire + archive + reclaim pass; returns True if work was left over"""
+        with metrics.time('lifecycle_pass_seconds'):
+            expired, more = 0, True
+            for _ in range(self.max_batches):
+                count = self.lifecycle.expire_due()
+                expired += count
+                if count < self.lifecycle.expire_batch_size:
+                    more = False
+                    break
+
+            batches = 0
+            while batches < self.max_batches:
+                moved = self.lifecycle.archive_due()
+                if not moved:
+                    break
+                batches += 1
+                self.stats["alerts_archived"] += moved['alerts']
+                self.stats["rows_archived"] += sum(moved.values())
+            reclaimed = self.lifecycle.reclaim_space()
+
+        self.stats["passes"] += 1
+        self.stats["expired"] += expired
+        self.stats["pages_reclaimed"] += reclaimed
+        self.stats["last_pass_at"] = time.time()
+        if expired or batches or reclaimed:
+            self.log.info("Lifecycle pass: %d expired, %d archive batches, %d pages reclaimed",
+                          expired, batches, reclaimed)
+        return more or batches == self.max_batches or reclaimed >= self.lifecycle.vacuum_pages
+
+    def get_stats(self):
+        return {**self.stats, **self.lifecycle.get_storage_stats(),
+                "archive_after_days": self.lifecycle.archive_after / timedelta(days=1)}
+
+def main(argv=None):
+    from database.database_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default="alerting_platform.db")
+    parser.add_argument('--archive-db', help="attach this file for the archive tables instead of the main database")
+    parser.add_argument('--archive-after-days', type=float, default=30.0)
+    parser.add_argument('--interval', type=float, default=60.0)
+    parser.add_argument('--once', action='store_true', help="sweep until nothing is left and exit")
+    parser.add_argument('--convert', action='store_true', help="enable incremental auto-vacuum (full VACUUM) and exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    db_manager = DatabaseManager(args.db, archive_path=args.archive_db)
+    sweeper = LifecycleSweeper(db_manager, LifecycleService(db_manager, timedelta(days=args.archive_after_days)),
+                               interval=args.interval)
+    if args.convert:
+        sweeper.lifecycle.enable_incremental_vacuum()
+    elif args.once:
+        while sweeper.run_once():
+            pass
+    else:
+        sweeper.run()
+    print(json.dumps(sweeper.get_stats(), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Carry delivery metrics from worker processes back to the API.
+
+With ``OUTBOX_WORKER_ENABLED=false`` deliveries happen in the processes of
+``utils.delivery_workers``, so the API's own registry and time series never
+see them. Each worker runs a ``MetricsPublisher`` that writes its metrics
+snapshot to ``worker_metrics`` and its new time-series samples to
+``timeseries_samples`` every few seconds. The API runs a ``MetricsFollower``
+that merges every worker's snapshot into ``/api/metrics`` at scrape time and
+replays the samples into its TimeSeriesStore by rowid, the same way the
+notification stream follows ``in_app_notifications``.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+from services.timeseries_store import TimeSeriesStore
+from utils.instrumentation import metrics
+
+class MetricsPublisher(threading.Thread):
+    """Worker side: periodically publish this process's metrics to the shared tables"""
+
+    def __init__(self, db, worker: str, interval: float = 5.0):
+        super().__init__(daemon=True, name=f"metrics-publisher-{worker}")
+        self.db = db
+        self.worker = worker
+        self.interval = interval
+        self.timeseries = TimeSeriesStore.for_db(db)
+        self.timeseries.start_capture()
+        self.log = logging.getLogger(__name__)
+        self._pending: List[tuple] = []
+        self._stopping = threading.Event()
+
+    def stop(self):
+        """Stop the loop and publish whatever was recorded since the last pass"""
+        self._stopping.set()
+        if self.is_alive():
+            self.join()
+        self.publish()
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.publish()
+            except Exception as e:
+                self.log.error("Publishing worker metrics failed: %s", e)
+
+    def publish(self) -> int:
+        """Write the metrics snapshot and pending samples in one transaction; returns samples written"""
+        self._pending.extend(self.timeseries.drain_captured())
+        snapshot = json.dumps(metrics.snapshot())
+        with self.db.transaction() as conn:
+            conn.execute("""
+                INSERT INTO worker_metrics (worker, snapshot, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(worker) DO UPDATE SET snapshot = excluded.snapshot, updated_at = excluded.updated_at
+            """, (self.worker, snapshot, datetime.now().isoformat()))
+            conn.executemany("""
+                INSERT INTO timeseries_samples (metric, value, count, recorded_at, channel, severity)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, self._pending)
+        written, self._pending = len(self._pending), []
+        return written
+
+class MetricsFollower(threading.Thread):
+    """API side: merge worker snapshots into scrapes and replay their samples into the time series.
+
+    Samples older than ``retention`` seconds are deleted as they are
+    replayed, so a restarted API rebuilds at most that much history.
+    """
+
+    def __init__(self, db, interval: float = 1.0, batch_size: int = 5000, retention: float = 86400.0):
+        super().__init__(daemon=True, name="metrics-follower")
+        self.db = db
+        self.interval = interval
+        self.batch_size = batch_size
+        self.retention = retention
+        self.timeseries = TimeSeriesStore.for_db(db)
+        self.log = logging.getLogger(__name__)
+        self._last_id = 0
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        while True:
+            try:
+                while self.follow() == self.batch_size:
+                    pass
+                self.prune()
+            except Exception as e:
+                self.log.error("Following worker metrics failed: %s", e)
+            if self._stopping.wait(self.interval):
+                return
+
+    def follow(self) -> int:
+        """Replay the next batch of worker samples into the time series; returns how many"""
+        rows = self.db.fetchall("""
+            SELECT id, metric, value, count, recorded_at, channel, severity FROM timeseries_samples
+            WHERE id > ? ORDER BY id LIMIT ?
+        """, (self._last_id, self.batch_size))
+        for _, metric, value, count, at, channel, severity in rows:
+            self.timeseries.record(metric, value, count, at=at, channel=channel, severity=severity)
+        if rows:
+            self._last_id = rows[-1][0]
+        return len(rows)
+
+    def prune(self) -> int:
+        return self.db.execute("DELETE FROM timeseries_samples WHERE recorded_at < ? AND id <= ?",
+                               (time.time() - self.retention, self._last_id))
+
+    def worker_snapshots(self) -> List[Dict[str, Any]]:
+        return [json.loads(snapshot) for (snapshot,) in self.db.fetchall("SELECT snapshot FROM worker_metrics")]
@@ -0,0 +1,140 @@
+import threading, logging
+from collections import defaultdict
+from utils.state_manager import StateManager
+
+class OutboxWorker(threading.Thread):
+    """Background loop that drains the fan-out outbox.
+
+    Each pass expands newly created jobs into recipient rows, then leases a
+    batch of due recipients, delivers them per alert through the
+    NotificationService and records the outcomes. The loop sleeps only when
+    a pass finds no work, and ``wake`` cuts that sleep short when a job is
+    enqueued in this process. Initial deliveries and reminders both go
+    through it; a recipient's next reminder is scheduled only once its
+    delivery has succeeded or been dead-lettered, and a queued reminder is
+    skipped if the user read or snoozed the alert in the meantime.
+
+    ``partition`` limits delivery to recipients in one outbox partition, for
+    running one worker per partition in separate processes.
+    """
+
+    def __init__(self, db, notifier, outbox, batch_size=500, idle_interval=0.5, job_batch_size=100,
+                 partition=None):
+        super().__init__(daemon=True, name="outbox-worker" if partition is None else f"outbox-worker-{partition}")
+        self.db, self.notify, self.outbox = db, notifier, outbox
+        self.partition = partition
+        self.batch_size = batch_size
+        self.job_batch_size = job_batch_size
+        self.idle_interval = idle_interval
+        self.running = False
+        self.log = logging.getLogger(__name__)
+        self._wakeup = threading.Event()
+
+        from services.alert_service import AlertService
+        from services.user_service import UserService
+        from services.user_alert_preference_service import UserAlertPreferenceService
+        from services.inbox_service import InboxService
+        self.alert_srv, self.user_srv = AlertService(db), UserService(db)
+        self.pref_srv, self.inbox_srv = UserAlertPreferenceService(db), InboxService(db)
+        self.stats = {"jobs_expanded": 0, "batches": 0, "delivered": 0, "failed": 0}
+
+        StateManager.get(db, "outbox_worker", lambda: self)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def run(self):
+        self.running = True
+        while self.running:
+            try:
+                busy = self.run_once()
+            except Exception as e:
+                self.log.error("Outbox pass failed: %s", e)
+                busy = False
+            if not busy:
+                self._wakeup.wait(self.idle_interval)
+                self._wakeup.clear()
+
+    def run_once(self):
+        """Run one expand + deliver pass; returns True if any work was done"""
+        job_ids = self.outbox.claim_pending_jobs(self.job_batch_size)
+        if job_ids:
+            self.outbox.expand_jobs(job_ids, self.alert_srv, self.user_srv, self.inbox_srv)
+        expanded = len(job_ids)
+        self.stats["jobs_expanded"] += expanded
+
+        batch = self.outbox.claim_recipients(self.batch_size, self.partition)
+        if not batch["recipients"]:
+            return expanded > 0
+
+        skipped = self._acknowledged(batch["recipients"])
+        by_alert, attempts = defaultdict(lambda: defaultdict(list)), {}
+        for job_id, alert_id, user_id, tries in batch["recipients"]:
+            if (job_id, user_id) in skipped:
+                continue
+            by_alert[alert_id][user_id].append(job_id)
+            attempts[(job_id, user_id)] = tries
+
+        # A user targeted by several alerts in the batch is loaded once
+        users_by_id = {u.id: u for u in self.user_srv.get_users_by_ids(
+            {user_id for _, _, user_id, _ in batch["recipients"]})}
+
+        outcomes = {key: False for key in attempts}
+        alerts = [(self.alert_srv.get_alert_by_id(alert_id), user_jobs) for alert_id, user_jobs in by_alert.items()]
+        # Most severe alerts in the batch go out first
+        alerts.sort(key=lambda item: -item[0].severity.rank if item[0] else 0)
+        for alert, user_jobs in alerts:
+            users = [users_by_id[uid] for uid in user_jobs if uid in users_by_id] if alert else []
+            if not users:
+                continue
+            results = self.notify.send_alert_to_users(alert, users)
+            for detail in results["delivery_details"]:
+                for job_id in user_jobs[detail["user_id"]]:
+                    outcomes[(job_id, detail["user_id"])] = detail["success"]
+
+        finished = self.outbox.complete_recipients(batch["token"], outcomes, attempts, skipped)
+        self._schedule_reminders(alerts, finished)
+        delivered = sum(outcomes.values())
+        self.stats["batches"] += 1
+        self.stats["delivered"] += delivered
+        self.stats["failed"] += len(outcomes) - delivered
+        return True
+
+    def _acknowledged(self, recipients):
+        """(job_id, user_id) reminder recipients who read or snoozed the alert after it was queued"""
+        reminder_jobs = self.outbox.reminder_jobs({job_id for job_id, _, _, _ in recipients})
+        queued = defaultdict(list)
+        for job_id, alert_id, user_id, _ in recipients:
+            if job_id in reminder_jobs:
+                queued[alert_id].append((job_id, user_id))
+        skipped = set()
+        for alert_id, keys in queued.items():
+            wanted = self.pref_srv.awaiting_reminder(alert_id, [user_id for _, user_id in keys])
+            skipped.update(key for key in keys if key[1] not in wanted)
+        return skipped
+
+    def _schedule_reminders(self, alerts, finished):
+        """Start the next reminder cycle for recipients whose delivery is settled.
+
+        record_reminders leaves read and snoozed rows alone, so a user who
+        acknowledged the alert while this batch was in flight is not re-armed.
+        """
+        sent, dead = set(finished["sent"]), set(finished["dead"])
+        for alert, user_jobs in alerts:
+            if not alert or not alert.reminders_enabled:
+                continue
+            delivered = [uid for uid, jobs in user_jobs.items() if any((j, uid) in sent for j in jobs)]
+            given_up = [uid for uid, jobs in user_jobs.items() if any((j, uid) in dead for j in jobs)
+                        and uid not in delivered]
+            try:
+                if delivered:
+                    self.pref_srv.record_reminders(alert, delivered)
+                if given_up:
+                    # Not reminded, but the next cycle still tries again
+                    self.pref_srv.record_reminders(alert, given_up, delivered=False)
+            except Exception as e:
+                self.log.error("Scheduling reminders for alert %s failed: %s", alert.id, e)
@@ -1,16 +1,133 @@
-import threading, time, logging
+import heapq, threading, time, logging
+from datetime import datetime
+from utils.instrumentation import metrics
+from utils.state_manager import StateManager
 
 class ReminderScheduler(threading.Thread):
-    def __init__(self, db, notifier, pref_srv):
-        super().__init__(daemon=True)
-        self.db, self.notify, self.pref = db, notifier, pref_srv
+    """Due-time driven reminder loop.
+
+    Keeps a min-heap of (due time, user_id, alert_id) for reminders due within
+    the next ``horizon_seconds`` and sleeps exactly until the earliest one.
+    The indexed next_reminder_at column remains the source of truth: the heap
+    only decides when to wake up, and ``arm``/``arm_many`` re-arm it when a
+    reminder is scheduled, snoozed or cleared in this process. A periodic
+    refill picks up reminders scheduled by other processes.
+
+    Due reminders are queued in the outbox rather than sent from this
+    thread, so they get the outbox's severity priority, partitioning,
+    retries and dead-lettering. Their next_reminder_at is cleared while
+    queued and set again by the outbox worker once delivery settles.
+    """
+
+    REFILL_SQL = """SELECT user_id, alert_id, next_reminder_at FROM user_alert_preferences
+                    WHERE next_reminder_at IS NOT NULL AND next_reminder_at <= ?"""
+
+    def __init__(self, db, outbox, pref_srv, horizon_seconds=3600, refill_interval=60):
+        super().__init__(daemon=True, name="reminder-scheduler")
+        self.db, self.outbox, self.pref = db, outbox, pref_srv
+        self.horizon_seconds = horizon_seconds
+        self.refill_interval = refill_interval
         self.running = False
         self.log = logging.getLogger(__name__)
 
+        self._heap = []
+        self._armed = {}  # (user_id, alert_id) -> due timestamp of the live heap entry
+        self._wakeup = threading.Condition()
+        self._next_refill = 0.0
+        self._loaded_until = 0.0
+        self.stats = {"ticks": 0, "reminders_queued": 0, "alerts_reminded": 0, "refills": 0}
+
+        StateManager.get(db, "reminder_scheduler", lambda: self)
+
+    def arm(self, user_id, alert_id, due):
+        self.arm_many([(user_id, alert_id)], due)
+
+    def arm_many(self, keys, due):
+        """(Re-)arm reminders for (user_id, alert_id) keys; due=None disarms them"""
+        ts = due.timestamp() if due else None
+        with self._wakeup:
+            for key in keys:
+                if ts is None or ts > self._loaded_until:
+                    # Disarmed, or beyond the loaded horizon (picked up by a later refill)
+                    self._armed.pop(key, None)
+                    continue
+                self._armed[key] = ts
+                heapq.heappush(self._heap, (ts, key[0], key[1]))
+            if ts is not None and self._heap and self._heap[0][0] == ts:
+                self._wakeup.notify()
+
+    def stop(self):
+        with self._wakeup:
+            self.running = False
+            self._wakeup.notify()
+
     def run(self):
         self.running = True
         while self.running:
-            alerts = self.pref.get_alerts_needing_reminder()
-            for a, users in alerts:
-                self.notify.send_alert_to_users(a, users)
-            time.sleep(300)
+            if time.monotonic() >= self._next_refill:
+                self._refill()
+
+            with self._wakeup:
+                timeout = self._seconds_until_next()
+                if timeout > 0:
+                    self._wakeup.wait(timeout)
+                if not self.running:
+                    break
+                has_due = self._pop_due()
+
+            if has_due:
+                self._process_due()
+
+    def _seconds_until_next(self):
+        wait = self._next_refill - time.monotonic()
+        if self._heap:
+            wait = min(wait, self._heap[0][0] - time.time())
+        return wait
+
+    def _pop_due(self):
+        """Drop every due heap entry; returns True if any of them was still live"""
+        now, has_due = time.time(), False
+        while self._heap and self._heap[0][0] <= now:
+            ts, uid, aid = heapq.heappop(self._heap)
+            if self._armed.get((uid, aid)) == ts:
+                del self._armed[(uid, aid)]
+                has_due = True
+        return has_due
+
+    def _refill(self):
+        """Load reminders due within the horizon from the next_reminder_at index"""
+        horizon = datetime.fromtimestamp(time.time() + self.horizon_seconds)
+        rows = self.db.fetchall(self.REFILL_SQL, (horizon.isoformat(),))
+        with self._wakeup:
+            self._loaded_until = horizon.timestamp()
+            for uid, aid, due in rows:
+                ts = datetime.fromisoformat(due).timestamp()
+                if self._armed.get((uid, aid)) != ts:
+                    self._armed[(uid, aid)] = ts
+                    heapq.heappush(self._heap, (ts, uid, aid))
+        self._next_refill = time.monotonic() + self.refill_interval
+        self.stats["refills"] += 1
+
+    def _process_due(self):
+        """Queue due reminders in the outbox, one job per alert"""
+        self.stats["ticks"] += 1
+        with metrics.time('scheduler_tick_seconds'):
+            self._queue_due()
+
+    def _queue_due(self):
+        while self.running:
+            try:
+                due_alerts = self.pref.get_alerts_needing_reminder()
+                if not due_alerts:
+                    return
+                reminders = [(alert, [u.id for u in users]) for alert, users in due_alerts]
+                with self.db.transaction():
+                    queued = self.outbox.enqueue_reminders(reminders)
+                    self.pref.hold_reminders(reminders)
+            except Exception as e:
+                # Left due; the next refill picks them up again
+                self.log.error("Queueing reminders failed: %s", e)
+                return
+            self.stats["alerts_reminded"] += len(reminders)
+            self.stats["reminders_queued"] += queued
+            metrics.inc('reminders_queued', queued)
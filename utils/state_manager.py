@@ -1 +1,31 @@
-# placeholder for future shared state utilities
+import threading
+import weakref
+from typing import Any, Callable
+
+class StateManager:
+    """Registry of shared in-process state scoped to a DatabaseManager.
+
+    Services are constructed per controller, so state that must be shared
+    between them (indexes, caches, counters) is registered here once per
+    database and looked up by key.
+    """
+
+    _lock = threading.RLock()
+    _registry = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def get(cls, db_manager, key: str, factory: Callable[[], Any]) -> Any:
+        """Return the shared object for key, creating it with factory on first use"""
+        with cls._lock:
+            scope = cls._registry.get(db_manager)
+            if scope is None:
+                scope = cls._registry[db_manager] = {}
+            if key not in scope:
+                scope[key] = factory()
+            return scope[key]
+
+    @classmethod
+    def peek(cls, db_manager, key: str) -> Any:
+        """Return the shared object for key if it has been created, else None"""
+        with cls._lock:
+            return cls._registry.get(db_manager, {}).get(key)